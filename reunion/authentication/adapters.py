@@ -1,3 +1,23 @@
+from allauth import app_settings as allauth_settings
+from allauth.socialaccount.adapter import DefaultSocialAccountAdapter
+from django.contrib.sites.shortcuts import get_current_site
+
+from authentication.provider_config import list_provider_apps
+
+
+class CachedSocialAccountAdapter(DefaultSocialAccountAdapter):
+    """Serves SocialApps from the process-wide provider registry instead of querying them per request."""
+
+    def list_apps(self, request, provider=None, client_id=None):
+        site_id = None
+        if request and allauth_settings.SITES_ENABLED:
+            site_id = get_current_site(request).id
+        return [
+            app.as_social_app()
+            for app in list_provider_apps(provider=provider, client_id=client_id, site_id=site_id)
+        ]
+
+
 # from allauth.socialaccount.adapter import DefaultSocialAccountAdapter
 # from django.contrib.auth.models import User
 # import requests
@@ -0,0 +1,153 @@
+"""
+In-memory Bloom filter in front of the refresh-token blacklist.
+
+Every rotation blacklists the old refresh token, so `token_blacklist_blacklistedtoken`
+grows with traffic, while almost every token presented for refresh is *not*
+blacklisted. BlacklistFilter keeps a Bloom filter of blacklisted JTIs per
+process: a negative answer is definitive and skips the database, and only a
+hit falls through to the indexed table lookup.
+
+The filter is built from the table on first use, extended on every blacklist
+write in this process, and picks up rows written by other processes with a
+cheap `id > last_seen - SYNC_OVERLAP` query at most every SYNC_INTERVAL
+seconds. The overlap re-reads the newest ids, because a row can be given its
+id before a row with a higher id and only commit after that one was seen. A
+token blacklisted by another process may therefore be accepted here for up
+to SYNC_INTERVAL seconds; set it to 0 to sync before every check.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from authentication.jwt_auth import ClaimsRefreshToken
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CAPACITY': 100_000,
+    'ERROR_RATE': 0.001,
+    'SYNC_INTERVAL': 2,  # seconds
+    'SYNC_OVERLAP': 100,  # ids below the last one seen that each sync reads again
+    'REBUILD_INTERVAL': 3600,  # seconds; drops JTIs whose rows were flushed
+}
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings using double hashing of one BLAKE2b digest."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(int(capacity), 1)
+        self.size = max(int(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hash_count = max(round(self.size / self.capacity * math.log(2)), 1)
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class BlacklistFilter:
+    """Process-wide Bloom filter of blacklisted JTIs, kept in step with BlacklistedToken."""
+
+    def __init__(self, options=None):
+        self.options = {**DEFAULTS, **(options or {})}
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._last_id = 0
+        self._synced_at = 0.0
+        self._built_at = 0.0
+
+    @property
+    def is_built(self):
+        return self._bloom is not None
+
+    def _rebuild(self):
+        bloom = BloomFilter(
+            max(self.options['CAPACITY'], BlacklistedToken.objects.count() * 2), self.options['ERROR_RATE']
+        )
+        last_id = 0
+        for row_id, jti in BlacklistedToken.objects.values_list('id', 'token__jti').iterator():
+            bloom.add(jti)
+            last_id = max(last_id, row_id)
+        self._bloom = bloom
+        self._last_id = last_id
+        self._built_at = self._synced_at = time.monotonic()
+        logger.info(f"Built refresh-token blacklist filter with {bloom.count} entries")
+
+    def _sync(self):
+        rows = BlacklistedToken.objects.filter(
+            id__gt=self._last_id - self.options['SYNC_OVERLAP']
+        ).values_list('id', 'token__jti')
+        for row_id, jti in rows:
+            # Rows in the overlap are mostly known already; count each JTI once
+            if jti not in self._bloom:
+                self._bloom.add(jti)
+            self._last_id = max(self._last_id, row_id)
+        self._synced_at = time.monotonic()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if (
+            self._bloom is None
+            or now - self._built_at >= self.options['REBUILD_INTERVAL']
+            or self._bloom.count >= self._bloom.capacity
+        ):
+            self._rebuild()
+        elif now - self._synced_at >= self.options['SYNC_INTERVAL']:
+            self._sync()
+
+    def might_contain(self, jti):
+        """False means `jti` is certainly not blacklisted; True means check the table."""
+        with self._lock:
+            self._refresh()
+            return jti in self._bloom
+
+    def add(self, jti):
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+
+
+blacklist_filter = BlacklistFilter(getattr(settings, 'JWT_BLACKLIST_FILTER', {}))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def add_blacklisted_jti(sender, instance, created, **kwargs):
+    """Cover blacklist writes made outside FilteredRefreshToken, e.g. logout or the admin."""
+    if not created or not blacklist_filter.is_built:
+        # An unbuilt filter reads every row when it is built
+        return
+    if BlacklistedToken.token.is_cached(instance):
+        # Token.blacklist() passes the OutstandingToken it just looked up
+        jti = instance.token.jti
+    else:
+        jti = OutstandingToken.objects.filter(pk=instance.token_id).values_list('jti', flat=True).first()
+    if jti:
+        blacklist_filter.add(jti)
+
+
+class FilteredRefreshToken(ClaimsRefreshToken):
+    """RefreshToken whose blacklist check consults the Bloom filter before the database."""
+
+    def check_blacklist(self):
+        if blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
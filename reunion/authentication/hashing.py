@@ -0,0 +1,71 @@
+"""
+Bounded worker pool for password verification.
+
+Checking a password is deliberately slow and CPU-bound. The async login view
+hands `authenticate()` to this pool so the event loop keeps serving other
+requests; Django's hashers spend their time in C code that releases the GIL
+(hashlib's PBKDF2, argon2-cffi, bcrypt), so threads do run in parallel. The
+pool accepts at most WORKERS + QUEUE_SIZE jobs; beyond that submit() raises
+HashingPoolFull and the caller answers 503 instead of letting logins queue
+without bound.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+DEFAULTS = {
+    'WORKERS': os.cpu_count() or 1,
+    'QUEUE_SIZE': 64,
+    'RETRY_AFTER': 1,  # seconds, sent with 503 responses
+}
+
+
+def hashing_options():
+    return {**DEFAULTS, **getattr(settings, 'PASSWORD_HASHING_POOL', {})}
+
+
+class HashingPoolFull(Exception):
+    """Every worker is busy and the queue is full."""
+
+
+class HashingPool:
+    def __init__(self, workers, queue_size):
+        self.capacity = workers + queue_size
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+
+    def submit(self, fn, *args, **kwargs):
+        """Run `fn` on the pool and return its Future; raises HashingPoolFull instead of queueing past capacity."""
+        if not self._slots.acquire(blocking=False):
+            raise HashingPoolFull()
+        try:
+            future = self._executor.submit(self._call, fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    @staticmethod
+    def _call(fn, *args, **kwargs):
+        # Workers are long-lived, so apply CONN_MAX_AGE and drop broken connections per job
+        close_old_connections()
+        return fn(*args, **kwargs)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    """Return the process-wide HashingPool configured by PASSWORD_HASHING_POOL."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                options = hashing_options()
+                _pool = HashingPool(options['WORKERS'], options['QUEUE_SIZE'])
+    return _pool
@@ -0,0 +1,148 @@
+"""
+Database-free JWT authentication.
+
+StatelessJWTAuthentication checks the access token's signature and claims and
+returns a ClaimsUser built from them, without loading the User row. `id` and
+`pk` come straight from the token; any other attribute, and `.instance`, is
+served from a short-TTL per-process cache of User rows, so only views that
+really need the full user pay for a lookup, and only on a cache miss.
+Tokens minted through ClaimsRefreshToken also carry `username`, so views
+that echo the caller's username need no lookup at all.
+
+Because the row is not loaded, deactivating a user takes effect for this
+authentication class only once their access token expires.
+"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+User = get_user_model()
+
+
+class UserRowCache:
+    """Thread-safe, size-bounded cache of User rows that expire after `ttl` seconds."""
+
+    def __init__(self, ttl=30, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._rows.get(user_id)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires < time.monotonic():
+                del self._rows[user_id]
+                return None
+        # Hand out a copy so one request cannot mutate another's user.
+        return copy.copy(user)
+
+    def set(self, user_id, user):
+        with self._lock:
+            if len(self._rows) >= self.max_size:
+                self._rows.clear()
+            self._rows[user_id] = (time.monotonic() + self.ttl, copy.copy(user))
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._rows.pop(user_id, None)
+
+
+user_cache = UserRowCache(ttl=getattr(settings, 'JWT_USER_CACHE_TTL', 30))
+
+
+def get_cached_user(user_id):
+    """Return the User row for `user_id`, from the process cache when fresh."""
+    user = user_cache.get(user_id)
+    if user is None:
+        user = User.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        user_cache.set(user_id, user)
+    return user
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(getattr(instance, api_settings.USER_ID_FIELD))
+
+
+class ClaimsUser(TokenUser):
+    """TokenUser whose non-claim attributes fall back to the cached User row."""
+
+    @cached_property
+    def instance(self):
+        return get_cached_user(self.id)
+
+    @cached_property
+    def username(self):
+        return self.token.get('username') or self.instance.username
+
+    @cached_property
+    def is_staff(self):
+        return self.token.get('is_staff', self.instance.is_staff)
+
+    @cached_property
+    def is_superuser(self):
+        return self.token.get('is_superuser', self.instance.is_superuser)
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        if attr in self.token:
+            return self.token[attr]
+        return getattr(self.instance, attr)
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """RefreshToken that copies the claims ClaimsUser reads into the token (and its access tokens)."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['username'] = user.get_username()
+        return token
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Pair serializer minting ClaimsRefreshTokens; dj-rest-auth uses it for social logins."""
+
+    token_class = ClaimsRefreshToken
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWT authentication that builds the principal from token claims, with no database access."""
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        return ClaimsUser(validated_token)
+
+
+# For views that only need the user id, or use resolve_user() when they need more.
+STATELESS_AUTHENTICATION_CLASSES = [
+    StatelessJWTAuthentication,
+    TokenAuthentication,
+    SessionAuthentication,
+]
+
+
+def resolve_user(user):
+    """Return a real User for `user`, which may be a ClaimsUser principal."""
+    return user.instance if isinstance(user, ClaimsUser) else user
@@ -0,0 +1,85 @@
+"""
+Write-behind buffer for `User.last_login`.
+
+Logins record their timestamp in memory; a background thread writes all
+pending timestamps every LAST_LOGIN_FLUSH_INTERVAL seconds with one
+`UPDATE ... SET last_login = CASE id ... END` per chunk of users, so a login
+storm costs one statement per interval instead of one per login. Pending
+updates are flushed at interpreter exit; a crash can lose at most one
+interval's worth. An interval of 0 writes through synchronously.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Case, DateTimeField, Value, When
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+FLUSH_CHUNK_SIZE = 500
+
+
+class LastLoginBuffer:
+    """Coalesces last_login writes per user and flushes them in batches."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def touch(self, user_id, when):
+        if not self.interval:
+            User.objects.filter(pk=user_id).update(last_login=when)
+            return
+        with self._lock:
+            self._pending[user_id] = max(when, self._pending.get(user_id, when))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='last-login-flusher', daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def flush(self):
+        """Write every pending timestamp; returns the number of users updated."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        items = list(pending.items())
+        for start in range(0, len(items), FLUSH_CHUNK_SIZE):
+            chunk = items[start:start + FLUSH_CHUNK_SIZE]
+            try:
+                User.objects.filter(pk__in=[user_id for user_id, _ in chunk]).update(
+                    last_login=Case(
+                        *[When(pk=user_id, then=Value(when)) for user_id, when in chunk],
+                        output_field=DateTimeField(),
+                    )
+                )
+            except Exception:
+                # Put back what was not written so the next flush retries it
+                with self._lock:
+                    for user_id, when in items[start:]:
+                        self._pending[user_id] = max(when, self._pending.get(user_id, when))
+                raise
+        return len(items)
+
+    def _run(self):
+        while not self._wakeup.wait(self.interval):
+            try:
+                count = self.flush()
+                if count:
+                    logger.debug(f"Flushed last_login for {count} users")
+            except Exception:
+                logger.exception("Flushing last_login updates failed")
+            finally:
+                # This thread's connection would otherwise stay open between flushes
+                connection.close()
+
+
+last_login_buffer = LastLoginBuffer(getattr(settings, 'LAST_LOGIN_FLUSH_INTERVAL', 5))
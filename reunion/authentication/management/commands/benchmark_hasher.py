@@ -0,0 +1,56 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import check_password, get_hasher, make_password
+from django.core.management.base import BaseCommand
+
+from authentication.hashing import hashing_options
+
+
+class Command(BaseCommand):
+    help = "Measure password checks per second with the configured hasher, single-threaded and across the hashing pool size"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5.0, help="Duration of each run")
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=hashing_options()['WORKERS'],
+            help="Concurrent checkers for the parallel run (defaults to PASSWORD_HASHING_POOL['WORKERS'])",
+        )
+
+    def run(self, encoded, threads, seconds):
+        """Check `encoded` from `threads` threads for `seconds`; returns checks per second."""
+        deadline = time.monotonic() + seconds
+
+        def worker():
+            count = 0
+            while time.monotonic() < deadline:
+                check_password('benchmark-password', encoded)
+                count += 1
+            return count
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            total = sum(executor.map(lambda _: worker(), range(threads)))
+        return total / (time.monotonic() - started)
+
+    def handle(self, *args, **options):
+        hasher = get_hasher()
+        encoded = make_password('benchmark-password')
+        summary = hasher.safe_summary(encoded)
+        details = ', '.join(f"{key}={value}" for key, value in summary.items() if key not in ('hash', 'salt'))
+        cores = os.cpu_count() or 1
+        threads = options['threads']
+        self.stdout.write(f"Hasher {hasher.algorithm} ({details}), {cores} CPUs")
+
+        single = self.run(encoded, 1, options['seconds'])
+        self.stdout.write(f"1 thread: {single:.1f} logins/s ({1000 / single:.1f} ms per check)")
+
+        parallel = self.run(encoded, threads, options['seconds'])
+        per_core = parallel / min(threads, cores)
+        self.stdout.write(self.style.SUCCESS(
+            f"{threads} threads: {parallel:.1f} logins/s, {per_core:.1f} logins/s per core "
+            f"(scaling {parallel / single:.1f}x)"
+        ))
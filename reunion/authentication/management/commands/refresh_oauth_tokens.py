@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from authentication.provider_config import get_provider_config
+from authentication.token_refresh import TOKEN_URLS, refresh_expiring_tokens, refresh_options
+
+
+class Command(BaseCommand):
+    help = "Refresh Google/GitHub access tokens that are about to expire, in concurrent batches"
+
+    def add_arguments(self, parser):
+        options = refresh_options()
+        parser.add_argument(
+            '--window',
+            type=int,
+            default=options['WINDOW'],
+            help="Refresh tokens expiring within this many seconds",
+        )
+        parser.add_argument('--batch-size', type=int, default=options['BATCH_SIZE'])
+        parser.add_argument(
+            '--every',
+            type=int,
+            default=0,
+            help="Repeat every N seconds instead of exiting after one pass",
+        )
+
+    def social_apps(self):
+        apps = {}
+        for provider in TOKEN_URLS:
+            try:
+                apps[provider] = get_provider_config(provider)
+            except ValueError as e:
+                self.stderr.write(f"Skipping {provider}: {e}")
+        return apps
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            refreshed, failed = refresh_expiring_tokens(
+                self.social_apps(), window=options['window'], batch_size=options['batch_size']
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"Refreshed {refreshed} tokens ({failed} failed) in {time.monotonic() - started:.1f}s"
+            ))
+            if not options['every']:
+                break
+            time.sleep(options['every'])
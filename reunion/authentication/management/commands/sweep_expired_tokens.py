@@ -0,0 +1,85 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from authentication.models import OAuthToken
+
+# Providers that issue access tokens without a refresh token only when they do not expire
+NON_EXPIRING_PROVIDERS = ('github',)
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired JWT, OAuth, DRF token and session rows in small index-ordered batches. "
+        "Run it from cron, or keep it running with --every."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.1,
+            help="Seconds to pause between batches to keep lock time short",
+        )
+        parser.add_argument(
+            '--every',
+            type=int,
+            default=0,
+            help="Repeat the sweep every N seconds instead of exiting after one pass",
+        )
+
+    def targets(self, now):
+        """Yield (label, queryset of expired rows, index column to walk them in)."""
+        yield 'jwt outstanding/blacklisted', OutstandingToken.objects.filter(expires_at__lt=now), 'id'
+        # Expired OAuth tokens without a refresh token can never be renewed. GitHub
+        # only omits the refresh token for tokens that never expire; their expires_at
+        # is the login view's default, not a real expiry, so they are kept.
+        expired_oauth = OAuthToken.objects.filter(expires_at__lt=now, refresh_token__isnull=True)
+        yield 'oauth tokens', expired_oauth.exclude(provider__in=NON_EXPIRING_PROVIDERS), 'id'
+        max_age_days = getattr(settings, 'AUTH_TOKEN_MAX_AGE_DAYS', None)
+        if max_age_days:
+            yield 'drf tokens', Token.objects.filter(created__lt=now - timezone.timedelta(days=max_age_days)), 'key'
+        yield 'sessions', Session.objects.filter(expire_date__lt=now), 'expire_date'
+
+    def sweep(self, queryset, order_by, batch_size, pause):
+        """Delete `queryset` batch by batch; returns {model label: rows deleted}."""
+        model = queryset.model
+        deleted = {}
+        while True:
+            pks = list(queryset.order_by(order_by).values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return deleted
+            with transaction.atomic():
+                if model is OutstandingToken:
+                    # Drop the blacklist rows directly rather than through the cascade collector
+                    _, blacklisted = BlacklistedToken.objects.filter(token_id__in=pks).delete()
+                else:
+                    blacklisted = {}
+                _, per_model = model.objects.filter(pk__in=pks).delete()
+            for label, count in [*blacklisted.items(), *per_model.items()]:
+                deleted[label] = deleted.get(label, 0) + count
+            time.sleep(pause)
+
+    def sweep_all(self, options):
+        now = timezone.now()
+        for label, queryset, order_by in self.targets(now):
+            started = time.monotonic()
+            deleted = self.sweep(queryset, order_by, options['batch_size'], options['sleep'])
+            rows = ', '.join(f"{count} {name}" for name, count in deleted.items()) or '0 rows'
+            self.stdout.write(f"{label}: removed {rows} in {time.monotonic() - started:.1f}s")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            self.sweep_all(options)
+            self.stdout.write(self.style.SUCCESS(f"Sweep finished in {time.monotonic() - started:.1f}s"))
+            if not options['every']:
+                break
+            time.sleep(options['every'])
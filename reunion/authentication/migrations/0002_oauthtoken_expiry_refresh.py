@@ -0,0 +1,24 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='oauthtoken',
+            name='previous_refresh_token',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='oauthtoken',
+            index=models.Index(fields=['expires_at'], name='oauthtoken_expires_idx'),
+        ),
+    ]
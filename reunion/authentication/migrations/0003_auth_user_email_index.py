@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Index auth_user.email for login by email. auth.User's own migrations are
+    left untouched, and another app's migration state cannot describe an index
+    on it, so this is plain SQL with its reverse.
+    """
+
+    dependencies = [
+        ('authentication', '0002_oauthtoken_expiry_refresh'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX auth_user_email_idx ON auth_user (email)',
+            reverse_sql='DROP INDEX auth_user_email_idx ON auth_user',
+        ),
+    ]
@@ -14,15 +14,25 @@ class OAuthToken(models.Model):
     provider = models.CharField(max_length=20, choices=PROVIDER_CHOICES)
     access_token = models.TextField()
     refresh_token = models.TextField(null=True, blank=True)
+    # Kept after a background refresh rotates the refresh token, so the client
+    # still holding the old one can pick up the new tokens.
+    previous_refresh_token = models.TextField(null=True, blank=True)
     expires_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ('user', 'provider')
+        indexes = [
+            models.Index(fields=['expires_at'], name='oauthtoken_expires_idx'),
+        ]
         
     @property
     def is_expired(self):
         if not self.expires_at:
             return True
-        return self.expires_at <= timezone.now()
\ No newline at end of file
+        return self.expires_at <= timezone.now()
+
+    def expires_within(self, seconds):
+        """True if the access token is expired or expires in the next `seconds`."""
+        return self.is_expired or self.expires_at <= timezone.now() + timezone.timedelta(seconds=seconds)
@@ -0,0 +1,57 @@
+"""
+Stateless OAuth `state` parameter.
+
+The state is a signed, timestamped payload naming the provider and a random
+nonce; the same nonce goes to the browser in a cookie. The callback checks the
+signature and age of the state and that the nonce matches the cookie, so a
+state minted for one browser cannot be replayed from another, all without a
+session row being written or read.
+"""
+import secrets
+
+from django.conf import settings
+from django.core import signing
+from django.utils.crypto import constant_time_compare
+
+STATE_SALT = 'authentication.oauth_state'
+NONCE_COOKIE = 'oauth_nonce'
+
+
+def state_max_age():
+    return getattr(settings, 'OAUTH_STATE_MAX_AGE', 600)
+
+
+def issue_state(provider):
+    """Return (state, nonce) for a new authorization request to `provider`."""
+    nonce = secrets.token_urlsafe(16)
+    state = signing.dumps({'provider': provider, 'nonce': nonce}, salt=STATE_SALT, compress=True)
+    return state, nonce
+
+
+def verify_state(request, provider, state):
+    """True if `state` was issued for `provider` to this browser and has not expired."""
+    if not state:
+        return False
+    try:
+        payload = signing.loads(state, salt=STATE_SALT, max_age=state_max_age())
+    except signing.BadSignature:
+        return False
+    nonce = request.COOKIES.get(NONCE_COOKIE, '')
+    return payload.get('provider') == provider and constant_time_compare(payload.get('nonce', ''), nonce)
+
+
+def set_nonce_cookie(response, nonce):
+    response.set_cookie(
+        NONCE_COOKIE,
+        nonce,
+        max_age=state_max_age(),
+        httponly=True,
+        secure=settings.SESSION_COOKIE_SECURE,
+        samesite=settings.SESSION_COOKIE_SAMESITE,
+    )
+    return response
+
+
+def clear_nonce_cookie(response):
+    response.delete_cookie(NONCE_COOKIE, samesite=settings.SESSION_COOKIE_SAMESITE)
+    return response
@@ -0,0 +1,223 @@
+"""
+Process-wide registry of OAuth provider configuration.
+
+SocialApp rows and the APP/APPS entries of SOCIALACCOUNT_PROVIDERS are read
+once per process into immutable ProviderApp entries. The OAuth views, the
+token refresh worker and allauth (through CachedSocialAccountAdapter) resolve
+client ids and secrets from here instead of querying SocialApp and Site on
+every request. Saving or deleting a
+SocialApp, or changing its sites, drops the registry in that process and the
+next lookup reloads it; other processes pick up admin changes on restart.
+"""
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core import checks
+from django.db import DatabaseError
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from allauth.socialaccount.models import SocialApp
+
+logger = logging.getLogger(__name__)
+
+# Providers whose app can be created on first use from environment credentials.
+ENV_PROVIDERS = {
+    'google': ('GOOGLE_CLIENT_ID', 'GOOGLE_CLIENT_SECRET', 'Google OAuth'),
+    'github': ('GITHUB_CLIENT_ID', 'GITHUB_CLIENT_SECRET', 'GitHub OAuth'),
+}
+
+
+@dataclass(frozen=True)
+class ProviderApp:
+    """Immutable snapshot of one SocialApp row."""
+
+    pk: int  # None for apps defined in SOCIALACCOUNT_PROVIDERS
+    provider: str
+    provider_id: str
+    name: str
+    client_id: str
+    secret: str = field(repr=False)
+    key: str = ''
+    settings: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+    site_ids: frozenset = None  # None matches every site
+
+    @classmethod
+    def from_social_app(cls, app):
+        return cls(
+            pk=app.pk,
+            provider=app.provider,
+            provider_id=app.provider_id,
+            name=app.name,
+            client_id=app.client_id,
+            secret=app.secret,
+            key=app.key,
+            settings=MappingProxyType(dict(app.settings or {})),
+            site_ids=frozenset(site.id for site in app.sites.all()),
+        )
+
+    @classmethod
+    def from_settings(cls, provider, config):
+        """Build an entry from an APP/APPS block of SOCIALACCOUNT_PROVIDERS, as allauth does."""
+        app_settings = dict(config.get('settings', {}))
+        if 'certificate_key' in config:
+            app_settings['certificate_key'] = config['certificate_key']
+        return cls(
+            pk=None,
+            provider=provider,
+            provider_id=config.get('provider_id', ''),
+            name=config.get('name', ''),
+            client_id=config.get('client_id'),
+            secret=config.get('secret'),
+            key=config.get('key', ''),
+            settings=MappingProxyType(app_settings),
+        )
+
+    def as_social_app(self):
+        """Return a detached SocialApp equal to the stored row, safe for the caller to mutate."""
+        app = SocialApp(
+            pk=self.pk,
+            provider=self.provider,
+            provider_id=self.provider_id,
+            name=self.name,
+            client_id=self.client_id,
+            secret=self.secret,
+            key=self.key,
+            settings=dict(self.settings),
+        )
+        app._state.adding = self.pk is None
+        return app
+
+    def matches(self, provider=None, client_id=None, site_id=None):
+        return (
+            (provider is None or provider in (self.provider, self.provider_id))
+            and (client_id is None or client_id == self.client_id)
+            and (site_id is None or self.site_ids is None or site_id in self.site_ids)
+        )
+
+
+def env_credentials(provider):
+    """Return (client_id, secret, name) for `provider` from the environment or settings."""
+    id_name, secret_name, name = ENV_PROVIDERS[provider]
+    client_id = os.environ.get(id_name, getattr(settings, id_name, ''))
+    secret = os.environ.get(secret_name, getattr(settings, secret_name, ''))
+    return client_id, secret, name
+
+
+def create_app_from_env(provider):
+    """Create the SocialApp for `provider` from environment credentials, or return None if unset."""
+    from django.contrib.sites.models import Site
+
+    client_id, secret, name = env_credentials(provider)
+    if not client_id or not secret:
+        return None
+    app = SocialApp.objects.create(provider=provider, name=name, client_id=client_id, secret=secret)
+    app.sites.add(Site.objects.get_current())
+    return app
+
+
+def load_registry(create_missing=True):
+    """Read every SocialApp once; returns {provider: (ProviderApp, ...)} as a read-only mapping."""
+    rows = list(SocialApp.objects.prefetch_related('sites').order_by('pk'))
+    settings_apps = [
+        ProviderApp.from_settings(provider, app_config)
+        for provider, config in getattr(settings, 'SOCIALACCOUNT_PROVIDERS', {}).items()
+        for app_config in config.get('APPS') or ([config['APP']] if config.get('APP') else [])
+    ]
+
+    # Only fall back to a database row when settings do not already define the
+    # app: allauth lists both, and two apps for one provider make get_app() fail.
+    configured = {app.provider for app in rows}
+    configured.update(app.provider for app in settings_apps if app.client_id and app.secret)
+    for provider in ENV_PROVIDERS:
+        if create_missing and provider not in configured:
+            app = create_app_from_env(provider)
+            if app is not None:
+                rows.append(app)
+
+    # Database apps first, then the ones from settings, in the order allauth lists them
+    entries = [ProviderApp.from_social_app(app) for app in rows] + settings_apps
+
+    registry = {}
+    for app in entries:
+        if not app.client_id or not app.secret:
+            logger.warning(f"Ignoring {app.provider} app {app.pk or '(settings)'}: client id or secret is empty")
+            continue
+        registry.setdefault(app.provider, []).append(app)
+    return MappingProxyType({provider: tuple(apps) for provider, apps in registry.items()})
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    registry = _registry
+    if registry is None:
+        with _registry_lock:
+            registry = _registry
+            if registry is None:
+                registry = _registry = load_registry()
+    return registry
+
+
+def invalidate_registry(**kwargs):
+    global _registry
+    _registry = None
+
+
+def get_provider_config(provider):
+    """Return the ProviderApp for `provider`; raises ValueError if it is not configured."""
+    apps = get_registry().get(provider)
+    if not apps:
+        if provider not in ENV_PROVIDERS:
+            raise ValueError(f"Unsupported provider: {provider}")
+        raise ValueError(f"Missing {provider} OAuth credentials. Set them in environment variables or settings.")
+    return apps[0]
+
+
+def list_provider_apps(provider=None, client_id=None, site_id=None):
+    return [
+        app
+        for apps in get_registry().values()
+        for app in apps
+        if app.matches(provider=provider, client_id=client_id, site_id=site_id)
+    ]
+
+
+@receiver(post_save, sender=SocialApp)
+@receiver(post_delete, sender=SocialApp)
+def socialapp_changed(sender, **kwargs):
+    invalidate_registry()
+
+
+@receiver(m2m_changed, sender=SocialApp.sites.through)
+def socialapp_sites_changed(sender, **kwargs):
+    invalidate_registry()
+
+
+@checks.register(checks.Tags.database)
+def check_provider_apps(app_configs, databases=None, **kwargs):
+    """Load the registry (with `manage.py check --database default`) and report unusable providers."""
+    if not databases:
+        return []
+    try:
+        registry = load_registry(create_missing=False)
+    except DatabaseError:
+        # Tables not migrated yet, e.g. when this runs ahead of `migrate`
+        return []
+    return [
+        checks.Warning(
+            f"No usable OAuth app for '{provider}'.",
+            hint=f"Add a SocialApp with a client id and secret, or set {ENV_PROVIDERS[provider][0]} "
+                 f"and {ENV_PROVIDERS[provider][1]}.",
+            id='authentication.W001',
+        )
+        for provider in ENV_PROVIDERS
+        if provider not in registry and not all(env_credentials(provider)[:2])
+    ]
@@ -0,0 +1,187 @@
+"""
+Shared HTTP client for OAuth provider calls.
+
+One process-wide requests.Session keeps TLS connections to Google and GitHub
+alive between logins. Every call gets a timeout, idempotent calls are retried
+with exponential backoff, and per-endpoint latency is recorded in
+`ProviderClient.metrics`. Setting OAUTH_HTTP_CLIENT['STUB'] swaps the network
+for StubProviderAdapter so the whole OAuth flow can be load-tested offline.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'TIMEOUT': (3.05, 10),  # (connect, read) seconds
+    'RETRIES': 2,
+    'BACKOFF_FACTOR': 0.3,
+    'POOL_MAXSIZE': 20,
+    'STUB': False,
+}
+
+
+class ProviderMetrics:
+    """Thread-safe call counts and latency per (provider, endpoint)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+
+    def record(self, provider, endpoint, elapsed_ms, ok):
+        with self._lock:
+            stats = self._stats[(provider, endpoint)]
+            stats['calls'] += 1
+            stats['errors'] += 0 if ok else 1
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+    def snapshot(self):
+        """Return {"provider endpoint": stats} including the mean latency."""
+        with self._lock:
+            return {
+                f"{provider} {endpoint}": {
+                    **stats,
+                    'avg_ms': stats['total_ms'] / stats['calls'] if stats['calls'] else 0.0,
+                }
+                for (provider, endpoint), stats in self._stats.items()
+            }
+
+
+class StubProviderAdapter(BaseAdapter):
+    """
+    Answers the Google and GitHub endpoints used by the OAuth views locally.
+    The authorization code determines the identity: code "alice" logs in as
+    alice@stub.local, so load tests can spread logins across many users.
+    """
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        route = f"{url.netloc}{url.path}"
+        form = {key: values[0] for key, values in parse_qs(request.body or '').items()}
+        bearer = request.headers.get('Authorization', '').split(' ')[-1]
+        identity = bearer.removeprefix('stub-')
+        uid = int(hashlib.sha256(identity.encode()).hexdigest()[:12], 16)
+
+        if route in ('oauth2.googleapis.com/token', 'github.com/login/oauth/access_token'):
+            subject = form.get('code') or form.get('refresh_token', '').removeprefix('stub-refresh-')
+            payload = {
+                'access_token': f'stub-{subject}',
+                'refresh_token': f'stub-refresh-{subject}',
+                'expires_in': 3600,
+                'token_type': 'bearer',
+            }
+        elif route == 'www.googleapis.com/oauth2/v2/userinfo':
+            payload = {
+                'id': str(uid),
+                'email': f'{identity}@stub.local',
+                'given_name': identity.title(),
+                'family_name': 'Stub',
+            }
+        elif route == 'api.github.com/user':
+            payload = {'id': uid, 'login': identity, 'name': f'{identity.title()} Stub', 'email': None}
+        elif route == 'api.github.com/user/emails':
+            payload = [{'email': f'{identity}@stub.local', 'primary': True, 'verified': True}]
+        else:
+            return self._response(request, 404, {'error': 'not_found'})
+
+        return self._response(request, 200, payload)
+
+    @staticmethod
+    def _response(request, status_code, payload):
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = json.dumps(payload).encode()
+        response.headers['Content-Type'] = 'application/json'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class ProviderClient:
+    """Pooled, instrumented HTTP client for OAuth provider APIs."""
+
+    def __init__(self, options=None):
+        self.options = {**DEFAULTS, **(options or {})}
+        self.metrics = ProviderMetrics()
+        self.session = requests.Session()
+
+        if self.options['STUB']:
+            adapter = StubProviderAdapter()
+        else:
+            # Token exchanges are POSTs with single-use codes: urllib3 only
+            # retries those on connection errors, before anything was sent.
+            retries = Retry(
+                total=self.options['RETRIES'],
+                backoff_factor=self.options['BACKOFF_FACTOR'],
+                status_forcelist=(500, 502, 503, 504),
+                allowed_methods=frozenset({'GET'}),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=self.options['POOL_MAXSIZE'],
+                max_retries=retries,
+            )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.options['POOL_MAXSIZE'], thread_name_prefix='oauth-http'
+        )
+
+    def request(self, provider, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.options['TIMEOUT'])
+        endpoint = urlsplit(url).path
+        started = time.monotonic()
+        ok = False
+        try:
+            response = self.session.request(method, url, **kwargs)
+            ok = response.status_code < 500
+            return response
+        finally:
+            elapsed_ms = (time.monotonic() - started) * 1000
+            self.metrics.record(provider, endpoint, elapsed_ms, ok)
+            logger.debug(f"{provider} {method} {endpoint} took {elapsed_ms:.0f}ms")
+
+    def get(self, provider, url, **kwargs):
+        return self.request(provider, 'GET', url, **kwargs)
+
+    def post(self, provider, url, **kwargs):
+        return self.request(provider, 'POST', url, **kwargs)
+
+    def submit(self, provider, method, url, **kwargs):
+        """Start a request on the client's worker pool and return its Future."""
+        return self._executor.submit(self.request, provider, method, url, **kwargs)
+
+    def get_many(self, provider, urls, **kwargs):
+        """GET several URLs concurrently over the shared pool; responses come back in order."""
+        futures = [self.submit(provider, 'GET', url, **kwargs) for url in urls]
+        return [future.result() for future in futures]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_provider_client():
+    """Return the process-wide ProviderClient configured by OAUTH_HTTP_CLIENT."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ProviderClient(getattr(settings, 'OAUTH_HTTP_CLIENT', {}))
+    return _client
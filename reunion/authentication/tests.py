@@ -1,3 +1,514 @@
-from django.test import TestCase
+import os
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import requests
+from allauth.socialaccount.models import SocialApp
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.core import signing
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection
+from django.db.models.query import QuerySet
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from . import blacklist, last_login, oauth_state, provider_config, token_refresh, usernames
+from .providers import ProviderClient, StubProviderAdapter
+from .blacklist import FilteredRefreshToken
+from .models import OAuthToken
+from .views import store_login_tokens, verify_login
+
+User = get_user_model()
+
+
+class StoreLoginTokensTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='x')
+        self.expires_at = timezone.now() + timezone.timedelta(hours=1)
+
+    def test_upserts_by_user_and_provider(self):
+        store_login_tokens(self.user, 'google', 'a1', 'r1', self.expires_at)
+        store_login_tokens(self.user, 'google', 'a2', 'r2', self.expires_at)
+        token = OAuthToken.objects.get(user=self.user, provider='google')
+        self.assertEqual((token.access_token, token.refresh_token), ('a2', 'r2'))
+
+    def test_login_without_refresh_token_keeps_the_stored_one(self):
+        store_login_tokens(self.user, 'google', 'a1', 'r1', self.expires_at)
+        store_login_tokens(self.user, 'google', 'a2', None, self.expires_at)
+        token = OAuthToken.objects.get(user=self.user, provider='google')
+        self.assertEqual((token.access_token, token.refresh_token), ('a2', 'r1'))
+
+    def test_mysql_upsert_has_no_conflict_target(self):
+        """MySQL rejects unique_fields; the options must pass Django's check for a backend like it."""
+        calls = []
+
+        def check_and_record(objs, **kwargs):
+            fields = OAuthToken._meta.get_field
+            QuerySet(OAuthToken)._check_bulk_create_options(
+                kwargs.get('ignore_conflicts', False), kwargs.get('update_conflicts', False),
+                [fields(name) for name in kwargs.get('update_fields') or ()],
+                [fields(name) for name in kwargs.get('unique_fields') or ()],
+            )
+            calls.append(kwargs)
+
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False), \
+                mock.patch.object(OAuthToken.objects, 'bulk_create', side_effect=check_and_record):
+            store_login_tokens(self.user, 'github', 'a1', None, None)
+        self.assertNotIn('unique_fields', calls[0])
+        self.assertTrue(calls[0]['update_conflicts'])
+
+
+class RefreshTokenViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='x')
+        self.client = APIClient()
+
+    def refresh(self):
+        token = str(FilteredRefreshToken.for_user(self.user))
+        return self.client.post('/api/auth/token/refresh/', {'refresh_token': token}, format='json')
+
+    def test_active_user_gets_new_tokens(self):
+        response = self.refresh()
+        self.assertEqual(response.status_code, 200)
+
+    def test_inactive_user_is_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+        response = self.refresh()
+        self.assertEqual(response.status_code, 401)
+
+
+class SweepExpiredTokensTests(TestCase):
+    def test_keeps_non_expiring_github_tokens(self):
+        expired = timezone.now() - timezone.timedelta(hours=1)
+        alice = User.objects.create_user('alice', password='x')
+        OAuthToken.objects.create(user=alice, provider='google', access_token='g', expires_at=expired)
+        github = OAuthToken.objects.create(user=alice, provider='github', access_token='h', expires_at=expired)
+        call_command('sweep_expired_tokens', sleep=0, stdout=mock.Mock())
+        self.assertEqual(list(OAuthToken.objects.values_list('id', flat=True)), [github.id])
+
+
+class ConditionalRefreshTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='x')
+        self.token = OAuthToken.objects.create(
+            user=self.user, provider='google', access_token='a1', refresh_token='r1',
+            expires_at=timezone.now() + timezone.timedelta(seconds=30),
+        )
+        self.app = mock.Mock(client_id='id', secret='secret')
+
+    def provider_answers(self, body, meanwhile=None):
+        """Patch the provider call; `meanwhile` runs while the request is in flight."""
+        def submit(oauth_token, social_app):
+            if meanwhile:
+                meanwhile()
+            response = mock.Mock()
+            response.json.return_value = body
+            return mock.Mock(**{'result.return_value': response})
+        return mock.patch.object(token_refresh, 'submit_refresh', side_effect=submit)
+
+    def rotate_elsewhere(self):
+        OAuthToken.objects.filter(pk=self.token.pk).update(access_token='a-login', refresh_token='r-login')
+
+    def test_ensure_fresh_saves_the_refresh(self):
+        with self.provider_answers({'access_token': 'a2', 'refresh_token': 'r2'}):
+            token = token_refresh.ensure_fresh(self.token, self.app)
+        self.assertEqual((token.access_token, token.previous_refresh_token), ('a2', 'r1'))
+        self.token.refresh_from_db()
+        self.assertEqual((self.token.access_token, self.token.refresh_token), ('a2', 'r2'))
+
+    def test_ensure_fresh_does_not_overwrite_a_concurrent_login(self):
+        with self.provider_answers({'access_token': 'a2', 'refresh_token': 'r2'}, self.rotate_elsewhere):
+            token = token_refresh.ensure_fresh(self.token, self.app)
+        self.assertEqual((token.access_token, token.refresh_token), ('a-login', 'r-login'))
+
+    def test_worker_does_not_overwrite_a_concurrent_login(self):
+        with self.provider_answers({'access_token': 'a2', 'refresh_token': 'r2'}, self.rotate_elsewhere):
+            self.assertEqual(token_refresh.refresh_batch([self.token], {'google': self.app}), (0, 0))
+        self.token.refresh_from_db()
+        self.assertEqual(self.token.refresh_token, 'r-login')
+
+    def test_rejected_grant_only_clears_the_token_it_used(self):
+        with self.provider_answers({'error': 'invalid_grant'}, self.rotate_elsewhere):
+            self.assertEqual(token_refresh.refresh_batch([self.token], {'google': self.app}), (0, 1))
+        self.token.refresh_from_db()
+        self.assertEqual(self.token.refresh_token, 'r-login')
+
+        self.token.refresh_from_db()
+        with self.provider_answers({'error': 'invalid_grant'}):
+            token_refresh.refresh_batch([self.token], {'google': self.app})
+        self.token.refresh_from_db()
+        self.assertIsNone(self.token.refresh_token)
+
+
+class AsyncLoginTests(TestCase):
+    async def test_non_object_body_is_rejected(self):
+        for body in ('[]', '"alice"', '1', 'null'):
+            response = await self.async_client.post('/api/auth/login/async/', body, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+
+class LoginFallbackTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user('alice', email='alice@example.com', password='alice-pw')
+        self.carol = User.objects.create_user('carol', email='carol@example.com', password='carol-pw')
+
+    def test_username_login(self):
+        self.assertEqual(verify_login('alice', 'carol@example.com', 'alice-pw'), self.alice)
+        self.assertEqual(verify_login('alice', None, 'alice-pw'), self.alice)
+
+    def test_falls_back_to_the_email_when_the_username_fails(self):
+        self.assertEqual(verify_login('alice', 'carol@example.com', 'carol-pw'), self.carol)
+        self.assertEqual(verify_login('nobody', 'carol@example.com', 'carol-pw'), self.carol)
+        response = APIClient().post(
+            '/api/auth/login/', {'username': 'alice', 'email': 'carol@example.com', 'password': 'carol-pw'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user']['username'], 'carol')
+
+    def test_wrong_password_or_shared_email_fails(self):
+        self.assertIsNone(verify_login('alice', 'carol@example.com', 'wrong'))
+        get_user_model().objects.create_user('carla', email='carol@example.com', password='carol-pw')
+        self.assertIsNone(verify_login(None, 'carol@example.com', 'carol-pw'))
+
+
+class LastLoginBufferTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        self.now = timezone.now()
+        # No flusher thread or exit hook: the tests flush by hand
+        for target in ('threading.Thread', 'atexit.register'):
+            patcher = mock.patch(f'authentication.last_login.{target}')
+            self.addCleanup(patcher.stop)
+            patcher.start()
+
+    def last_logins(self):
+        return dict(get_user_model().objects.values_list('username', 'last_login'))
+
+    def test_logins_coalesce_to_the_latest_per_user(self):
+        buffer = last_login.LastLoginBuffer(interval=60)
+        minute = timezone.timedelta(minutes=1)
+        for user, when in ((self.alice, self.now), (self.alice, self.now + minute),
+                           (self.alice, self.now - minute), (self.bob, self.now)):
+            buffer.touch(user.pk, when)
+        self.assertEqual(last_login.threading.Thread.call_count, 1)
+        self.assertEqual(self.last_logins(), {'alice': None, 'bob': None})
+
+        with self.assertNumQueries(1):
+            self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(self.last_logins(), {'alice': self.now + minute, 'bob': self.now})
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_flush_writes_one_update_per_chunk(self):
+        buffer = last_login.LastLoginBuffer(interval=60)
+        buffer.touch(self.alice.pk, self.now)
+        buffer.touch(self.bob.pk, self.now)
+        with mock.patch.object(last_login, 'FLUSH_CHUNK_SIZE', 1), self.assertNumQueries(2):
+            buffer.flush()
+        self.assertEqual(self.last_logins(), {'alice': self.now, 'bob': self.now})
+
+    def test_failed_flush_keeps_the_pending_timestamps(self):
+        buffer = last_login.LastLoginBuffer(interval=60)
+        buffer.touch(self.alice.pk, self.now)
+        with mock.patch.object(QuerySet, 'update', side_effect=DatabaseError('Lock wait timeout')):
+            with self.assertRaises(DatabaseError):
+                buffer.flush()
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(self.last_logins()['alice'], self.now)
+
+    def test_zero_interval_writes_through(self):
+        buffer = last_login.LastLoginBuffer(interval=0)
+        buffer.touch(self.alice.pk, self.now)
+        self.assertEqual(self.last_logins()['alice'], self.now)
+        last_login.threading.Thread.assert_not_called()
+
+
+class UsernameAllocationTests(TestCase):
+    def take(self, *names):
+        for name in names:
+            get_user_model().objects.create_user(name, password='x')
+
+    def test_free_base_is_used_as_is(self):
+        self.take('johnny', 'joh')
+        self.assertEqual(usernames.next_free_username('john'), 'john')
+
+    def test_next_suffix_follows_the_highest_taken(self):
+        self.take('john', 'john1', 'john7', 'johnny2')
+        self.assertEqual(usernames.next_free_username('john'), 'john8')
+
+    def test_collisions_are_case_insensitive(self):
+        self.take('John')
+        self.assertEqual(usernames.next_free_username('john'), 'john1')
+
+    def test_empty_base_falls_back_to_a_fixed_one(self):
+        self.take('123', 'user')
+        self.assertEqual(usernames.next_free_username(''), 'user1')
+
+    def test_lost_race_retries_with_the_next_suffix(self):
+        self.take('john', 'john1')
+        next_free_username = usernames.next_free_username
+        # The first lookup ran before another sign-up took john1
+        answers = iter(['john1'])
+        with mock.patch.object(
+            usernames, 'next_free_username', side_effect=lambda base: next(answers, None) or next_free_username(base)
+        ):
+            user = usernames.create_social_user('john', email='john@example.com')
+        self.assertEqual(user.username, 'john2')
+        self.assertFalse(user.has_usable_password())
+
+    def test_gives_up_after_max_attempts(self):
+        with mock.patch.object(get_user_model().objects, 'create_user', side_effect=IntegrityError('duplicate')) as create:
+            with self.assertRaises(IntegrityError):
+                usernames.create_social_user('john')
+        self.assertEqual(create.call_count, usernames.MAX_ATTEMPTS)
+
+
+class BlacklistFilterTests(TestCase):
+    def setUp(self):
+        self.filter = blacklist.BlacklistFilter({'SYNC_INTERVAL': 0, 'SYNC_OVERLAP': 5})
+        patcher = mock.patch.object(blacklist, 'blacklist_filter', self.filter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def outstanding(self, jti):
+        return OutstandingToken.objects.create(jti=jti, token=jti, expires_at=timezone.now())
+
+    def test_build_and_lookup(self):
+        BlacklistedToken.objects.create(token=self.outstanding('old'))
+        self.assertTrue(self.filter.might_contain('old'))
+        self.assertFalse(self.filter.might_contain('fresh'))
+        self.assertEqual(self.filter._bloom.count, 1)
+
+    def test_sync_rereads_rows_committed_below_the_last_id(self):
+        first, late, last = (self.outstanding(jti) for jti in ('first', 'late', 'last'))
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(id=1, token=first), BlacklistedToken(id=3, token=last)])
+        self.assertFalse(self.filter.might_contain('late'))
+        # Another process was given id 2 before id 3 but committed after it; bulk_create sends no signal
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(id=2, token=late)])
+        self.assertTrue(self.filter.might_contain('late'))
+        self.assertEqual(self.filter._bloom.count, 3)
+
+    def test_receiver_reuses_the_token_it_is_given(self):
+        self.filter.might_contain('warm-up')
+        token = self.outstanding('logout')
+        with self.assertNumQueries(1):
+            BlacklistedToken.objects.create(token=token)
+        self.assertIn('logout', self.filter._bloom)
+
+        other = self.outstanding('admin')
+        with self.assertNumQueries(2):
+            BlacklistedToken.objects.create(token_id=other.id)
+        self.assertIn('admin', self.filter._bloom)
+
+    def test_receiver_skips_an_unbuilt_filter(self):
+        token = self.outstanding('early')
+        with self.assertNumQueries(1):
+            BlacklistedToken.objects.create(token_id=token.id)
+        self.assertFalse(self.filter.is_built)
+
+
+class FakeAdapter(requests.adapters.BaseAdapter):
+    """Answers every request with the status code mapped to its path, recording what was sent."""
+
+    def __init__(self, statuses=None, error=None):
+        super().__init__()
+        self.statuses = statuses or {}
+        self.error = error
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append((request.method, request.url, kwargs))
+        if self.error:
+            raise self.error
+        path = requests.utils.urlparse(request.url).path
+        return StubProviderAdapter._response(request, self.statuses.get(path, 200), {'path': path})
+
+    def close(self):
+        pass
+
+
+class ProviderClientTests(SimpleTestCase):
+    def client_with(self, adapter=None, **options):
+        client = ProviderClient(options)
+        self.addCleanup(client._executor.shutdown)
+        if adapter:
+            client.session.mount('https://', adapter)
+        return client
+
+    def test_only_gets_are_retried_on_server_errors(self):
+        retries = self.client_with(RETRIES=3).session.get_adapter('https://oauth2.googleapis.com').max_retries
+        self.assertEqual(retries.total, 3)
+        self.assertTrue(retries.is_retry('GET', 503))
+        self.assertFalse(retries.is_retry('GET', 404))
+        # A token exchange spends its single-use code
+        self.assertFalse(retries.is_retry('POST', 503))
+        self.assertFalse(retries._is_method_retryable('POST'))
+
+    def test_calls_get_a_timeout_and_are_recorded(self):
+        adapter = FakeAdapter({'/user/emails': 502})
+        client = self.client_with(adapter)
+        self.assertEqual(client.get('github', 'https://api.github.com/user').status_code, 200)
+        self.assertEqual(client.get('github', 'https://api.github.com/user/emails').status_code, 502)
+        client.post('github', 'https://github.com/login/oauth/access_token', timeout=1)
+        self.assertEqual([kwargs['timeout'] for _, _, kwargs in adapter.sent], [(3.05, 10), (3.05, 10), 1])
+
+        metrics = client.metrics.snapshot()
+        self.assertEqual(set(metrics), {'github /user', 'github /user/emails', 'github /login/oauth/access_token'})
+        self.assertEqual((metrics['github /user']['calls'], metrics['github /user']['errors']), (1, 0))
+        self.assertEqual(metrics['github /user/emails']['errors'], 1)
+
+    def test_failed_calls_are_recorded_as_errors(self):
+        client = self.client_with(FakeAdapter(error=requests.ConnectionError('reset by peer')))
+        with self.assertRaises(requests.ConnectionError):
+            client.get('google', 'https://www.googleapis.com/oauth2/v2/userinfo')
+        self.assertEqual(client.metrics.snapshot()['google /oauth2/v2/userinfo']['errors'], 1)
+
+    def test_stub_adapter_answers_the_oauth_flow(self):
+        client = self.client_with(STUB=True)
+        token = client.post(
+            'google', 'https://oauth2.googleapis.com/token', data={'code': 'alice', 'grant_type': 'authorization_code'}
+        ).json()
+        self.assertEqual((token['access_token'], token['refresh_token']), ('stub-alice', 'stub-refresh-alice'))
+
+        headers = {'Authorization': f"Bearer {token['access_token']}"}
+        google = client.get('google', 'https://www.googleapis.com/oauth2/v2/userinfo', headers=headers).json()
+        github = client.get('github', 'https://api.github.com/user', headers=headers).json()
+        self.assertEqual(google['email'], 'alice@stub.local')
+        self.assertEqual((github['login'], str(github['id'])), ('alice', google['id']))
+
+        refreshed = client.post(
+            'google', 'https://oauth2.googleapis.com/token', data={'refresh_token': 'stub-refresh-alice'}
+        ).json()
+        self.assertEqual(refreshed['access_token'], 'stub-alice')
+        self.assertEqual(client.get('google', 'https://www.googleapis.com/unknown').status_code, 404)
+
+    def test_get_many_fetches_concurrently_in_order(self):
+        in_flight = threading.Barrier(2, timeout=2)
+        order = []
+
+        class ConcurrentAdapter(FakeAdapter):
+            def send(self, request, **kwargs):
+                # Both requests must be in flight before either answers
+                in_flight.wait()
+                if request.url.endswith('/user'):
+                    time.sleep(0.05)
+                order.append(request.url)
+                return super().send(request, **kwargs)
+
+        client = self.client_with(ConcurrentAdapter())
+        user, emails = client.get_many(
+            'github', ['https://api.github.com/user', 'https://api.github.com/user/emails'],
+            headers={'Authorization': 'token t'},
+        )
+        self.assertEqual((user.json()['path'], emails.json()['path']), ('/user', '/user/emails'))
+        self.assertEqual(order, ['https://api.github.com/user/emails', 'https://api.github.com/user'])
+        self.assertEqual(client.metrics.snapshot()['github /user']['calls'], 1)
+
+    def test_get_many_raises_the_first_failure(self):
+        client = self.client_with(FakeAdapter(error=requests.Timeout('read timed out')))
+        with self.assertRaises(requests.Timeout):
+            client.get_many('github', ['https://api.github.com/user', 'https://api.github.com/user/emails'])
+
+
+class OAuthStateTests(SimpleTestCase):
+    def request(self, nonce=None):
+        request = RequestFactory().post('/api/auth/google/callback/')
+        if nonce is not None:
+            request.COOKIES[oauth_state.NONCE_COOKIE] = nonce
+        return request
+
+    def test_state_is_bound_to_provider_and_browser(self):
+        state, nonce = oauth_state.issue_state('google')
+        self.assertTrue(oauth_state.verify_state(self.request(nonce), 'google', state))
+        self.assertFalse(oauth_state.verify_state(self.request(nonce), 'github', state))
+        self.assertFalse(oauth_state.verify_state(self.request(), 'google', state))
+        _, other_nonce = oauth_state.issue_state('google')
+        self.assertFalse(oauth_state.verify_state(self.request(other_nonce), 'google', state))
+
+    def test_tampered_or_missing_state_is_rejected(self):
+        state, nonce = oauth_state.issue_state('google')
+        tampered = state[:-1] + ('A' if state[-1] != 'A' else 'B')
+        self.assertFalse(oauth_state.verify_state(self.request(nonce), 'google', tampered))
+        forged = signing.dumps({'provider': 'google', 'nonce': nonce}, salt='another.salt', compress=True)
+        self.assertFalse(oauth_state.verify_state(self.request(nonce), 'google', forged))
+        self.assertFalse(oauth_state.verify_state(self.request(nonce), 'google', ''))
+
+    @override_settings(OAUTH_STATE_MAX_AGE=60)
+    def test_expired_state_is_rejected(self):
+        state, nonce = oauth_state.issue_state('google')
+        now = signing.time.time()
+        with mock.patch('django.core.signing.time.time', return_value=now + 59):
+            self.assertTrue(oauth_state.verify_state(self.request(nonce), 'google', state))
+        with mock.patch('django.core.signing.time.time', return_value=now + 61):
+            self.assertFalse(oauth_state.verify_state(self.request(nonce), 'google', state))
+
+
+@mock.patch.dict(os.environ, {'GOOGLE_CLIENT_ID': 'google-id', 'GOOGLE_CLIENT_SECRET': 'google-secret'})
+class OAuthStateFlowTests(TestCase):
+    def setUp(self):
+        provider_config.invalidate_registry()
+        self.addCleanup(provider_config.invalidate_registry)
+
+    def test_callback_accepts_only_the_browser_that_asked(self):
+        client = APIClient()
+        response = client.get('/api/auth/google/auth-url/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(oauth_state.NONCE_COOKIE, response.cookies)
+        self.assertTrue(response.cookies[oauth_state.NONCE_COOKIE]['httponly'])
+        state = response.data['authorization_url'].split('&state=')[1].split('&')[0]
+
+        # Valid state, so the view moves on to the missing code
+        response = client.post('/api/auth/google/callback/', {'state': state})
+        self.assertEqual(response.data, {'error': 'No authorization code provided'})
+
+        response = APIClient().post('/api/auth/google/callback/', {'state': state, 'code': 'c'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'Invalid state parameter'})
+
+
+@override_settings(SOCIALACCOUNT_PROVIDERS={})
+@mock.patch.dict(os.environ, {name: '' for names in provider_config.ENV_PROVIDERS.values() for name in names[:2]})
+class ProviderRegistryTests(TestCase):
+    def setUp(self):
+        provider_config.invalidate_registry()
+        self.addCleanup(provider_config.invalidate_registry)
+        self.app = SocialApp.objects.create(provider='google', name='Google', client_id='id-1', secret='s')
+        self.app.sites.add(Site.objects.get_current())
+
+    def test_registry_is_loaded_once(self):
+        self.assertEqual(provider_config.get_provider_config('google').client_id, 'id-1')
+        with self.assertNumQueries(0):
+            self.assertEqual(provider_config.get_provider_config('google').client_id, 'id-1')
+        with self.assertRaisesMessage(ValueError, 'Missing github OAuth credentials'):
+            provider_config.get_provider_config('github')
+
+    def test_save_reloads_the_registry(self):
+        provider_config.get_provider_config('google')
+        self.app.client_id = 'id-2'
+        self.app.save()
+        self.assertEqual(provider_config.get_provider_config('google').client_id, 'id-2')
+
+    def test_delete_reloads_the_registry(self):
+        provider_config.get_provider_config('google')
+        self.app.delete()
+        with self.assertRaises(ValueError):
+            provider_config.get_provider_config('google')
+
+    def test_site_changes_reload_the_registry(self):
+        other = Site.objects.create(domain='other.example.com', name='other')
+        self.assertEqual(provider_config.list_provider_apps('google', site_id=other.id), [])
+        self.app.sites.add(other)
+        self.assertEqual(len(provider_config.list_provider_apps('google', site_id=other.id)), 1)
+        self.app.sites.remove(other)
+        self.assertEqual(provider_config.list_provider_apps('google', site_id=other.id), [])
+        self.app.sites.add(other)
+        provider_config.list_provider_apps()
+        self.app.sites.clear()
+        self.assertEqual(provider_config.list_provider_apps('google', site_id=other.id), [])
@@ -0,0 +1,184 @@
+"""
+Provider access-token refresh, shared by the refresh endpoints and the
+`refresh_oauth_tokens` background worker.
+
+The worker walks OAuthToken along its expires_at index and renews tokens that
+expire within OAUTH_TOKEN_REFRESH['WINDOW'] seconds, a batch of provider calls
+at a time over the pooled provider client. The refresh endpoints then usually
+find a token that is still fresh and answer from the database without calling
+the provider; they only refresh synchronously when the worker fell behind.
+
+A refresh is written back only if the row still holds the refresh token it
+was made with (`UPDATE ... WHERE id = %s AND refresh_token = <used>`). When a
+login, an endpoint and the worker race on the same row, the first write wins
+and the others are dropped instead of overwriting newer tokens, and a
+rejected grant only clears a refresh token that nobody has replaced since.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from requests.exceptions import RequestException
+
+from authentication.models import OAuthToken
+from authentication.providers import get_provider_client
+
+logger = logging.getLogger(__name__)
+
+TOKEN_URLS = {
+    'google': 'https://oauth2.googleapis.com/token',
+    'github': 'https://github.com/login/oauth/access_token',
+}
+
+DEFAULTS = {
+    'WINDOW': 600,  # seconds before expiry a token gets refreshed
+    'BATCH_SIZE': 50,
+}
+
+
+def refresh_options():
+    return {**DEFAULTS, **getattr(settings, 'OAUTH_TOKEN_REFRESH', {})}
+
+
+class TokenRefreshError(Exception):
+    """The provider refused to refresh a token."""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+def submit_refresh(oauth_token, social_app):
+    """Start the provider's refresh_token grant for `oauth_token`; returns a Future of the response."""
+    payload = {
+        'client_id': social_app.client_id,
+        'client_secret': social_app.secret,
+        'refresh_token': oauth_token.refresh_token,
+        'grant_type': 'refresh_token',
+    }
+    return get_provider_client().submit(
+        oauth_token.provider, 'POST', TOKEN_URLS[oauth_token.provider],
+        data=payload, headers={'Accept': 'application/json'},
+    )
+
+
+def apply_refresh(oauth_token, response):
+    """Copy a refresh response onto `oauth_token` (unsaved); raises TokenRefreshError if it was refused."""
+    token_data = response.json()
+    if 'error' in token_data or not token_data.get('access_token'):
+        raise TokenRefreshError(
+            token_data.get('error_description', token_data.get('error', 'No access token returned')),
+            code=token_data.get('error'),
+        )
+
+    new_refresh_token = token_data.get('refresh_token', oauth_token.refresh_token)  # Use old if not provided
+    if new_refresh_token != oauth_token.refresh_token:
+        oauth_token.previous_refresh_token = oauth_token.refresh_token
+    oauth_token.access_token = token_data['access_token']
+    oauth_token.refresh_token = new_refresh_token
+    oauth_token.expires_at = timezone.now() + timezone.timedelta(seconds=token_data.get('expires_in', 3600))
+    oauth_token.updated_at = timezone.now()
+    return oauth_token
+
+
+REFRESHED_FIELDS = ['access_token', 'refresh_token', 'previous_refresh_token', 'expires_at', 'updated_at']
+
+
+def save_refresh(oauth_token, used_refresh_token, fields=REFRESHED_FIELDS):
+    """Write `fields` unless the row no longer holds `used_refresh_token`; returns whether it was written."""
+    updated = OAuthToken.objects.filter(pk=oauth_token.pk, refresh_token=used_refresh_token).update(
+        **{name: getattr(oauth_token, name) for name in fields}
+    )
+    return updated == 1
+
+
+def get_token_for_refresh(provider, refresh_token):
+    """Find the OAuthToken a client's refresh token belongs to, also after a background rotation."""
+    return OAuthToken.objects.get(
+        Q(refresh_token=refresh_token) | Q(previous_refresh_token=refresh_token),
+        provider=provider,
+    )
+
+
+def ensure_fresh(oauth_token, social_app):
+    """Return `oauth_token`, refreshing it with the provider first only if it is about to expire."""
+    if not oauth_token.expires_within(refresh_options()['WINDOW'] // 2):
+        return oauth_token
+    used_refresh_token = oauth_token.refresh_token
+    apply_refresh(oauth_token, submit_refresh(oauth_token, social_app).result())
+    if not save_refresh(oauth_token, used_refresh_token):
+        # Refreshed or replaced elsewhere meanwhile; the stored tokens win
+        oauth_token.refresh_from_db()
+    return oauth_token
+
+
+def refresh_batch(tokens, social_apps):
+    """
+    Refresh `tokens` concurrently and save the successful ones in one transaction.
+    Returns (refreshed, failed). Tokens whose refresh token the provider rejects
+    are cleared so they are not retried. Rows changed since `tokens` were read
+    are left as they are and counted as neither.
+    """
+    futures = [
+        (token, token.refresh_token, submit_refresh(token, social_apps[token.provider]))
+        for token in tokens
+    ]
+    refreshed, revoked, failed = [], [], 0
+
+    for token, used_refresh_token, future in futures:
+        try:
+            refreshed.append((apply_refresh(token, future.result()), used_refresh_token))
+        except TokenRefreshError as e:
+            failed += 1
+            logger.warning(f"Refreshing {token.provider} token {token.id} failed: {e}")
+            if e.code == 'invalid_grant':
+                token.refresh_token = None
+                revoked.append((token, used_refresh_token))
+        except (RequestException, ValueError) as e:
+            failed += 1
+            logger.warning(f"Refreshing {token.provider} token {token.id} failed: {e}")
+
+    with transaction.atomic():
+        saved = sum(save_refresh(token, used) for token, used in refreshed)
+        for token, used in revoked:
+            save_refresh(token, used, fields=['refresh_token'])
+    return saved, failed
+
+
+def expiring_tokens(window, providers):
+    """Refreshable tokens expiring within `window` seconds, soonest first, along the expires_at index."""
+    return OAuthToken.objects.filter(
+        expires_at__lt=timezone.now() + timezone.timedelta(seconds=window),
+        refresh_token__isnull=False,
+        provider__in=providers,
+    ).order_by('expires_at', 'id')
+
+
+def refresh_expiring_tokens(social_apps, window=None, batch_size=None):
+    """Refresh every token expiring within `window` seconds in batches; returns (refreshed, failed)."""
+    options = refresh_options()
+    window = options['WINDOW'] if window is None else window
+    batch_size = batch_size or options['BATCH_SIZE']
+    # Tokens refreshed during this pass are left alone even if their new expiry is still in the window
+    queryset = expiring_tokens(window, list(social_apps)).filter(updated_at__lt=timezone.now())
+    total_refreshed = total_failed = 0
+    last_key = None
+
+    while True:
+        batch = queryset
+        if last_key is not None:
+            # Keyset on (expires_at, id) so failed tokens are not picked up again in this pass
+            last_expires_at, last_id = last_key
+            batch = batch.filter(
+                Q(expires_at__gt=last_expires_at) | Q(expires_at=last_expires_at, id__gt=last_id)
+            )
+        batch = list(batch[:batch_size])
+        if not batch:
+            return total_refreshed, total_failed
+        last_key = (batch[-1].expires_at, batch[-1].id)
+
+        refreshed, failed = refresh_batch(batch, social_apps)
+        total_refreshed += refreshed
+        total_failed += failed
@@ -4,7 +4,7 @@ from authentication.views import (
     GoogleAuthURL, GitHubAuthURL,
     google_callback, github_callback,
     refresh_google_token, refresh_github_token,
-    custom_login, refresh_token
+    custom_login, async_login, refresh_token
 )
 from dj_rest_auth.views import LoginView, LogoutView, UserDetailsView
 from django.urls import path, re_path
@@ -12,6 +12,7 @@ from django.urls import path, re_path
 urlpatterns = [
     path("register/", RegisterView.as_view(), name="rest_register"),
     path("login/", custom_login, name="rest_login"),
+    path("login/async/", async_login, name="async_login"),
     path("logout/", LogoutView.as_view(), name="rest_logout"),
     path("user/", UserDetailsView.as_view(), name="rest_user_details"),
     path("token/refresh/", refresh_token, name="token_refresh"),
@@ -0,0 +1,52 @@
+"""
+Username allocation for social sign-up.
+
+Instead of probing `base`, `base1`, `base2`, ... one query at a time, the next
+free suffix is found with a single prefix range scan over the username index.
+Two sign-ups racing for the same suffix are resolved by retrying on the
+unique-constraint violation.
+"""
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+
+User = get_user_model()
+
+MAX_ATTEMPTS = 5
+SUFFIX_ROOM = 6
+# Used when the base is empty (an email like "@example.com"), which would
+# otherwise match every all-digit username
+FALLBACK_BASE = 'user'
+
+
+def next_free_username(base):
+    """Return `base` if unused, otherwise `base` followed by one more than the highest numeric suffix taken."""
+    max_length = User._meta.get_field('username').max_length
+    base = base[:max_length - SUFFIX_ROOM] or FALLBACK_BASE
+    pattern = rf'^{re.escape(base)}[0-9]*$'
+
+    taken = User.objects.filter(
+        username__istartswith=base,
+        username__iregex=pattern,
+    ).values_list('username', flat=True)
+
+    suffixes = [int(name[len(base):] or 0) for name in taken]
+    if not suffixes:
+        return base
+    return f"{base}{max(suffixes) + 1}"
+
+
+def create_social_user(base, **fields):
+    """
+    Create a user with an unusable password under the first free username derived from `base`.
+    Safe to call inside an outer transaction: each attempt runs in its own savepoint.
+    """
+    for _ in range(MAX_ATTEMPTS):
+        username = next_free_username(base)
+        try:
+            with transaction.atomic():
+                return User.objects.create_user(username=username, password=None, **fields)
+        except IntegrityError:
+            continue
+    raise IntegrityError(f"Could not allocate a username for {base!r}")
@@ -1,4 +1,7 @@
+import asyncio
+import json
 from datetime import timedelta
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
 from dj_rest_auth.registration.views import SocialLoginView
 from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
@@ -8,41 +11,35 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.db import transaction
+from django.db.models import Q
 from allauth.socialaccount.models import SocialAccount
 from rest_framework.authtoken.models import Token
-from allauth.socialaccount.models import SocialApp
-from django.contrib.sites.models import Site
-import requests
 import logging
-import os
-import secrets
 from django.conf import settings
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from django.utils import timezone
-from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from rest_framework_simplejwt.exceptions import TokenError
 import hashlib
-from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from requests.exceptions import RequestException
+from authentication.blacklist import FilteredRefreshToken
+from authentication.hashing import HashingPoolFull, get_hashing_pool, hashing_options
+from authentication.jwt_auth import ClaimsRefreshToken, get_cached_user
+from authentication.last_login import last_login_buffer
+from authentication.models import OAuthToken
+from authentication.oauth_state import clear_nonce_cookie, issue_state, set_nonce_cookie, verify_state
+from authentication.provider_config import get_provider_config
+from authentication.providers import get_provider_client
+from authentication.token_refresh import TokenRefreshError, ensure_fresh, get_token_for_refresh
+from authentication.usernames import create_social_user
+from mainapp.fastjson import ORJSONResponse
+from mainapp.upsert import upsert_kwargs
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
-def generate_oauth_state(request):
-    """Generate a secure state parameter and store it in the session"""
-    state = secrets.token_urlsafe(32)
-    request.session['state'] = state
-    request.session.save()
-    print(f"Session Key: {request.session.session_key}")
-    print(f"State stored in session: {request.session.get('state')}")
-    print(f"Session Cookies: {request.COOKIES}")
-    print(f"Session Data: {request.session.items()}")
-
-
-    return state
-
 class CustomGoogleOAuth2Client(OAuth2Client):
     def __init__(
         self,
@@ -98,40 +95,42 @@ class CustomGitHubOAuth2Client(OAuth2Client):
         )
 
 
-def get_or_create_social_app(provider):
-    """Helper function to get or create a social app with environment variables"""
-    try:
-        return SocialApp.objects.get(provider=provider)
-    except SocialApp.DoesNotExist:
-        
-        if provider == 'google':
-            client_id = os.environ.get('GOOGLE_CLIENT_ID', getattr(settings, 'GOOGLE_CLIENT_ID', ''))
-            secret = os.environ.get('GOOGLE_CLIENT_SECRET', getattr(settings, 'GOOGLE_CLIENT_SECRET', ''))
-            name = 'Google OAuth'
-        elif provider == 'github':
-            client_id = os.environ.get('GITHUB_CLIENT_ID', getattr(settings, 'GITHUB_CLIENT_ID', ''))
-            secret = os.environ.get('GITHUB_CLIENT_SECRET', getattr(settings, 'GITHUB_CLIENT_SECRET', ''))
-            name = 'GitHub OAuth'
-        else:
-            raise ValueError(f"Unsupported provider: {provider}")
-        
-        
-        if not client_id or not secret:
-            raise ValueError(f"Missing {provider} OAuth credentials. Set them in environment variables or settings.")
-        
-        
-        social_app = SocialApp.objects.create(
+def select_github_email(emails):
+    """Pick the primary verified address from GitHub's /user/emails, else any verified one, else the first."""
+    if not isinstance(emails, list):
+        return None
+    for wanted in (
+        lambda e: e.get('primary') and e.get('verified'),
+        lambda e: e.get('verified'),
+        lambda e: True,
+    ):
+        email = next((e.get('email') for e in emails if e.get('email') and wanted(e)), None)
+        if email:
+            return email
+    return None
+
+
+def store_login_tokens(user, provider, access_token, refresh_token, expires_at):
+    """
+    Upsert the provider tokens and make sure the user has a DRF token,
+    with one statement each instead of a read followed by a write. A login
+    without a refresh token (providers only send one on first consent)
+    keeps the stored one.
+    """
+    update_fields = ['access_token', 'expires_at', 'updated_at']
+    if refresh_token:
+        update_fields.append('refresh_token')
+    OAuthToken.objects.bulk_create(
+        [OAuthToken(
+            user=user,
             provider=provider,
-            name=name,
-            client_id=client_id,
-            secret=secret
-        )
-        
-        
-        site = Site.objects.get_current()
-        social_app.sites.add(site)
-        
-        return social_app
+            access_token=access_token,
+            refresh_token=refresh_token if refresh_token else None,
+            expires_at=expires_at,
+        )],
+        **upsert_kwargs(OAuthToken, ['user', 'provider'], update_fields),
+    )
+    Token.objects.bulk_create([Token(key=Token.generate_key(), user=user)], ignore_conflicts=True)
 
 
 class GoogleLogin(SocialLoginView):
@@ -152,14 +151,14 @@ class GoogleAuthURL(APIView):
         try:
             
             try:
-                social_app = get_or_create_social_app('google')
+                social_app = get_provider_config('google')
                 client_id = social_app.client_id
             except ValueError as e:
                 return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
             
-            state = generate_oauth_state(request)
+            state, nonce = issue_state('google')
             
-            return Response({
+            response = Response({
                 'authorization_url': f"https://accounts.google.com/o/oauth2/v2/auth"
                                     f"?client_id={client_id}"
                                     f"&redirect_uri=http://localhost:5173/auth/callback"
@@ -170,6 +169,7 @@ class GoogleAuthURL(APIView):
                                     f"&prompt=consent"
                                     
             })
+            return set_nonce_cookie(response, nonce)
         except Exception as e:
             logger.exception("Error generating Google auth URL")
             return Response({"error": str(e)}, 
@@ -180,14 +180,14 @@ class GitHubAuthURL(APIView):
     def get(self, request):
         try:
             try:
-                social_app = get_or_create_social_app('github')
+                social_app = get_provider_config('github')
                 client_id = social_app.client_id
             except ValueError as e:
                 return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
             
-            state = generate_oauth_state(request)
+            state, nonce = issue_state('github')
 
-            return Response({
+            response = Response({
                 'authorization_url': f"https://github.com/login/oauth/authorize"
                                     f"?client_id={client_id}"
                                     f"&redirect_uri=http://localhost:5173/auth/callback"
@@ -196,6 +196,7 @@ class GitHubAuthURL(APIView):
                                     f"&prompt=consent"
                                     f"&state={state}"
             })
+            return set_nonce_cookie(response, nonce)
         except Exception as e:
             logger.exception("Error generating GitHub auth URL")
             return Response({"error": str(e)}, 
@@ -206,18 +207,11 @@ from rest_framework.decorators import api_view
 
 @api_view(['POST'])
 def google_callback(request):
-    print(f"Session Key: {request.session.session_key}")
-    print(f"Session Cookies: {request.COOKIES}")
-    print(f"Session Data: {request.session.items()}")
     code = request.data.get('code')
     state = request.data.get('state')
 
-    session_state = request.session.get('state')
-    print(f"State stored in session: {request.session.get('state')}")
-    print(f"State stored in data: {request.data.get('state')}")
-    if not session_state or session_state != state:
+    if not verify_state(request, 'google', state):
         return Response({"error": "Invalid state parameter"}, status=status.HTTP_400_BAD_REQUEST)
-    request.session.pop('state', None)
 
     if not code:
         return Response({"error": "No authorization code provided"}, status=status.HTTP_400_BAD_REQUEST)
@@ -226,7 +220,7 @@ def google_callback(request):
     try:
         
         try:
-            social_app = get_or_create_social_app('google')
+            social_app = get_provider_config('google')
             client_id = social_app.client_id
             client_secret = social_app.secret
         except ValueError as e:
@@ -242,9 +236,8 @@ def google_callback(request):
             'grant_type': 'authorization_code'
         }
         
-        response = requests.post(token_url, data=payload)
+        response = get_provider_client().post('google', token_url, data=payload)
         token_data = response.json()
-        print(token_data)
         
         if 'error' in token_data:
             logger.error(f"Google OAuth error: {token_data}")
@@ -257,7 +250,7 @@ def google_callback(request):
 
         user_info_url = 'https://www.googleapis.com/oauth2/v2/userinfo'
         headers = {'Authorization': f'Bearer {access_token}'}
-        user_info = requests.get(user_info_url, headers=headers).json()
+        user_info = get_provider_client().get('google', user_info_url, headers=headers).json()
         
         
         with transaction.atomic():
@@ -272,23 +265,12 @@ def google_callback(request):
                 logger.info(f"Found existing user: {user.username}")
             except User.DoesNotExist:
                 
-                username = email.split('@')[0]  
-                
-                base_username = username
-                counter = 1
-                while User.objects.filter(username=username).exists():
-                    username = f"{base_username}{counter}"
-                    counter += 1
-                
-                
-                user = User.objects.create_user(
-                    username=username,
+                user = create_social_user(
+                    email.split('@')[0],
                     email=email,
                     first_name=user_info.get('given_name', ''),
                     last_name=user_info.get('family_name', '')
                 )
-                user.set_unusable_password()  
-                user.save()
                 logger.info(f"Created new user: {user.username}")
             
             
@@ -314,26 +296,12 @@ def google_callback(request):
                 social_account.extra_data = user_info
                 social_account.save()
             
-            from django.utils import timezone
-            from authentication.models import OAuthToken
-            
             expires_at = timezone.now() + timezone.timedelta(seconds=expires_in)
-            
-            oauth_token, _ = OAuthToken.objects.update_or_create(
-                user=user,
-                provider='google',
-                defaults={
-                    'access_token': access_token,
-                    'refresh_token': refresh_token if refresh_token else None,
-                    'expires_at': expires_at,
-                }
-            )
+            store_login_tokens(user, 'google', access_token, refresh_token, expires_at)
 
-            from rest_framework.authtoken.models import Token
-            token, _ = Token.objects.get_or_create(user=user)
-            refresh = RefreshToken.for_user(user)
+            refresh = ClaimsRefreshToken.for_user(user)
 
-            response = JsonResponse({
+            response = ORJSONResponse({
                 "message": "Authentication successful",
                 "user": {
                     "id": user.id,
@@ -361,7 +329,7 @@ def google_callback(request):
                 max_age=3600 * 24 * 7  # 7 days
             )
 
-            return response
+            return clear_nonce_cookie(response)
 
         
     except RequestException as e:
@@ -380,10 +348,8 @@ def github_callback(request):
     code = request.data.get('code')
     state = request.data.get('state')
 
-    session_state = request.session.get('state')
-    if not session_state or session_state != state:
+    if not verify_state(request, 'github', state):
         return Response({"error": "Invalid state parameter"}, status=status.HTTP_400_BAD_REQUEST)
-    request.session.pop('state', None)
 
     if not code:
         return Response({"error": "No authorization code provided"}, status=status.HTTP_400_BAD_REQUEST)
@@ -391,7 +357,7 @@ def github_callback(request):
     try:
         
         try:
-            social_app = get_or_create_social_app('github')
+            social_app = get_provider_config('github')
             client_id = social_app.client_id
             client_secret = social_app.secret
         except ValueError as e:
@@ -407,9 +373,8 @@ def github_callback(request):
         }
         headers = {'Accept': 'application/json'}
         
-        response = requests.post(token_url, data=payload, headers=headers)
+        response = get_provider_client().post('github', token_url, data=payload, headers=headers)
         token_data = response.json()
-        print(token_data)
 
         
         if 'error' in token_data:
@@ -420,15 +385,19 @@ def github_callback(request):
         access_token = token_data.get('access_token')
         refresh_token = token_data.get('refresh_token')
         expires_in = token_data.get('expires_in', 28800)
-        user_info_url = 'https://api.github.com/user'
         headers = {'Authorization': f'token {access_token}'}
-        user_info = requests.get(user_info_url, headers=headers).json()
+        # Both calls only need the access token, so issue them side by side.
+        user_response, emails_response = get_provider_client().get_many(
+            'github',
+            ['https://api.github.com/user', 'https://api.github.com/user/emails'],
+            headers=headers
+        )
+        user_info = user_response.json()
         
         
         if 'email' not in user_info or not user_info['email']:
-            email_url = 'https://api.github.com/user/emails'
-            emails = requests.get(email_url, headers=headers).json() #the email_url response like [{primmail dat},{noreply.github.mail data},{secmail data}]
-            primary_email = emails[0]['email'] if emails[0]['email'] else email[1]['email'] if email[1]['primary'] else email[2]['email']
+            emails = emails_response.json() if emails_response.ok else []
+            primary_email = select_github_email(emails)
             if primary_email:
                 user_info['email'] = primary_email
         
@@ -446,24 +415,12 @@ def github_callback(request):
             except User.DoesNotExist:
                 
                 
-                username = user_info.get('login') or email.split('@')[0]
-                
-                
-                base_username = username
-                counter = 1
-                while User.objects.filter(username=username).exists():
-                    username = f"{base_username}{counter}"
-                    counter += 1
-                
-                
-                user = User.objects.create_user(
-                    username=username,
+                user = create_social_user(
+                    user_info.get('login') or email.split('@')[0],
                     email=email,
                     first_name=user_info.get('name', '').split(' ')[0] if user_info.get('name') else '',
                     last_name=' '.join(user_info.get('name', '').split(' ')[1:]) if user_info.get('name') else ''
                 )
-                user.set_unusable_password()  
-                user.save()
                 logger.info(f"Created new user: {user.username}")
             
             
@@ -489,26 +446,11 @@ def github_callback(request):
                 social_account.extra_data = user_info
                 social_account.save()
             
-            from django.utils import timezone
-            from authentication.models import OAuthToken
-            
             expires_at = timezone.now() + timezone.timedelta(seconds=expires_in) if expires_in else None
-            
-            oauth_token, _ = OAuthToken.objects.update_or_create(
-                user=user,
-                provider='github',
-                defaults={
-                    'access_token': access_token,
-                    'refresh_token': refresh_token if refresh_token else None,
-                    'expires_at': expires_at,
-                }
-            )
+            store_login_tokens(user, 'github', access_token, refresh_token, expires_at)
 
-            from rest_framework.authtoken.models import Token
-            token, _ = Token.objects.get_or_create(user=user)
-
-            refresh = RefreshToken.for_user(user)
-            response = JsonResponse({
+            refresh = ClaimsRefreshToken.for_user(user)
+            response = ORJSONResponse({
                 "message": "Authentication successful",
                 "user": {
                     "id": user.id,
@@ -536,69 +478,40 @@ def github_callback(request):
                 max_age=3600 * 24 * 7  # 7 days
             )
 
-            return response
+            return clear_nonce_cookie(response)
         
     except Exception as e:
         logger.exception(f"Error in GitHub callback: {str(e)}")
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
 
-@api_view(['POST'])
-def refresh_google_token(request):
-    """Refresh Google access token using refresh token."""
+def provider_token_refresh_response(request, provider):
+    """
+    Answer a client's provider refresh request. The background worker normally
+    keeps tokens fresh, so this only calls the provider when the stored token
+    is about to expire.
+    """
     refresh_token = request.data.get('refresh_token')
     if not refresh_token:
         return Response({"error": "No refresh token provided"}, status=status.HTTP_400_BAD_REQUEST)
 
     try:
         # Find the user by refresh token
-        from authentication.models import OAuthToken
-        oauth_token = OAuthToken.objects.get(refresh_token=refresh_token, provider='google')
-
-        # Get Google OAuth credentials
-        social_app = get_or_create_social_app('google')
-        client_id = social_app.client_id
-        client_secret = social_app.secret
-
-        # Exchange refresh token for new access token
-        token_url = 'https://oauth2.googleapis.com/token'
-        payload = {
-            'client_id': client_id,
-            'client_secret': client_secret,
-            'refresh_token': refresh_token,
-            'grant_type': 'refresh_token'
-        }
-
-        response = requests.post(token_url, data=payload)
-        token_data = response.json()
-
-        if 'error' in token_data:
-            logger.error(f"Google token refresh error: {token_data}")
-            return Response({"error": token_data.get('error_description', token_data['error'])}, 
-                            status=status.HTTP_400_BAD_REQUEST)
-
-        # Update stored tokens
-        access_token = token_data.get('access_token')
-        new_refresh_token = token_data.get('refresh_token', refresh_token)  # Use old if not provided
-        expires_in = token_data.get('expires_in', 3600)
-
-        expires_at = timezone.now() + timezone.timedelta(seconds=expires_in)
-        oauth_token.access_token = access_token
-        oauth_token.refresh_token = new_refresh_token
-        oauth_token.expires_at = expires_at
-        oauth_token.save()
-
-        # Return the new tokens
-        response = JsonResponse({
-            "access_token": access_token,
-            "refresh_token": new_refresh_token,
+        oauth_token = get_token_for_refresh(provider, refresh_token)
+        oauth_token = ensure_fresh(oauth_token, get_provider_config(provider))
+
+        # Return the current tokens
+        expires_at = oauth_token.expires_at
+        response = ORJSONResponse({
+            "access_token": oauth_token.access_token,
+            "refresh_token": oauth_token.refresh_token,
             "expires_at": expires_at.timestamp()
         })
 
         # Set tokens in secure cookies
         response.set_cookie(
             key='access_token',
-            value=access_token,
+            value=oauth_token.access_token,
             httponly=True,
             secure=True,
             samesite='Strict',
@@ -606,7 +519,7 @@ def refresh_google_token(request):
         )
         response.set_cookie(
             key='refresh_token',
-            value=new_refresh_token,
+            value=oauth_token.refresh_token,
             httponly=True,
             secure=True,
             samesite='Strict',
@@ -617,88 +530,86 @@ def refresh_google_token(request):
 
     except OAuthToken.DoesNotExist:
         return Response({"error": "Invalid refresh token"}, status=status.HTTP_400_BAD_REQUEST)
+    except TokenRefreshError as e:
+        logger.error(f"{provider} token refresh error: {e}")
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
-        logger.exception(f"Error refreshing Google token: {str(e)}")
+        logger.exception(f"Error refreshing {provider} token: {str(e)}")
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@api_view(['POST'])
-def refresh_github_token(request):
-    """Refresh GitHub access token using refresh token."""
-    refresh_token = request.data.get('refresh_token')
-    if not refresh_token:
-        return Response({"error": "No refresh token provided"}, status=status.HTTP_400_BAD_REQUEST)
-
-    try:
-        # Find the user by refresh token
-        from authentication.models import OAuthToken
-        oauth_token = OAuthToken.objects.get(refresh_token=refresh_token, provider='github')
-
-        # Get GitHub OAuth credentials
-        social_app = get_or_create_social_app('github')
-        client_id = social_app.client_id
-        client_secret = social_app.secret
-
-        # Exchange refresh token for new access token
-        token_url = 'https://github.com/login/oauth/access_token'
-        payload = {
-            'client_id': client_id,
-            'client_secret': client_secret,
-            'refresh_token': refresh_token,
-            'grant_type': 'refresh_token'
-        }
-        headers = {'Accept': 'application/json'}
-
-        response = requests.post(token_url, data=payload, headers=headers)
-        token_data = response.json()
 
-        if 'error' in token_data:
-            logger.error(f"GitHub token refresh error: {token_data}")
-            return Response({"error": token_data.get('error_description', token_data['error'])}, 
-                            status=status.HTTP_400_BAD_REQUEST)
+@api_view(['POST'])
+def refresh_google_token(request):
+    """Refresh Google access token using refresh token."""
+    return provider_token_refresh_response(request, 'google')
 
-        # Update stored tokens
-        access_token = token_data.get('access_token')
-        new_refresh_token = token_data.get('refresh_token', refresh_token)  # Use old if not provided
-        expires_in = token_data.get('expires_in', 3600)
 
-        expires_at = timezone.now() + timezone.timedelta(seconds=expires_in)
-        oauth_token.access_token = access_token
-        oauth_token.refresh_token = new_refresh_token
-        oauth_token.expires_at = expires_at
-        oauth_token.save()
+@api_view(['POST'])
+def refresh_github_token(request):
+    """Refresh GitHub access token using refresh token."""
+    return provider_token_refresh_response(request, 'github')
 
-        # Return the new tokens
-        response = JsonResponse({
-            "access_token": access_token,
-            "refresh_token": new_refresh_token,
-            "expires_at": expires_at.timestamp()
-        })
+def resolve_login_usernames(username, email):
+    """
+    Return the usernames to try, in order, looked up with at most one query:
+    `username` itself if it exists, then the owner of `email` when exactly one user has it.
+    """
+    if not email:
+        return [username] if username else []
+    lookup = Q(email=email) | Q(username=username) if username else Q(email=email)
+    candidates = list(User.objects.filter(lookup).values_list('username', 'email')[:3])
+    names = [username] if username and any(name == username for name, _ in candidates) else []
+    by_email = [name for name, user_email in candidates if user_email == email]
+    if len(by_email) == 1 and by_email[0] not in names:
+        names.append(by_email[0])
+    return names
+
+
+def verify_login(username, email, password):
+    """
+    Authenticate by username, falling back to the owner of `email` when that
+    fails, as before. Returns the user or None.
+    """
+    for login_name in resolve_login_usernames(username, email):
+        user = authenticate(username=login_name, password=password)
+        if user:
+            return user
+    return None
 
-        # Set tokens in secure cookies
-        response.set_cookie(
-            key='access_token',
-            value=access_token,
-            httponly=True,
-            secure=True,
-            samesite='Strict',
-            max_age=3600
-        )
-        response.set_cookie(
-            key='refresh_token',
-            value=new_refresh_token,
-            httponly=True,
-            secure=True,
-            samesite='Strict',
-            max_age=3600 * 24 * 7  # 7 days
-        )
 
-        return response
+def login_response_data(user, client_type):
+    """Issue the tokens for a successful login and build the response body."""
+    # Generate JWT tokens
+    refresh = ClaimsRefreshToken.for_user(user)
+    
+    # Get or create regular token, for the client types that still use one
+    token = None
+    if client_type in getattr(settings, 'AUTH_TOKEN_CLIENT_TYPES', ('default',)):
+        token, _ = Token.objects.get_or_create(user=user)
+    
+    # Calculate expiry for access token
+    access_token_lifetime = settings.SIMPLE_JWT.get('ACCESS_TOKEN_LIFETIME', timedelta(minutes=30))
+    access_token_expiry = timezone.now() + access_token_lifetime
+    
+    # Update user's last login, written behind in batches
+    last_login_buffer.touch(user.pk, timezone.now())
+    
+    return {
+        "message": "Login successful",
+        "user": {
+            "id": user.id,
+            "username": user.username,
+            "email": user.email,
+            "first_name": user.first_name,
+            "last_name": user.last_name
+        },
+        "token": token.key if token else None,
+        "access_token": str(refresh.access_token),
+        "refresh_token": str(refresh),
+        "token_type": "Bearer",
+        "expires_at": access_token_expiry.timestamp()
+    }
 
-    except OAuthToken.DoesNotExist:
-        return Response({"error": "Invalid refresh token"}, status=status.HTTP_400_BAD_REQUEST)
-    except Exception as e:
-        logger.exception(f"Error refreshing GitHub token: {str(e)}")
-        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['POST'])
 def custom_login(request):
@@ -722,16 +633,7 @@ def custom_login(request):
         )
     
     try:
-        # Try to authenticate with username
-        if username:
-            user = authenticate(username=username, password=password)
-        # If username not provided or authentication failed, try with email
-        if not user and email:
-            try:
-                username = User.objects.get(email=email).username
-                user = authenticate(username=username, password=password)
-            except User.DoesNotExist:
-                user = None
+        user = verify_login(username, email, password)
         
         if not user:
             return Response(
@@ -739,35 +641,7 @@ def custom_login(request):
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
-        # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
-        
-        # Get or create regular token
-        token, _ = Token.objects.get_or_create(user=user)
-        
-        # Calculate expiry for access token
-        access_token_lifetime = settings.SIMPLE_JWT.get('ACCESS_TOKEN_LIFETIME', timedelta(minutes=30))
-        access_token_expiry = timezone.now() + access_token_lifetime
-        
-        # Update user's last login
-        user.last_login = timezone.now()
-        user.save(update_fields=['last_login'])
-        
-        return Response({
-            "message": "Login successful",
-            "user": {
-                "id": user.id,
-                "username": user.username,
-                "email": user.email,
-                "first_name": user.first_name,
-                "last_name": user.last_name
-            },
-            "token": token.key,
-            "access_token": str(refresh.access_token),
-            "refresh_token": str(refresh),
-            "token_type": "Bearer",
-            "expires_at": access_token_expiry.timestamp()
-        })
+        return Response(login_response_data(user, request.data.get('client_type', 'default')))
     
     except Exception as e:
         logger.exception(f"Login error: {str(e)}")
@@ -776,6 +650,53 @@ def custom_login(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
     
+@csrf_exempt
+@require_POST
+async def async_login(request):
+    """
+    Same contract as custom_login, but the password check runs on the bounded
+    hashing pool instead of the request worker. Answers 503 with Retry-After
+    when the pool is saturated.
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return ORJSONResponse({"error": "Invalid JSON body"}, status=status.HTTP_400_BAD_REQUEST)
+    if not isinstance(data, dict):
+        return ORJSONResponse({"error": "JSON body must be an object"}, status=status.HTTP_400_BAD_REQUEST)
+    
+    username = data.get('username')
+    email = data.get('email')
+    password = data.get('password')
+    
+    if not password:
+        return ORJSONResponse({"error": "Password is required"}, status=status.HTTP_400_BAD_REQUEST)
+    if not (username or email):
+        return ORJSONResponse({"error": "Username or email is required"}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        future = get_hashing_pool().submit(verify_login, username, email, password)
+    except HashingPoolFull:
+        response = ORJSONResponse(
+            {"error": "Too many logins in progress, please retry"},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        response['Retry-After'] = str(hashing_options()['RETRY_AFTER'])
+        return response
+    
+    try:
+        user = await asyncio.wrap_future(future)
+        if not user:
+            return ORJSONResponse({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        body = await sync_to_async(login_response_data)(user, data.get('client_type', 'default'))
+        return ORJSONResponse(body)
+    
+    except Exception as e:
+        logger.exception(f"Login error: {str(e)}")
+        return ORJSONResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['POST'])
 def refresh_token(request):
     """
@@ -789,17 +710,21 @@ def refresh_token(request):
         )
 
     try:
-        # Validate and refresh the token
-        refresh = RefreshToken(refresh_token)
+        # Validate the token; the blacklist check only hits the database on a filter match
+        refresh = FilteredRefreshToken(refresh_token)
+        user = get_cached_user(refresh[jwt_settings.USER_ID_CLAIM])
+        # Same rule simplejwt applies (is_active), so deactivated users cannot keep refreshing
+        if not jwt_settings.USER_AUTHENTICATION_RULE(user):
+            raise TokenError("User is inactive")
 
-        # Blacklist the old refresh token
-        try:
-            BlacklistedToken.objects.create(token=refresh)
-        except Exception as e:
-            logger.warning(f"Failed to blacklist token: {str(e)}")
+        with transaction.atomic():
+            # Blacklist the old refresh token; losing a race to rotate it counts as reuse
+            _, created = refresh.blacklist()
+            if not created:
+                raise TokenError("Token is blacklisted")
 
-        # Generate a new refresh token
-        new_refresh = RefreshToken.for_user(refresh.user)
+            # Generate a new refresh token
+            new_refresh = FilteredRefreshToken.for_user(user)
 
         # Generate a new access token
         access_token = str(new_refresh.access_token)
@@ -809,7 +734,7 @@ def refresh_token(request):
         expires_at = timezone.now() + access_token_lifetime
 
         # Return the new tokens and expiry information
-        response = JsonResponse({
+        response = ORJSONResponse({
             "access_token": access_token,
             "refresh_token": str(new_refresh),
             "token_type": "Bearer",
@@ -836,7 +761,7 @@ def refresh_token(request):
 
         return response
 
-    except TokenError as e:
+    except (TokenError, KeyError, User.DoesNotExist) as e:
         logger.warning(f"Invalid refresh token: {str(e)}")
         return Response(
             {"error": f"Invalid refresh token: {str(e)}"},
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import realtime  # noqa: F401  (connects the push signal handlers)
+        from . import signals  # noqa: F401  (records delta-sync tombstones)
@@ -0,0 +1,14 @@
+"""
+Datasets served by `manage.py export_data` and the admin-only /api/export/
+endpoint (see mainapp.export). Friendships are exported as an edge list of
+user ids, one row per pair, with user1_id < user2_id.
+"""
+from mainapp.export import Export
+from postauth.models import UserDetail
+
+from .models import Friend
+
+EXPORTS = {
+    'userdetail': Export(UserDetail, [field.attname for field in UserDetail._meta.concrete_fields]),
+    'friends': Export(Friend, ['id', 'user1_id', 'user2_id', 'created_at', 'updated_at']),
+}
@@ -0,0 +1,45 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import ArchivedFriendRequest
+
+
+class Command(BaseCommand):
+    help = "Move accepted/rejected friend requests older than the retention window into the archive table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'FRIEND_REQUEST_ARCHIVE_DAYS', 90),
+            help="Archive resolved requests not updated for this many days",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.1,
+            help="Seconds to pause between batches to keep lock time short",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timezone.timedelta(days=options['days'])
+        started = time.monotonic()
+        total = 0
+        last_id = 0
+
+        while True:
+            moved, last_id = ArchivedFriendRequest.objects.archive_batch(cutoff, options['batch_size'], last_id)
+            if last_id is None:
+                break
+            total += moved
+            self.stdout.write(f"Archived {moved} requests ({total} so far)")
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {total} friend requests older than {cutoff:%Y-%m-%d} "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,53 @@
+import io
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.models import FriendRequest
+from core.serializers import FriendRequestSerializer, UserDetailSearchSerializer
+from mainapp.fastjson import ORJSONParser, ORJSONRenderer, orjson
+from postauth.models import UserDetail
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the orjson renderer/parser against DRF's JSON classes on serialized rows; "
+        "their output is compared in mainapp/tests.py"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500, help="Rows per model to serialize")
+        parser.add_argument('--iterations', type=int, default=200, help="Render/parse repetitions")
+
+    def payloads(self, rows):
+        friend_requests = FriendRequest.objects.select_related('sender', 'receiver').order_by('-id')[:rows]
+        user_details = UserDetail.objects.order_by('username')[:rows]
+        return {
+            'friend requests': FriendRequestSerializer(friend_requests, many=True).data,
+            'user details': UserDetailSearchSerializer(user_details, many=True).data,
+        }
+
+    def bench(self, fn, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        return (time.perf_counter() - started) / iterations * 1000
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError("orjson is not installed; the renderer falls back to DRF's JSONRenderer")
+
+        iterations = options['iterations']
+        for name, data in self.payloads(options['rows']).items():
+            body = JSONRenderer().render(data)
+            drf_render = self.bench(lambda: JSONRenderer().render(data), iterations)
+            orjson_render = self.bench(lambda: ORJSONRenderer().render(data), iterations)
+            drf_parse = self.bench(lambda: JSONParser().parse(io.BytesIO(body)), iterations)
+            orjson_parse = self.bench(lambda: ORJSONParser().parse(io.BytesIO(body)), iterations)
+            self.stdout.write(
+                f"{name} ({len(body)} bytes): render {drf_render:.3f} -> {orjson_render:.3f} ms "
+                f"({drf_render / max(orjson_render, 1e-9):.1f}x), parse {drf_parse:.3f} -> {orjson_parse:.3f} ms "
+                f"({drf_parse / max(orjson_parse, 1e-9):.1f}x)"
+            )
@@ -0,0 +1,94 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Friend, FriendRequest
+from core.projections import (
+    friend_profile_projection,
+    friend_projection,
+    friend_request_projection,
+    user_basic_projection,
+)
+from core.serializers import (
+    FriendProfileSerializer,
+    FriendRequestSerializer,
+    FriendSerializer,
+    UserBasicSerializer,
+)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Check that projections render exactly what the serializers do, then compare their throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help="Rows per model to render")
+        parser.add_argument('--iterations', type=int, default=20, help="Repetitions per timing")
+
+    def cases(self, rows):
+        return [
+            (
+                'friend requests',
+                FriendRequestSerializer,
+                FriendRequest.objects.select_related('sender', 'receiver').order_by('-id')[:rows],
+                friend_request_projection,
+                FriendRequest.objects.order_by('-id')[:rows],
+            ),
+            (
+                'friendships',
+                FriendSerializer,
+                Friend.objects.select_related('user1', 'user2').order_by('-id')[:rows],
+                friend_projection,
+                Friend.objects.order_by('-id')[:rows],
+            ),
+            (
+                'users',
+                UserBasicSerializer,
+                User.objects.order_by('id')[:rows],
+                user_basic_projection,
+                User.objects.order_by('id')[:rows],
+            ),
+            (
+                'users with profiles',
+                FriendProfileSerializer,
+                User.objects.select_related('detail').order_by('id')[:rows],
+                friend_profile_projection,
+                User.objects.order_by('id')[:rows],
+            ),
+        ]
+
+    def bench(self, fn, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        return (time.perf_counter() - started) / iterations
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        mismatches = 0
+        for name, serializer_class, queryset, projection, projected_queryset in self.cases(options['rows']):
+            # Querysets are re-cloned per run (.all()) so every timing includes the query
+            expected = JSONRenderer().render(serializer_class(queryset.all(), many=True).data)
+            actual = JSONRenderer().render(projection.serialize(projected_queryset.all()))
+            if actual != expected:
+                mismatches += 1
+                self.stderr.write(f"{name}: projection output differs from {serializer_class.__name__}")
+                continue
+
+            count = len(projection.serialize(projected_queryset.all()))
+            if not count:
+                self.stdout.write(f"{name}: no rows to benchmark")
+                continue
+            serializer_time = self.bench(lambda: serializer_class(queryset.all(), many=True).data, iterations)
+            projection_time = self.bench(lambda: projection.serialize(projected_queryset.all()), iterations)
+            self.stdout.write(
+                f"{name} ({count} rows): serializer {count / serializer_time:,.0f} rows/s, "
+                f"projection {count / projection_time:,.0f} rows/s "
+                f"({serializer_time / projection_time:.1f}x)"
+            )
+
+        if mismatches:
+            raise CommandError(f"{mismatches} projections do not match their serializers")
@@ -0,0 +1,57 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import EXPORTS
+from mainapp.export import EXTENSIONS, FORMATS, NDJSON, ExportError, export_options
+
+
+class Command(BaseCommand):
+    help = "Stream a dataset (profiles or the friendship graph) to NDJSON, CSV or Parquet in constant memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(EXPORTS))
+        parser.add_argument('-o', '--output', default='-', help="File to write, or - for stdout (default)")
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the output extension, else ndjson")
+        parser.add_argument(
+            '--gzip', action='store_true', default=None,
+            help="Compress NDJSON/CSV on the fly (implied by a .gz output), gzip codec for Parquet",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=export_options()['BATCH_SIZE'],
+            help="Rows fetched per database round trip",
+        )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        name = output[:-3] if output.endswith('.gz') else output
+        fmt = options['format'] or next(
+            (fmt for fmt, extension in EXTENSIONS.items() if name.endswith(extension)), NDJSON
+        )
+        compress = output.endswith('.gz') if options['gzip'] is None else options['gzip']
+        export = EXPORTS[options['dataset']]
+
+        try:
+            stream = export.stream(fmt, compress=compress, batch_size=options['batch_size'])
+            if output == '-':
+                self.write(stream, sys.stdout.buffer)
+            else:
+                with open(output, 'wb') as handle:
+                    self.write(stream, handle)
+        except ExportError as e:
+            raise CommandError(str(e))
+        except OSError as e:
+            if output != '-' and os.path.exists(output):
+                os.remove(output)
+            raise CommandError(str(e))
+
+        self.stderr.write(self.style.SUCCESS(
+            f"Exported {stream.rows} {options['dataset']} rows as {fmt}{' (gzip)' if compress else ''} "
+            f"({stream.rows_per_second:.0f} rows/s)"
+        ))
+
+    def write(self, stream, handle):
+        for chunk in stream:
+            handle.write(chunk)
+        handle.flush()
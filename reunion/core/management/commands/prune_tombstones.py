@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Tombstone
+
+
+class Command(BaseCommand):
+    help = "Delete delta-sync tombstones older than the retention window in small id-ordered batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'TOMBSTONE_RETENTION_DAYS', 30),
+            help="Keep tombstones from the last this many days",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.1,
+            help="Seconds to pause between batches to keep lock time short",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timezone.timedelta(days=options['days'])
+        expired = Tombstone.objects.filter(deleted_at__lt=cutoff).order_by('id')
+        started = time.monotonic()
+        total = 0
+
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            total += Tombstone.objects.filter(id__in=ids).delete()[0]
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Pruned {total} tombstones older than {cutoff:%Y-%m-%d} "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
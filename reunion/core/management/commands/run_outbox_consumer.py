@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core import outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver friendship outbox events to registered handlers, in order and in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumer', default='default', help="Cursor name for this consumer")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Consuming outbox as '{options['consumer']}'")
+        outbox.run(
+            consumer=options['consumer'],
+            batch_size=options['batch_size'],
+            poll_interval=options['poll_interval'],
+        )
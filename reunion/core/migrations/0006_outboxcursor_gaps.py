@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 16:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_delta_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxcursor',
+            name='gaps',
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-19 16:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_tombstone_user_no_constraint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedfriendrequest',
+            index=models.Index(fields=['sender', 'id'], name='afr_sender_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedfriendrequest',
+            index=models.Index(fields=['receiver', 'id'], name='afr_receiver_id_idx'),
+        ),
+    ]
@@ -1,8 +1,12 @@
+import logging
+
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.db.models import Q
 
+logger = logging.getLogger(__name__)
+
 User = get_user_model()
 
 class FriendRequest(models.Model):
@@ -54,6 +58,9 @@ class FriendRequest(models.Model):
         indexes = [
             models.Index(fields=['sender', 'status'], name='fr_sender_status_idx'),
             models.Index(fields=['receiver', 'status'], name='fr_receiver_status_idx'),
+            models.Index(fields=['status', 'updated_at'], name='fr_status_updated_idx'),
+            models.Index(fields=['sender', 'updated_at'], name='fr_sender_updated_idx'),
+            models.Index(fields=['receiver', 'updated_at'], name='fr_receiver_updated_idx'),
         ]
 
     def __str__(self):
@@ -72,32 +79,135 @@ class FriendRequest(models.Model):
                     Q(user1=self.receiver, user2=self.sender))
                 ).exists():
                     
-                    Friend.objects.create(
+                    friendship = Friend.objects.create(
                         user1=self.sender,
                         user2=self.receiver
                     )
+                    friendship.emit_event('created')
                 
                 
                 self.status = 'accepted'
                 self.save(update_fields=['status', 'updated_at'])
+                self.emit_event('accepted')
             return True
         return False
 
     def reject(self):
         """Reject the friend request."""
+        from django.db import transaction
+        
         if self.status == 'pending':
-            self.status = 'rejected'
-            self.save(update_fields=['status', 'updated_at'])
+            with transaction.atomic():
+                self.status = 'rejected'
+                self.save(update_fields=['status', 'updated_at'])
+                self.emit_event('rejected')
             return True
         return False
     
     def cancel(self):
         """Cancel a pending request (can only be done by sender)."""
+        from django.db import transaction
+        
         if self.status == 'pending':
-            self.delete()
+            with transaction.atomic():
+                self.emit_event('canceled')
+                self.delete()
             return True
         return False
 
+    def emit_event(self, action):
+        """Record a change to this request in the outbox; call inside the writing transaction."""
+        return OutboxEvent.objects.emit(
+            f'friend_request.{action}',
+            self.id,
+            {
+                'id': self.id,
+                'sender_id': self.sender_id,
+                'receiver_id': self.receiver_id,
+                'status': self.status,
+            }
+        )
+
+
+class ArchivedFriendRequestManager(models.Manager):
+    RESOLVED_STATUSES = ('accepted', 'rejected')
+
+    def archive_batch(self, cutoff, batch_size=1000, after_id=0):
+        """
+        Move one batch of resolved requests last touched before `cutoff`, with ids
+        above `after_id`, into the archive. Returns (rows moved, last id scanned);
+        the id is None once nothing is left to scan.
+
+        A request whose id the archive already holds for a different request
+        (an auto-increment value reused after the archived rows left the hot
+        table) cannot be archived under that id: it stays hot and is logged,
+        and the scan moves past it.
+        """
+        from django.db import transaction
+
+        with transaction.atomic():
+            rows = list(
+                FriendRequest.objects.select_for_update()
+                .filter(status__in=self.RESOLVED_STATUSES, updated_at__lt=cutoff, id__gt=after_id)
+                .order_by('id')
+                .values('id', 'sender_id', 'receiver_id', 'status', 'created_at', 'updated_at')[:batch_size]
+            )
+            if not rows:
+                return 0, None
+
+            self.bulk_create([self.model(**row) for row in rows], ignore_conflicts=True)
+            # ignore_conflicts does not say which rows were skipped: only drop rows the archive holds as they are
+            stored = {
+                row[0]: row[1:] for row in self.filter(id__in=[row['id'] for row in rows])
+                .values_list('id', 'sender_id', 'receiver_id', 'created_at')
+            }
+            archived = [
+                row['id'] for row in rows
+                if stored.get(row['id']) == (row['sender_id'], row['receiver_id'], row['created_at'])
+            ]
+            if len(archived) < len(rows):
+                conflicting = sorted({row['id'] for row in rows} - set(archived))
+                logger.warning(f"Friend requests {conflicting} clash with archived ids and stay in the hot table")
+            FriendRequest.objects.filter(id__in=archived).delete()
+        return len(archived), rows[-1]['id']
+
+
+class ArchivedFriendRequest(models.Model):
+    """
+    A resolved friend request moved out of the hot FriendRequest table.
+    Keeps the original primary key, so ids stay unique across both tables.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    sender = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_sent_requests'
+    )
+    receiver = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_received_requests'
+    )
+    status = models.CharField(max_length=10, choices=FriendRequest.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ArchivedFriendRequestManager()
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Archived Friend Request"
+        verbose_name_plural = "Archived Friend Requests"
+        indexes = [
+            # history() pages each user's archive by id
+            models.Index(fields=['sender', 'id'], name='afr_sender_id_idx'),
+            models.Index(fields=['receiver', 'id'], name='afr_receiver_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.sender.username} → {self.receiver.username} ({self.get_status_display()}, archived)"
+
 
 class FriendManager(models.Manager):
     def are_friends(self, user1, user2):
@@ -109,17 +219,18 @@ class FriendManager(models.Manager):
     
     def get_friend_list(self, user):
         """Get all friends of a user with optimized query."""
+        user_id = user.id
         user_friends = (
-            self.filter(Q(user1=user) | Q(user2=user))
-            .select_related('user1', 'user2')
+            self.filter(Q(user1_id=user_id) | Q(user2_id=user_id))
+            .values_list('user1_id', 'user2_id')
         )
         friend_ids = []
         
-        for friendship in user_friends:
-            if friendship.user1 == user:
-                friend_ids.append(friendship.user2.id)
+        for user1_id, user2_id in user_friends:
+            if user1_id == user_id:
+                friend_ids.append(user2_id)
             else:
-                friend_ids.append(friendship.user1.id)
+                friend_ids.append(user1_id)
         
         return User.objects.filter(id__in=friend_ids)
 
@@ -142,6 +253,7 @@ class Friend(models.Model):
         db_index=True  
     )
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)  
+    updated_at = models.DateTimeField(auto_now=True)
     
     
     objects = FriendManager()
@@ -162,6 +274,8 @@ class Friend(models.Model):
         indexes = [
             models.Index(fields=['user1', 'user2'], name='friendship_users_idx'),
             models.Index(fields=['created_at'], name='friendship_date_idx'),
+            models.Index(fields=['user1', 'updated_at'], name='friendship_user1_updated_idx'),
+            models.Index(fields=['user2', 'updated_at'], name='friendship_user2_updated_idx'),
         ]
     
     def __str__(self):
@@ -173,3 +287,100 @@ class Friend(models.Model):
         if self.user1.id > self.user2.id:
             self.user1, self.user2 = self.user2, self.user1
         super().save(*args, **kwargs)
+
+    def emit_event(self, action):
+        """Record a change to this friendship in the outbox; call inside the writing transaction."""
+        return OutboxEvent.objects.emit(
+            f'friend.{action}',
+            self.id,
+            {
+                'id': self.id,
+                'user1_id': self.user1_id,
+                'user2_id': self.user2_id,
+            }
+        )
+
+
+class OutboxEventManager(models.Manager):
+    def emit(self, event_type, aggregate_id, payload):
+        """Append an event; only becomes visible to consumers when the caller's transaction commits."""
+        return self.create(event_type=event_type, aggregate_id=aggregate_id, payload=payload)
+
+
+class OutboxEvent(models.Model):
+    """
+    A friendship change written in the same transaction as the change itself.
+    Consumers read the table in id order, see core.outbox.
+    """
+    event_type = models.CharField(max_length=50)
+    aggregate_id = models.BigIntegerField()
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = OutboxEventManager()
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = "Outbox Event"
+        verbose_name_plural = "Outbox Events"
+
+    def __str__(self):
+        return f"#{self.id} {self.event_type} ({self.aggregate_id})"
+
+
+class OutboxCursor(models.Model):
+    """
+    Last outbox event id delivered to a named consumer, plus the ids below it
+    that were not visible yet (`gaps`, id -> unix time first missed).
+    """
+    name = models.CharField(primary_key=True, max_length=50)
+    position = models.BigIntegerField(default=0)
+    gaps = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+class TombstoneManager(models.Manager):
+    def record(self, kind, object_id, user_ids):
+        """Log the deletion of `object_id` once for each user who could see it."""
+        return self.bulk_create([
+            self.model(user_id=user_id, kind=kind, object_id=object_id)
+            for user_id in set(user_ids)
+        ])
+
+
+class Tombstone(models.Model):
+    """
+    Deletion log for delta sync: one row per affected user for each
+    unfriend or canceled/deleted friend request. Written by the post_delete
+    receivers in core.signals, so queryset and cascade deletes are logged too;
+    `manage.py prune_tombstones` removes rows older than TOMBSTONE_RETENTION_DAYS.
+    """
+    FRIEND = 'friend'
+    FRIEND_REQUEST = 'friend_request'
+    KIND_CHOICES = [
+        (FRIEND, 'Friendship'),
+        (FRIEND_REQUEST, 'Friend Request'),
+    ]
+
+    # No database constraint: deleting a user cascades to their friendships,
+    # whose tombstones for that same user may be written after the user's own
+    # tombstones were collected. Such orphans are removed by pruning.
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='tombstones', db_constraint=False
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    objects = TombstoneManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'kind', 'deleted_at'], name='tombstone_user_kind_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} removed for {self.user_id}"
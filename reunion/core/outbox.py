@@ -0,0 +1,128 @@
+"""
+Local consumer for the friendship outbox.
+
+Handlers subscribe to event types and receive events in id order, in batches.
+A named consumer only advances its persisted cursor after every handler has
+accepted the batch, so a failing handler gets the same events again on the next
+pass (at-least-once delivery). Handlers should therefore be idempotent.
+
+Ids are allocated at insert time but become visible at commit, so a long
+transaction can commit an event below ids the cursor has already passed.
+Every id the cursor skips is kept in the cursor's `gaps` and looked up again
+on each pass; an event that shows up there is delivered late (out of id
+order). A gap still empty after OUTBOX_GAP_TIMEOUT_SECONDS is taken to be a
+rolled-back insert and forgotten.
+"""
+import importlib
+import logging
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxCursor, OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+ALL_EVENTS = '*'
+
+# Oldest gaps are dropped beyond this many, keeping the per-pass lookup bounded
+MAX_TRACKED_GAPS = 1000
+
+_handlers = defaultdict(list)
+
+
+def register(*event_types):
+    """
+    Decorator subscribing a handler to the given event types (all events if none given).
+    The handler is called with a list of OutboxEvent rows.
+    """
+    def decorator(func):
+        for event_type in event_types or (ALL_EVENTS,):
+            if func not in _handlers[event_type]:
+                _handlers[event_type].append(func)
+        return func
+    return decorator
+
+
+def autodiscover():
+    """Import the modules listed in OUTBOX_HANDLER_MODULES so their handlers register."""
+    for module in getattr(settings, 'OUTBOX_HANDLER_MODULES', []):
+        importlib.import_module(module)
+
+
+def dispatch(events):
+    """Hand a batch of events to every subscribed handler, preserving order."""
+    subscribers = defaultdict(list)
+    for event in events:
+        for handler in _handlers[event.event_type] + _handlers[ALL_EVENTS]:
+            subscribers[handler].append(event)
+
+    for handler, handler_events in subscribers.items():
+        handler(handler_events)
+
+
+def consume_batch(consumer='default', batch_size=100):
+    """
+    Deliver the next batch of committed events, plus any that committed late
+    into a gap, to handlers and advance the cursor.
+    Returns the number of events delivered.
+    """
+    now = timezone.now()
+    # Reading only settled events keeps most in-flight inserts out of the gaps
+    settled = now - timezone.timedelta(seconds=getattr(settings, 'OUTBOX_SETTLE_SECONDS', 2))
+
+    with transaction.atomic():
+        cursor, _ = OutboxCursor.objects.select_for_update().get_or_create(name=consumer)
+        gaps = {int(event_id): missed_at for event_id, missed_at in cursor.gaps.items()}
+        late = list(OutboxEvent.objects.filter(id__in=gaps).order_by('id')) if gaps else []
+        events = list(
+            OutboxEvent.objects.filter(id__gt=cursor.position, created_at__lte=settled)
+            .order_by('id')[:batch_size]
+        )
+        if not events and not gaps:
+            return 0
+
+        for event in late:
+            del gaps[event.id]
+        if events:
+            seen = {event.id for event in events}
+            for event_id in range(cursor.position + 1, events[-1].id):
+                if event_id not in seen:
+                    gaps[event_id] = now.timestamp()
+            cursor.position = events[-1].id
+        gaps = _prune_gaps(consumer, gaps, now.timestamp())
+
+        dispatch(late + events)
+
+        cursor.gaps = {str(event_id): missed_at for event_id, missed_at in gaps.items()}
+        cursor.save(update_fields=['position', 'gaps', 'updated_at'])
+    return len(late) + len(events)
+
+
+def _prune_gaps(consumer, gaps, now):
+    timeout = getattr(settings, 'OUTBOX_GAP_TIMEOUT_SECONDS', 300)
+    kept = sorted(
+        (event_id for event_id, missed_at in gaps.items() if now - missed_at <= timeout),
+        key=gaps.get,
+    )[-MAX_TRACKED_GAPS:]
+    if len(kept) < len(gaps):
+        logger.warning(
+            f"Outbox consumer {consumer} gave up on {len(gaps) - len(kept)} ids that never committed"
+        )
+    return {event_id: gaps[event_id] for event_id in kept}
+
+
+def run(consumer='default', batch_size=100, poll_interval=1.0):
+    """Consume forever, sleeping only when the outbox has been drained."""
+    autodiscover()
+    while True:
+        try:
+            delivered = consume_batch(consumer, batch_size)
+        except Exception:
+            logger.exception(f"Outbox consumer {consumer} failed, retrying batch")
+            delivered = 0
+        if delivered < batch_size:
+            time.sleep(poll_interval)
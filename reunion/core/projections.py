@@ -0,0 +1,199 @@
+"""
+Read-only fast path for list endpoints.
+
+A Projection is compiled once from a serializer class: every readable field
+becomes a column of a single `.values_list()` query (nested serializers
+become joined `sender__username`-style columns) plus a converter producing
+the same value the field's `to_representation` would (ISO 8601 datetimes
+are formatted inline, with the current timezone looked up once per call
+rather than per value). Rows are shaped
+straight into dicts, so no model instances, nested serializer instances or
+per-field attribute lookups are built per row, and the output is identical
+to `SerializerClass(queryset, many=True).data`.
+
+`with_fieldset()` compiles the same projection trimmed by `?fields=` /
+`?exclude=` (see mainapp.fieldsets), so dropped fields are not selected and
+dropped nested objects are not joined.
+
+Only plain model fields and nested (non-many) serializers on forward or
+one-to-one relations are supported; anything else (method fields, `source='*'`,
+many=True) raises ImproperlyConfigured when the projection is compiled.
+ProjectionTests in core/tests.py hold each projection to its serializer's
+output; `manage.py benchmark_projections` checks and measures both on real data.
+"""
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from mainapp.fieldsets import SparseFieldsetMixin, prune_fields
+
+from .serializers import (
+    FriendProfileSerializer,
+    FriendRequestSerializer,
+    FriendSerializer,
+    UserBasicSerializer,
+)
+
+# Fields whose to_representation returns database values unchanged
+PASSTHROUGH_FIELDS = (
+    serializers.IntegerField,
+    serializers.CharField,
+    serializers.EmailField,
+    serializers.BooleanField,
+)
+
+# Trimmed variants kept per projection; further combinations are compiled per request
+MAX_FIELDSET_VARIANTS = 64
+
+# Plan entry kinds: copy the value, call a converter, shape a nested object, format a datetime
+PASS, CONVERT, NESTED, DATETIME = range(4)
+
+
+class Projection:
+    """Renders a serializer's read output from `.values_list()` rows."""
+
+    def __init__(self, serializer_class, include=None, exclude=None):
+        self.serializer_class = serializer_class
+        self.include = include
+        self.exclude = exclude
+        self._columns = None
+        self._plan = None
+        self._lock = threading.Lock()
+        self._variants = {}
+
+    def with_fieldset(self, include=None, exclude=None):
+        """This projection restricted by include/exclude trees from mainapp.fieldsets.parse_fieldset."""
+        if include is None and not exclude:
+            return self
+        key = (_freeze(include), _freeze(exclude))
+        variant = self._variants.get(key)
+        if variant is None:
+            variant = Projection(self.serializer_class, include, exclude)
+            variant._compile()  # raises ValidationError for unknown fields before it is cached
+            if len(self._variants) < MAX_FIELDSET_VARIANTS:
+                self._variants[key] = variant
+        return variant
+
+    @property
+    def columns(self):
+        self._compile()
+        return self._columns
+
+    def _compile(self):
+        if self._plan is None:
+            with self._lock:
+                if self._plan is None:
+                    columns = []
+                    serializer = self.serializer_class()
+                    if self.include is not None or self.exclude:
+                        prune_fields(serializer, self.include, self.exclude)
+                    plan = self._compile_fields(serializer, '', columns)
+                    self._columns = tuple(columns)
+                    self._plan = plan
+
+    def _compile_fields(self, serializer, prefix, columns):
+        """Build (name, column index, kind, converter or nested plan) entries for `serializer`'s readable fields."""
+        plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            source = field.source
+            if source == '*' or '.' in source or isinstance(
+                field, (serializers.SerializerMethodField, serializers.ListSerializer)
+            ):
+                raise ImproperlyConfigured(
+                    f"{self.serializer_class.__name__}.{name} cannot be projected from database columns"
+                )
+            column = self._column_index(columns, prefix + source)
+            if isinstance(field, serializers.BaseSerializer):
+                # The foreign key column doubles as the null check for the nested object
+                nested = self._compile_fields(field, f'{prefix}{source}__', columns)
+                plan.append((name, column, NESTED, nested))
+            elif type(field) in PASSTHROUGH_FIELDS:
+                plan.append((name, column, PASS, None))
+            elif self._is_iso_datetime(field):
+                # to_representation stays as the fallback for values the inline path does not cover
+                plan.append((name, column, DATETIME, field.to_representation))
+            else:
+                plan.append((name, column, CONVERT, field.to_representation))
+        return tuple(plan)
+
+    @staticmethod
+    def _is_iso_datetime(field):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        return (
+            isinstance(field, serializers.DateTimeField)
+            and isinstance(output_format, str)
+            and output_format.lower() == ISO_8601
+            and not hasattr(field, 'timezone')
+        )
+
+    @staticmethod
+    def _column_index(columns, column):
+        if column not in columns:
+            columns.append(column)
+        return columns.index(column)
+
+    def values(self, queryset):
+        """`queryset` as rows of the projected columns; may still be ordered, sliced or filtered."""
+        return queryset.values_list(*self.columns)
+
+    def shape(self, rows):
+        """Turn rows from values() into the serializer's output dicts."""
+        self._compile()
+        plan = self._plan
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        return [_shape(plan, row, tz) for row in rows]
+
+    def serialize(self, queryset):
+        """Equivalent of `serializer_class(queryset, many=True).data`."""
+        return self.shape(self.values(queryset))
+
+
+def _freeze(tree):
+    if tree is None:
+        return None
+    return tuple(sorted((name, _freeze(subtree)) for name, subtree in tree.items()))
+
+
+def _shape(plan, row, tz):
+    item = {}
+    for name, column, kind, arg in plan:
+        value = row[column]
+        if value is None or kind == PASS:
+            item[name] = value
+        elif kind == DATETIME and tz is not None and value.tzinfo is not None:
+            # What DateTimeField.to_representation does for aware values
+            value = value.astimezone(tz).isoformat()
+            item[name] = value[:-6] + 'Z' if value.endswith('+00:00') else value
+        elif kind == NESTED:
+            item[name] = _shape(arg, row, tz)
+        else:
+            item[name] = arg(value)
+    return item
+
+
+class ProjectedListMixin(SparseFieldsetMixin):
+    """Serves unpaginated `list` from `projection` instead of the serializer, honouring sparse fieldsets."""
+
+    projection = None
+
+    def get_projection(self, projection=None):
+        """`projection` (default: the view's) trimmed to this request's fieldset."""
+        return (projection or self.projection).with_fieldset(*self.get_fieldset())
+
+    def list(self, request, *args, **kwargs):
+        if self.paginator is not None:
+            return super().list(request, *args, **kwargs)
+        return Response(self.get_projection().serialize(self.filter_queryset(self.get_queryset())))
+
+
+user_basic_projection = Projection(UserBasicSerializer)
+friend_request_projection = Projection(FriendRequestSerializer)
+friend_projection = Projection(FriendSerializer)
+friend_profile_projection = Projection(FriendProfileSerializer)
@@ -0,0 +1,196 @@
+"""
+Real-time friend-request notifications over WebSocket.
+
+Committed friend-request outbox events are published to per-user groups on a
+channel layer; every authenticated WebSocket connection subscribes to its
+user's group. The layer backend is pluggable via REALTIME_CHANNEL_LAYER. The
+bundled InMemoryChannelLayer only fans out within one process, so deployments
+running several ASGI workers need a shared backend.
+"""
+import abc
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+PUSHED_EVENTS = (
+    'friend_request.created',
+    'friend_request.accepted',
+    'friend_request.rejected',
+)
+
+
+def user_group(user_id):
+    return f'user.{user_id}'
+
+
+class Subscription:
+    """A single connection's inbox on a channel layer group."""
+
+    def __init__(self, group, queue, loop):
+        self.group = group
+        self.queue = queue
+        self.loop = loop
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class BaseChannelLayer(abc.ABC):
+    """Interface for channel layer backends."""
+
+    @abc.abstractmethod
+    def subscribe(self, group):
+        """Return a Subscription for `group`; must be called from the connection's event loop."""
+
+    @abc.abstractmethod
+    def unsubscribe(self, subscription):
+        """Stop delivering to `subscription`."""
+
+    @abc.abstractmethod
+    def publish(self, group, message):
+        """Send `message` to every subscriber of `group`; safe to call from any thread."""
+
+
+class InMemoryChannelLayer(BaseChannelLayer):
+    """Process-local channel layer backed by one bounded asyncio queue per connection."""
+
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self._groups = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, group):
+        subscription = Subscription(
+            group, asyncio.Queue(maxsize=self.capacity), asyncio.get_running_loop()
+        )
+        with self._lock:
+            self._groups[group].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._groups.get(subscription.group)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._groups[subscription.group]
+
+    def publish(self, group, message):
+        with self._lock:
+            subscribers = list(self._groups.get(group, ()))
+        for subscription in subscribers:
+            subscription.loop.call_soon_threadsafe(self._deliver, subscription, message)
+
+    @staticmethod
+    def _deliver(subscription, message):
+        try:
+            subscription.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning(f"Dropping push for slow consumer on {subscription.group}")
+
+
+_channel_layer = None
+_channel_layer_lock = threading.Lock()
+
+
+def get_channel_layer():
+    """Return the process-wide channel layer configured in REALTIME_CHANNEL_LAYER."""
+    global _channel_layer
+    if _channel_layer is None:
+        with _channel_layer_lock:
+            if _channel_layer is None:
+                config = getattr(settings, 'REALTIME_CHANNEL_LAYER', {})
+                backend = import_string(config.get('BACKEND', 'core.realtime.InMemoryChannelLayer'))
+                _channel_layer = backend(**config.get('OPTIONS', {}))
+    return _channel_layer
+
+
+def publish_event(event):
+    """Push a friend-request event to both users involved."""
+    message = {'type': event.event_type, 'request': event.payload}
+    layer = get_channel_layer()
+    for user_id in {event.payload['sender_id'], event.payload['receiver_id']}:
+        layer.publish(user_group(user_id), message)
+
+
+@receiver(post_save, sender=OutboxEvent)
+def push_friend_request_event(sender, instance, created, **kwargs):
+    """Publish pushable outbox events once the transaction that wrote them commits."""
+    if created and instance.event_type in PUSHED_EVENTS:
+        transaction.on_commit(lambda: publish_event(instance))
+
+
+def authenticate_websocket(scope):
+    """
+    Resolve the user id from a JWT access token passed as `?token=` or in the
+    `access_token` cookie. Only the signature and claims are checked, no database access.
+    """
+    query = parse_qs(scope.get('query_string', b'').decode())
+    raw_token = query.get('token', [None])[0]
+
+    if not raw_token:
+        for name, value in scope.get('headers', []):
+            if name == b'cookie':
+                cookie = SimpleCookie(value.decode('latin-1')).get('access_token')
+                raw_token = cookie.value if cookie else None
+                break
+
+    if not raw_token:
+        return None
+
+    try:
+        return AccessToken(raw_token)[jwt_settings.USER_ID_CLAIM]
+    except (TokenError, KeyError):
+        return None
+
+
+async def websocket_application(scope, receive, send):
+    """ASGI application pushing friend-request events to an authenticated client."""
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    user_id = authenticate_websocket(scope)
+    if user_id is None:
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+
+    layer = get_channel_layer()
+    subscription = layer.subscribe(user_group(user_id))
+    await send({'type': 'websocket.accept'})
+
+    receiving = asyncio.ensure_future(receive())
+    pushing = asyncio.ensure_future(subscription.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait(
+                {receiving, pushing}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if receiving in done:
+                if receiving.result()['type'] == 'websocket.disconnect':
+                    break
+                receiving = asyncio.ensure_future(receive())
+            if pushing in done:
+                await send({'type': 'websocket.send', 'text': json.dumps(pushing.result())})
+                pushing = asyncio.ensure_future(subscription.get())
+    finally:
+        receiving.cancel()
+        pushing.cancel()
+        layer.unsubscribe(subscription)
@@ -1,7 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import FriendRequest, Friend
+from .models import ArchivedFriendRequest, FriendRequest, Friend
 from postauth.models import UserDetail
+from authentication.jwt_auth import resolve_user
 
 User = get_user_model()
 
@@ -13,6 +14,23 @@ class UserBasicSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'first_name', 'last_name']
 
 
+class UserProfileSerializer(serializers.ModelSerializer):
+    """Profile fields shown to a user's friends"""
+
+    class Meta:
+        model = UserDetail
+        fields = ['penname', 'instagram', 'snapchat', 'edu_details']
+
+
+class FriendProfileSerializer(UserBasicSerializer):
+    """A friend with their profile, joined through UserDetail.user (null when they have none)"""
+
+    profile = UserProfileSerializer(source='detail', read_only=True, allow_null=True)
+
+    class Meta(UserBasicSerializer.Meta):
+        fields = UserBasicSerializer.Meta.fields + ['profile']
+
+
 class FriendRequestSerializer(serializers.ModelSerializer):
     """Serializer for friend requests with user details"""
     
@@ -42,10 +60,10 @@ class FriendRequestSerializer(serializers.ModelSerializer):
     def validate(self, data):
         """Validate that users can't send requests to themselves"""
         
-        if 'sender' not in data:
+        if data.get('sender') is None:
             request = self.context.get('request')
             if request and hasattr(request, 'user'):
-                data['sender'] = request.user
+                data['sender'] = resolve_user(request.user)
         
         sender = data.get('sender')
         receiver = data.get('receiver')
@@ -54,10 +72,11 @@ class FriendRequestSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("You cannot send a friend request to yourself.")
             
         
+        # Archived requests still count, so a rejected request cannot be re-sent once archived
         existing_request = FriendRequest.objects.filter(
             sender=sender, 
             receiver=receiver
-        ).exists()
+        ).exists() or ArchivedFriendRequest.objects.filter(sender=sender, receiver=receiver).exists()
         
         if existing_request:
             raise serializers.ValidationError("A friend request already exists between these users.")
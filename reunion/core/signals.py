@@ -0,0 +1,21 @@
+"""
+Tombstones for delta sync. Recorded on post_delete rather than in the
+models' delete() so that queryset deletes (archiving, admin bulk actions) and
+deletes cascading from a User are reported to sync clients as well.
+"""
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Friend, FriendRequest, Tombstone
+
+
+@receiver(post_delete, sender=FriendRequest, dispatch_uid='core.tombstone_friend_request')
+def tombstone_friend_request(sender, instance, **kwargs):
+    Tombstone.objects.record(
+        Tombstone.FRIEND_REQUEST, instance.id, (instance.sender_id, instance.receiver_id)
+    )
+
+
+@receiver(post_delete, sender=Friend, dispatch_uid='core.tombstone_friend')
+def tombstone_friend(sender, instance, **kwargs):
+    Tombstone.objects.record(Tombstone.FRIEND, instance.id, (instance.user1_id, instance.user2_id))
@@ -1,3 +1,461 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from authentication.jwt_auth import ClaimsRefreshToken
+from mainapp import export as export_module
+from mainapp.asgi import application
+from postauth.tests import profile
+
+from . import outbox, projections, realtime
+from .exports import EXPORTS
+from .serializers import FriendProfileSerializer, FriendRequestSerializer, FriendSerializer, UserBasicSerializer
+from .models import ArchivedFriendRequest, Friend, FriendRequest, OutboxCursor, OutboxEvent, Tombstone
+
+User = get_user_model()
+
+
+class HistoryPaginationTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        FriendRequest.objects.create(sender=self.alice, receiver=self.bob)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_page_size_is_clamped_to_at_least_one(self):
+        for page_size in ('0', '-1'):
+            response = self.client.get('/api/reunite/history/', {'page_size': page_size})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['pagination']['page_size'], 1)
+            self.assertEqual(len(response.data['results']), 1)
+
+    def test_non_integer_page_size_is_rejected(self):
+        response = self.client.get('/api/reunite/history/', {'page_size': 'ten'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ArchiveBatchTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        self.carol = User.objects.create_user('carol', password='x')
+
+    def cutoff(self):
+        return timezone.now() + timezone.timedelta(seconds=1)
+
+    def test_moves_resolved_requests(self):
+        request = FriendRequest.objects.create(sender=self.alice, receiver=self.bob, status='rejected')
+        moved, last_id = ArchivedFriendRequest.objects.archive_batch(self.cutoff())
+        self.assertEqual((moved, last_id), (1, request.id))
+        self.assertEqual(ArchivedFriendRequest.objects.archive_batch(self.cutoff(), after_id=last_id), (0, None))
+        self.assertFalse(FriendRequest.objects.filter(id=request.id).exists())
+        self.assertTrue(ArchivedFriendRequest.objects.filter(id=request.id).exists())
+
+    def test_keeps_rows_the_archive_does_not_hold(self):
+        kept = FriendRequest.objects.create(sender=self.alice, receiver=self.bob, status='rejected')
+        moved = FriendRequest.objects.create(sender=self.alice, receiver=self.carol, status='rejected')
+        original_bulk_create = ArchivedFriendRequest.objects.bulk_create
+
+        def skip_kept(objs, **kwargs):
+            # Simulate the insert silently skipping a row
+            return original_bulk_create([obj for obj in objs if obj.id != kept.id], **kwargs)
+
+        with mock.patch.object(ArchivedFriendRequest.objects, 'bulk_create', side_effect=skip_kept):
+            with self.assertLogs('core.models', 'WARNING'):
+                count, _ = ArchivedFriendRequest.objects.archive_batch(self.cutoff())
+        self.assertEqual(count, 1)
+        self.assertTrue(FriendRequest.objects.filter(id=kept.id).exists())
+        self.assertFalse(FriendRequest.objects.filter(id=moved.id).exists())
+
+    def test_reused_id_stays_hot_and_does_not_stop_the_run(self):
+        old = timezone.now() - timezone.timedelta(days=400)
+        ArchivedFriendRequest.objects.create(
+            id=1, sender=self.bob, receiver=self.carol, status='accepted', created_at=old, updated_at=old
+        )
+        # The auto-increment handed out id 1 again
+        reused = FriendRequest.objects.create(id=1, sender=self.alice, receiver=self.bob, status='rejected')
+        later = FriendRequest.objects.create(id=2, sender=self.alice, receiver=self.carol, status='rejected')
+        with self.assertLogs('core.models', 'WARNING'):
+            call_command('archive_friend_requests', days=0, batch_size=1, sleep=0, stdout=mock.Mock())
+        self.assertTrue(FriendRequest.objects.filter(id=reused.id).exists())
+        self.assertEqual(ArchivedFriendRequest.objects.get(id=1).sender, self.bob)
+        self.assertTrue(ArchivedFriendRequest.objects.filter(id=later.id, sender=self.alice).exists())
+
+    def test_archived_request_still_blocks_a_resend(self):
+        FriendRequest.objects.create(sender=self.alice, receiver=self.bob, status='rejected')
+        ArchivedFriendRequest.objects.archive_batch(self.cutoff())
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        response = client.post('/api/reunite/', {'receiver_id': self.bob.id})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(OUTBOX_SETTLE_SECONDS=0, OUTBOX_GAP_TIMEOUT_SECONDS=60)
+class OutboxConsumerTests(TestCase):
+    def setUp(self):
+        self.delivered = []
+        self.failing = False
+        handlers = mock.patch.dict(outbox._handlers, {outbox.ALL_EVENTS: [self.handler]}, clear=True)
+        handlers.start()
+        self.addCleanup(handlers.stop)
+
+    def handler(self, events):
+        if self.failing:
+            raise RuntimeError("handler down")
+        self.delivered.extend(event.id for event in events)
+
+    def event(self, event_id):
+        return OutboxEvent.objects.create(id=event_id, event_type='friend.created', aggregate_id=1, payload={})
+
+    def test_event_committed_behind_the_cursor_is_delivered(self):
+        self.event(1)
+        self.event(3)
+        self.assertEqual(outbox.consume_batch(), 2)
+        self.assertEqual(OutboxCursor.objects.get(name='default').gaps.keys(), {'2'})
+
+        # The transaction holding id 2 commits after the cursor moved past it
+        self.event(2)
+        self.assertEqual(outbox.consume_batch(), 1)
+        self.assertEqual(self.delivered, [1, 3, 2])
+        cursor = OutboxCursor.objects.get(name='default')
+        self.assertEqual((cursor.position, cursor.gaps), (3, {}))
+
+    def test_failing_handler_keeps_cursor_and_gaps(self):
+        self.event(1)
+        self.event(3)
+        outbox.consume_batch()
+        self.event(2)
+        self.failing = True
+        with self.assertRaises(RuntimeError):
+            outbox.consume_batch()
+        self.assertEqual(OutboxCursor.objects.get(name='default').gaps.keys(), {'2'})
+        self.failing = False
+        self.assertEqual(outbox.consume_batch(), 1)
+        self.assertEqual(self.delivered, [1, 3, 2])
+
+    def test_gap_that_never_commits_expires(self):
+        self.event(1)
+        self.event(3)
+        outbox.consume_batch()
+        later = timezone.now() + timezone.timedelta(seconds=61)
+        with mock.patch('core.outbox.timezone.now', return_value=later), self.assertLogs('core.outbox', 'WARNING'):
+            outbox.consume_batch()
+        self.assertEqual(OutboxCursor.objects.get(name='default').gaps, {})
+
+
+class TombstoneTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def tombstones(self, kind):
+        return set(Tombstone.objects.filter(kind=kind).values_list('user_id', 'object_id'))
+
+    def test_queryset_delete_leaves_tombstones(self):
+        request = FriendRequest.objects.create(sender=self.alice, receiver=self.bob)
+        FriendRequest.objects.filter(id=request.id).delete()
+        self.assertEqual(
+            self.tombstones(Tombstone.FRIEND_REQUEST),
+            {(self.alice.id, request.id), (self.bob.id, request.id)},
+        )
+
+    def test_user_cascade_leaves_tombstone_for_the_friend(self):
+        carol = User.objects.create_user('carol', password='x')
+        friendship = Friend.objects.create(user1=self.alice, user2=carol)
+        carol.delete()
+        self.assertIn((self.alice.id, friendship.id), self.tombstones(Tombstone.FRIEND))
+
+        since = (timezone.now() - timezone.timedelta(minutes=1)).isoformat()
+        response = self.client.get('/api/reunited/sync/', {'since': since})
+        self.assertEqual(response.data['removed'], [friendship.id])
+        self.assertFalse(response.data['full'])
+
+    def test_malformed_since_is_rejected(self):
+        for since in ('yesterday', '2024-13-45T00:00:00'):
+            response = self.client.get('/api/reunited/sync/', {'since': since})
+            self.assertEqual(response.status_code, 400)
+
+    def test_since_older_than_retention_gets_full_resync(self):
+        Friend.objects.create(user1=self.alice, user2=self.bob)
+        response = self.client.get('/api/reunited/sync/', {'since': '2000-01-01T00:00:00Z'})
+        self.assertTrue(response.data['full'])
+        self.assertEqual(len(response.data['changed']), 1)
+
+    def test_prune_removes_old_tombstones(self):
+        old = Tombstone.objects.create(user=self.alice, kind=Tombstone.FRIEND, object_id=1)
+        Tombstone.objects.filter(id=old.id).update(deleted_at=timezone.now() - timezone.timedelta(days=31))
+        recent = Tombstone.objects.create(user=self.alice, kind=Tombstone.FRIEND, object_id=2)
+        call_command('prune_tombstones', days=30, sleep=0, stdout=mock.Mock())
+        self.assertEqual(list(Tombstone.objects.values_list('id', flat=True)), [recent.id])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def assertInvalidated(self, url, change):
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        change()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def rename_bob(self):
+        self.bob.first_name = 'Robert'
+        self.bob.save()
+
+    def test_friend_rename_invalidates_my_friends(self):
+        Friend.objects.create(user1=self.alice, user2=self.bob)
+        self.assertInvalidated('/api/reunited/my_friends/', self.rename_bob)
+
+    def test_receiver_rename_invalidates_sent_requests(self):
+        FriendRequest.objects.create(sender=self.alice, receiver=self.bob)
+        self.assertInvalidated('/api/reunite/sent/', self.rename_bob)
+
+    def test_friend_profile_edit_invalidates_my_friends(self):
+        Friend.objects.create(user1=self.alice, user2=self.bob)
+        detail = profile('bob', user=self.bob)
+
+        def edit_profile():
+            detail.penname = 'Bobby'
+            detail.save()
+
+        self.assertInvalidated('/api/reunited/my_friends/', edit_profile)
+        self.assertInvalidated('/api/reunited/my_friends/', detail.delete)
+
+    def test_login_does_not_invalidate(self):
+        Friend.objects.create(user1=self.alice, user2=self.bob)
+        url = '/api/reunited/my_friends/'
+        etag = self.client.get(url)['ETag']
+        self.bob.last_login = timezone.now()
+        self.bob.save(update_fields=['last_login'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class ClaimsPrincipalTests(TestCase):
+    def test_my_friends_reads_username_from_the_token(self):
+        alice = User.objects.create_user('alice', password='x')
+        Friend.objects.create(user1=alice, user2=User.objects.create_user('bob', password='x'))
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(alice).access_token}')
+        with mock.patch('authentication.jwt_auth.get_cached_user', side_effect=AssertionError("user lookup")):
+            response = client.get('/api/reunited/my_friends/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['username'], 'alice')
+
+
+class ProjectionTests(TestCase):
+    def setUp(self):
+        profile('alice', edu_details={'school': 'Zoë High', 'years': [2010, 2014]})
+        self.alice = User.objects.create_user('alice', password='x', first_name='Alice')
+        # No profile, so every nested profile column comes back NULL
+        self.bob = User.objects.create_user('bob', password='x')
+        FriendRequest.objects.create(sender=self.alice, receiver=self.bob, status='accepted')
+        FriendRequest.objects.create(sender=self.bob, receiver=self.alice)
+        Friend.objects.create(user1=self.alice, user2=self.bob)
+
+    def assertProjects(self, projection, serializer_class, queryset):
+        for tz in ('UTC', 'Asia/Kolkata'):
+            with self.subTest(serializer=serializer_class.__name__, tz=tz), timezone.override(tz):
+                self.assertEqual(
+                    projection.serialize(queryset.all()),
+                    serializer_class(queryset.all(), many=True).data,
+                )
+
+    def test_projections_match_their_serializers(self):
+        users = User.objects.order_by('id')
+        self.assertProjects(projections.user_basic_projection, UserBasicSerializer, users)
+        self.assertProjects(projections.friend_profile_projection, FriendProfileSerializer, users)
+        self.assertProjects(projections.friend_request_projection, FriendRequestSerializer, FriendRequest.objects.order_by('id'))
+        self.assertProjects(projections.friend_projection, FriendSerializer, Friend.objects.order_by('id'))
+
+    def test_null_profile_and_aware_datetimes(self):
+        rows = projections.friend_profile_projection.serialize(User.objects.filter(id=self.bob.id))
+        self.assertIsNone(rows[0]['profile'])
+        with timezone.override('Asia/Kolkata'):
+            row = projections.friend_projection.serialize(Friend.objects.all())[0]
+        self.assertTrue(row['created_at'].endswith('+05:30'))
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='x')
+        users = [User.objects.create_user(f'user{i}', password='x') for i in range(5)]
+        for other in users[1:]:
+            Friend.objects.create(user1=users[0], user2=other)
+        cls.friend_ids = list(Friend.objects.order_by('id').values_list('id', flat=True))
+
+    def body(self, fmt, compress=False, batch_size=2):
+        stream = EXPORTS['friends'].stream(fmt, compress=compress, batch_size=batch_size)
+        data = b''.join(stream)
+        self.assertEqual(stream.rows, len(self.friend_ids))
+        return gzip.decompress(data) if compress else data
+
+    def test_ndjson_round_trip(self):
+        for compress in (False, True):
+            with self.subTest(compress=compress):
+                rows = [json.loads(line) for line in self.body('ndjson', compress).splitlines()]
+                self.assertEqual([row['id'] for row in rows], self.friend_ids)
+                self.assertEqual(set(rows[0]), {'id', 'user1_id', 'user2_id', 'created_at', 'updated_at'})
+
+    def test_csv_round_trip(self):
+        for compress in (False, True):
+            with self.subTest(compress=compress):
+                rows = list(csv.DictReader(io.StringIO(self.body('csv', compress).decode())))
+                self.assertEqual([int(row['id']) for row in rows], self.friend_ids)
+                friend = Friend.objects.get(id=self.friend_ids[0])
+                self.assertEqual(int(rows[0]['user2_id']), friend.user2_id)
+
+    def test_empty_csv_still_has_its_header(self):
+        Friend.objects.all().delete()
+        self.assertEqual(b''.join(EXPORTS['friends'].stream('csv')).decode().strip(), 'id,user1_id,user2_id,created_at,updated_at')
+
+    def test_keyset_pages_match_the_cursor_path(self):
+        export = EXPORTS['friends']
+        expected = [list(batch) for batch in export.batches(2)]
+        mysql = mock.MagicMock()
+        mysql.__getitem__.return_value.vendor = 'mysql'
+        with mock.patch.object(export_module, 'connections', mysql):
+            keyset = [list(batch) for batch in export.batches(2)]
+        self.assertEqual(keyset, expected)
+        self.assertEqual([len(batch) for batch in keyset], [2, 2])
+
+    async def test_asgi_response_streams_asynchronously(self):
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get('/api/export/friends/', {'file_format': 'ndjson'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual([json.loads(line)['id'] for line in body.splitlines()], self.friend_ids)
+
+    def test_wsgi_response_streams_synchronously(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/api/export/friends/', {'file_format': 'csv', 'gzip': '1'})
+        self.assertFalse(response.is_async)
+        self.assertEqual(len(gzip.decompress(b''.join(response.streaming_content)).splitlines()), 5)
+
+
+class RealtimeTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        self.carol = User.objects.create_user('carol', password='x')
+        layer = mock.patch.object(realtime, '_channel_layer', realtime.InMemoryChannelLayer())
+        layer.start()
+        self.addCleanup(layer.stop)
+        self.sockets = []
+
+    def token(self, user):
+        return str(AccessToken.for_user(user))
+
+    async def open_socket(self, query_string=b'', headers=()):
+        """Drive the ASGI app with a fake WebSocket; returns (incoming, outgoing, task, first message sent)."""
+        incoming, outgoing = asyncio.Queue(), asyncio.Queue()
+        await incoming.put({'type': 'websocket.connect'})
+        scope = {'type': 'websocket', 'path': '/ws/', 'query_string': query_string, 'headers': list(headers)}
+        task = asyncio.ensure_future(application(scope, incoming.get, outgoing.put))
+        first = await asyncio.wait_for(outgoing.get(), 1)
+        return incoming, outgoing, task, first
+
+    async def connect(self, user):
+        incoming, outgoing, task, first = await self.open_socket(f'token={self.token(user)}'.encode())
+        self.assertEqual(first, {'type': 'websocket.accept'})
+        self.sockets.append((incoming, task))
+        return outgoing
+
+    async def disconnect(self):
+        for incoming, task in self.sockets:
+            await incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+            await asyncio.wait_for(task, 1)
+        self.assertFalse(realtime.get_channel_layer()._groups)
+
+    async def received(self, outgoing):
+        message = await asyncio.wait_for(outgoing.get(), 1)
+        return json.loads(message['text'])
+
+    def committed(self, change):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                return change()
+
+    def send_request(self):
+        friend_request = FriendRequest.objects.create(sender=self.alice, receiver=self.bob)
+        friend_request.emit_event('created')
+        return friend_request
+
+    async def test_token_from_query_string_or_cookie(self):
+        _, _, task, first = await self.open_socket(f'token={self.token(self.alice)}'.encode())
+        self.assertEqual(first, {'type': 'websocket.accept'})
+        task.cancel()
+
+        cookie = f'theme=dark; access_token={self.token(self.bob)}'.encode()
+        _, _, task, first = await self.open_socket(headers=[(b'cookie', cookie)])
+        self.assertEqual(first, {'type': 'websocket.accept'})
+        task.cancel()
+
+    async def test_bad_tokens_are_rejected(self):
+        # A refresh token is not accepted in place of an access token
+        refresh = await sync_to_async(lambda: str(RefreshToken.for_user(self.alice)))()
+        for query_string in (b'', b'token=garbage', f'token={refresh}'.encode()):
+            with self.subTest(query_string=query_string):
+                _, _, task, first = await self.open_socket(query_string)
+                self.assertEqual(first, {'type': 'websocket.close', 'code': 4401})
+                await asyncio.wait_for(task, 1)
+
+    async def test_events_fan_out_to_both_users_on_commit(self):
+        alice, bob, carol = [await self.connect(user) for user in (self.alice, self.bob, self.carol)]
+
+        friend_request = await sync_to_async(self.committed)(self.send_request)
+        for outgoing in (alice, bob):
+            message = await self.received(outgoing)
+            self.assertEqual(message['type'], 'friend_request.created')
+            self.assertEqual(message['request']['id'], friend_request.id)
+
+        await sync_to_async(self.committed)(friend_request.accept)
+        for outgoing in (alice, bob):
+            self.assertEqual((await self.received(outgoing))['type'], 'friend_request.accepted')
+
+        other = await sync_to_async(FriendRequest.objects.create)(sender=self.carol, receiver=self.bob)
+        await sync_to_async(self.committed)(other.reject)
+        self.assertEqual((await self.received(carol))['type'], 'friend_request.rejected')
+        self.assertEqual((await self.received(bob))['type'], 'friend_request.rejected')
+
+        await asyncio.sleep(0.05)
+        self.assertTrue(alice.empty())
+        await self.disconnect()
+
+    async def test_no_event_on_rollback(self):
+        bob = await self.connect(self.bob)
+
+        def rolled_back():
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                try:
+                    with transaction.atomic():
+                        self.send_request()
+                        raise RuntimeError("abort")
+                except RuntimeError:
+                    pass
+            return callbacks
+
+        self.assertEqual(await sync_to_async(rolled_back)(), [])
+        await asyncio.sleep(0.05)
+        self.assertTrue(bob.empty())
+        await self.disconnect()
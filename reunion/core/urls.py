@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import FriendRequestViewSet, FriendViewSet, MemorySearchView
+from .views import FriendRequestViewSet, FriendViewSet, MemorySearchView, ExportView
 
 
 router = DefaultRouter()
@@ -10,4 +10,5 @@ router.register(r'reunited', FriendViewSet, basename='friendship')  # Friends li
 urlpatterns = [
     path('', include(router.urls)),
     path('memory-search/', MemorySearchView.as_view(), name='memory-search'),
+    path('export/<str:dataset>/', ExportView.as_view(), name='export'),
 ]
\ No newline at end of file
@@ -2,9 +2,10 @@ from django.shortcuts import render, get_object_or_404
 from rest_framework import viewsets, status, generics
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.views import APIView
-from .models import FriendRequest, Friend
+from .models import FriendRequest, Friend, ArchivedFriendRequest, Tombstone
+from .exports import EXPORTS
 from .serializers import (
     FriendRequestSerializer,
     FriendSerializer,
@@ -12,20 +13,128 @@ from .serializers import (
     UserBasicSerializer,
     UserDetailSearchSerializer
 )
+from .projections import (
+    ProjectedListMixin,
+    friend_profile_projection,
+    friend_projection,
+    friend_request_projection,
+)
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Q
-from postauth.models import UserDetail
+from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Exists, OuterRef, Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from authentication.jwt_auth import STATELESS_AUTHENTICATION_CLASSES, resolve_user
+from mainapp.conditional import conditional_get, latest_and_count, make_validators
+from mainapp.export import NDJSON, ExportError
+from postauth.models import UserDetail, UserStamp
+import datetime
+import heapq
 import json
 from rapidfuzz import fuzz
 
 User = get_user_model()
 
 
-class FriendRequestViewSet(viewsets.ModelViewSet):
+def delta_sync_response(request, queryset, kind, projection):
+    """
+    Build a delta-sync payload: rows of `queryset` (rendered by `projection`) changed
+    since `?since=` and ids of `kind` rows deleted since then. The returned `sync_token` overlaps the
+    previous window slightly so rows committed late are not missed; clients
+    should upsert by id. Without `since`, or with one older than the tombstone
+    retention, every row is returned with `full: true` and the client should
+    replace its copy.
+    """
+    # Capture the token before querying so nothing written meanwhile is skipped.
+    now = timezone.now()
+    sync_token = now - timezone.timedelta(
+        seconds=getattr(settings, 'SYNC_OVERLAP_SECONDS', 5)
+    )
+    since = request.query_params.get('since')
+    removed = []
+    
+    if since:
+        try:
+            since = parse_datetime(since)
+        except ValueError:
+            since = None
+        if since is None:
+            return Response(
+                {"detail": "since must be a sync_token returned by a previous sync."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since, datetime.timezone.utc)
+        retention = timezone.timedelta(days=getattr(settings, 'TOMBSTONE_RETENTION_DAYS', 30))
+        if since < now - retention:
+            # Deletions this old may have been pruned already
+            since = None
+    
+    if since:
+        queryset = queryset.filter(updated_at__gt=since)
+        removed = list(
+            Tombstone.objects.filter(user_id=request.user.id, kind=kind, deleted_at__gt=since)
+            .values_list('object_id', flat=True)
+        )
+    
+    return Response({
+        'changed': projection.serialize(queryset),
+        'removed': removed,
+        'full': not since,
+        'sync_token': sync_token.isoformat(),
+    })
+
+
+def embedded_user_stamps(*user_ids):
+    """UserStamps of the users whose fields a response embeds; each argument is a values() queryset of ids."""
+    condition = Q()
+    for ids in user_ids:
+        condition |= Q(user_id__in=ids)
+    return UserStamp.objects.filter(condition)
+
+
+def friends_validators(request):
+    """Validators for my_friends: the user's friendships, unfriend tombstones and the friends' own changes."""
+    user_id = request.user.id
+    return make_validators(
+        f'friends:{user_id}',
+        latest_and_count(Friend.objects.filter(Q(user1_id=user_id) | Q(user2_id=user_id))),
+        latest_and_count(
+            Tombstone.objects.filter(user_id=user_id, kind=Tombstone.FRIEND), 'deleted_at'
+        ),
+        latest_and_count(embedded_user_stamps(
+            Friend.objects.filter(user1_id=user_id).values('user2_id'),
+            Friend.objects.filter(user2_id=user_id).values('user1_id'),
+        )),
+    )
+
+
+def request_validators(scope, *querysets):
+    """Validators for request lists: the given querysets, request tombstones and the users they embed."""
+    def validators(request):
+        user_id = request.user.id
+        requests = [queryset(user_id) for queryset in querysets]
+        parts = [latest_and_count(queryset) for queryset in requests]
+        parts.append(latest_and_count(
+            Tombstone.objects.filter(user_id=user_id, kind=Tombstone.FRIEND_REQUEST), 'deleted_at'
+        ))
+        parts.append(latest_and_count(embedded_user_stamps(*(
+            queryset.values(column) for queryset in requests for column in ('sender_id', 'receiver_id')
+        ))))
+        return make_validators(f'{scope}:{user_id}', *parts)
+    return validators
+
+
+class FriendRequestViewSet(ProjectedListMixin, viewsets.ModelViewSet):
     """ViewSet for handling friend requests (Instagram-style follow requests)"""
     
     queryset = FriendRequest.objects.all()
     serializer_class = FriendRequestSerializer
+    projection = friend_request_projection
+    authentication_classes = STATELESS_AUTHENTICATION_CLASSES
     permission_classes = [IsAuthenticated]  
     
     def get_queryset(self):
@@ -33,17 +142,17 @@ class FriendRequestViewSet(viewsets.ModelViewSet):
         Filter requests to only show those related to the current user.
         By default, only show pending requests.
         """
-        user = self.request.user
+        user_id = self.request.user.id
         
         
         if self.action in ['sent', 'received', 'history']:
             return FriendRequest.objects.filter(
-                Q(sender=user) | Q(receiver=user)
+                Q(sender_id=user_id) | Q(receiver_id=user_id)
             ).select_related('sender', 'receiver')  
         
         
         return FriendRequest.objects.filter(
-            (Q(sender=user) | Q(receiver=user)) & 
+            (Q(sender_id=user_id) | Q(receiver_id=user_id)) & 
             Q(status='pending')
         ).select_related('sender', 'receiver')  
     
@@ -55,7 +164,15 @@ class FriendRequestViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         """Override create to automatically set the sender to the current user"""
-        serializer.save(sender=self.request.user)
+        with transaction.atomic():
+            friend_request = serializer.save(sender=resolve_user(self.request.user))
+            friend_request.emit_event('created')
+    
+    def perform_destroy(self, instance):
+        """Record the deletion in the outbox alongside the delete itself"""
+        with transaction.atomic():
+            instance.emit_event('deleted')
+            instance.delete()
     
     @action(detail=True, methods=['post'])
     def accept(self, request, pk=None):
@@ -63,7 +180,7 @@ class FriendRequestViewSet(viewsets.ModelViewSet):
         friend_request = self.get_object()
         
         
-        if friend_request.receiver != request.user:
+        if friend_request.receiver_id != request.user.id:
             return Response(
                 {"detail": "You can only accept requests sent to you."},
                 status=status.HTTP_403_FORBIDDEN
@@ -87,7 +204,7 @@ class FriendRequestViewSet(viewsets.ModelViewSet):
         friend_request = self.get_object()
         
         
-        if friend_request.receiver != request.user:
+        if friend_request.receiver_id != request.user.id:
             return Response(
                 {"detail": "You can only reject requests sent to you."},
                 status=status.HTTP_403_FORBIDDEN
@@ -111,7 +228,7 @@ class FriendRequestViewSet(viewsets.ModelViewSet):
         friend_request = self.get_object()
         
         
-        if friend_request.sender != request.user:
+        if friend_request.sender_id != request.user.id:
             return Response(
                 {"detail": "You can only cancel requests you sent."},
                 status=status.HTTP_403_FORBIDDEN
@@ -130,44 +247,114 @@ class FriendRequestViewSet(viewsets.ModelViewSet):
             )
     
     @action(detail=False, methods=['get'])
+    @conditional_get(request_validators(
+        'sent', lambda user_id: FriendRequest.objects.filter(sender_id=user_id)
+    ))
     def sent(self, request):
         """Get all friend requests sent by the current user"""
-        sent_requests = FriendRequest.objects.filter(sender=request.user)
-        serializer = self.get_serializer(sent_requests, many=True)
-        return Response(serializer.data)
+        sent_requests = FriendRequest.objects.filter(sender_id=request.user.id)
+        return Response(self.get_projection().serialize(sent_requests))
     
     @action(detail=False, methods=['get'])
+    @conditional_get(request_validators(
+        'received', lambda user_id: FriendRequest.objects.filter(receiver_id=user_id)
+    ))
     def received(self, request):
         """Get all friend requests received by the current user"""
-        received_requests = FriendRequest.objects.filter(receiver=request.user)
-        serializer = self.get_serializer(received_requests, many=True)
-        return Response(serializer.data)
+        received_requests = FriendRequest.objects.filter(receiver_id=request.user.id)
+        return Response(self.get_projection().serialize(received_requests))
     
     @action(detail=False, methods=['get'])
+    @conditional_get(request_validators(
+        'history',
+        lambda user_id: FriendRequest.objects.filter(Q(sender_id=user_id) | Q(receiver_id=user_id)),
+        lambda user_id: ArchivedFriendRequest.objects.filter(Q(sender_id=user_id) | Q(receiver_id=user_id)),
+    ))
     def history(self, request):
-        """Get all friend requests including accepted/rejected ones"""
-        user = request.user
-        all_requests = FriendRequest.objects.filter(
-            Q(sender=user) | Q(receiver=user)
+        """
+        Get all friend requests including accepted/rejected ones, newest first.
+        Archived requests are merged in transparently; pages are keyed on request id,
+        pass the returned `next_cursor` as `?cursor=` to fetch the next page.
+        """
+        user_id = request.user.id
+        
+        try:
+            page_size = max(1, min(int(request.query_params.get('page_size', 20)), 100))
+            cursor = request.query_params.get('cursor')
+            cursor = int(cursor) if cursor else None
+        except ValueError:
+            return Response(
+                {"detail": "page_size and cursor must be integers."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        involved = Q(sender_id=user_id) | Q(receiver_id=user_id)
+        if cursor is not None:
+            involved &= Q(id__lt=cursor)
+        
+        # Merging and the cursor need every id, even when ?fields= / ?exclude= drop it
+        include, exclude = self.get_fieldset()
+        hide_id = (include is not None and 'id' not in include) or bool(exclude and 'id' in exclude)
+        projection = friend_request_projection.with_fieldset(
+            {**include, 'id': None} if include is not None else None,
+            {name: sub for name, sub in exclude.items() if name != 'id'} if exclude else None,
+        )
+        
+        live = projection.serialize(
+            FriendRequest.objects.filter(involved).order_by('-id')[:page_size + 1]
+        )
+        archived = projection.serialize(
+            ArchivedFriendRequest.objects.filter(involved).order_by('-id')[:page_size + 1]
+        )
+        
+        rows = list(heapq.merge(live, archived, key=lambda r: r['id'], reverse=True))
+        page = rows[:page_size]
+        next_cursor = page[-1]['id'] if len(rows) > page_size else None
+        if hide_id:
+            for row in page:
+                del row['id']
+        
+        return Response({
+            'results': page,
+            'pagination': {
+                'page_size': page_size,
+                'next_cursor': next_cursor
+            }
+        })
+    
+    @action(detail=False, methods=['get'])
+    def sync(self, request):
+        """
+        Delta sync: requests added or changed since `?since=<sync_token>` and ids of
+        canceled/deleted ones. Without `since`, every current request is returned.
+        """
+        user_id = request.user.id
+        requests_qs = FriendRequest.objects.filter(Q(sender_id=user_id) | Q(receiver_id=user_id))
+        return delta_sync_response(
+            request, requests_qs, Tombstone.FRIEND_REQUEST, self.get_projection()
         )
-        serializer = self.get_serializer(all_requests, many=True)
-        return Response(serializer.data)
 
 
-class FriendViewSet(viewsets.ReadOnlyModelViewSet):
+class FriendViewSet(ProjectedListMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for viewing friendships (Instagram-style mutual follows)"""
     
     serializer_class = FriendSerializer
+    projection = friend_projection
+    authentication_classes = STATELESS_AUTHENTICATION_CLASSES
     permission_classes = [IsAuthenticated]  
     
     def get_queryset(self):
         """Filter friendships to only show those related to the current user"""
-        user = self.request.user
-        return Friend.objects.filter(Q(user1=user) | Q(user2=user))
+        user_id = self.request.user.id
+        return Friend.objects.filter(Q(user1_id=user_id) | Q(user2_id=user_id))
     
     @action(detail=False, methods=['get'])
+    @conditional_get(friends_validators)
     def my_friends(self, request):
-        """Get all friends of the current user with pagination"""
+        """
+        Get all friends of the current user with pagination, each with their
+        profile joined in the same query; ?fields= / ?exclude= apply to each friend
+        """
         user = request.user
         
         
@@ -198,7 +385,7 @@ class FriendViewSet(viewsets.ReadOnlyModelViewSet):
         paginated_friends = friends[start:end]
         
         
-        serialized_friends = UserBasicSerializer(paginated_friends, many=True).data
+        serialized_friends = self.get_projection(friend_profile_projection).serialize(paginated_friends)
         
         
         response_data = {
@@ -215,6 +402,16 @@ class FriendViewSet(viewsets.ReadOnlyModelViewSet):
         
         return Response(response_data)
     
+    @action(detail=False, methods=['get'])
+    def sync(self, request):
+        """
+        Delta sync: friendships added since `?since=<sync_token>` and ids of removed ones.
+        Without `since`, every current friendship is returned.
+        """
+        user_id = request.user.id
+        friendships = Friend.objects.filter(Q(user1_id=user_id) | Q(user2_id=user_id))
+        return delta_sync_response(request, friendships, Tombstone.FRIEND, self.get_projection())
+    
     @action(detail=False, methods=['delete'])
     def unfriend(self, request):
         """Remove a friendship with another user"""
@@ -228,8 +425,8 @@ class FriendViewSet(viewsets.ReadOnlyModelViewSet):
         try:
             friend = User.objects.get(pk=friend_id)
             friendship = Friend.objects.filter(
-                (Q(user1=request.user, user2=friend) | 
-                 Q(user1=friend, user2=request.user))
+                (Q(user1_id=request.user.id, user2=friend) | 
+                 Q(user1=friend, user2_id=request.user.id))
             ).first()
             
             if not friendship:
@@ -238,7 +435,9 @@ class FriendViewSet(viewsets.ReadOnlyModelViewSet):
                     status=status.HTTP_404_NOT_FOUND
                 )
                 
-            friendship.delete()
+            with transaction.atomic():
+                friendship.emit_event('deleted')
+                friendship.delete()
             return Response(
                 {"detail": "Friend removed successfully."},
                 status=status.HTTP_200_OK
@@ -278,6 +477,13 @@ class MemorySearchView(APIView):
         
         
         queryset = UserDetail.objects.all()
+        if request.user.is_authenticated:
+            # Friendship of each result with the caller, from the (user1, user2) index
+            me = request.user.id
+            queryset = queryset.annotate(is_friend=Exists(Friend.objects.filter(
+                Q(user1_id=me, user2_id=OuterRef('user_id')) |
+                Q(user1_id=OuterRef('user_id'), user2_id=me)
+            )))
         
         
         try:
@@ -373,6 +579,8 @@ class MemorySearchView(APIView):
                 if match:
                     filtered_results.append({
                         "username": user.username,
+                        "user_id": user.user_id,
+                        "is_friend": getattr(user, 'is_friend', False),
                         "firstname": user.firstname,
                         "lastname": user.lastname,
                         "penname": user.penname,
@@ -385,8 +593,43 @@ class MemorySearchView(APIView):
             for user in results:
                 basic_results.append({
                     "username": user.username,
+                    "user_id": user.user_id,
+                    "is_friend": getattr(user, 'is_friend', False),
                     "firstname": user.firstname,
                     "lastname": user.lastname,
                     "penname": user.penname
                 })
             return Response(basic_results)
+
+
+class ExportView(APIView):
+    """
+    Admin-only bulk export of a dataset in core.exports.EXPORTS, streamed in
+    constant memory under WSGI and ASGI alike. `?file_format=ndjson|csv|parquet` (default ndjson) and
+    `?gzip=1` to compress NDJSON/CSV on the fly.
+    """
+    permission_classes = [IsAdminUser]
+
+    def perform_content_negotiation(self, request, force=False):
+        # The file is not rendered, so an Accept of text/csv must not be a 406
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, dataset):
+        export = EXPORTS.get(dataset)
+        if export is None:
+            return Response(
+                {"detail": f"Unknown dataset; choose one of {', '.join(EXPORTS)}."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        fmt = request.query_params.get('file_format', NDJSON)
+        compress = request.query_params.get('gzip', '').lower() in ('1', 'true')
+        try:
+            stream = export.stream(fmt, compress=compress)
+        except ExportError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # ASGI servers would otherwise buffer a sync iterator whole before the first byte
+        content = stream.async_chunks() if isinstance(request._request, ASGIRequest) else stream
+        response = StreamingHttpResponse(content, content_type=export.content_type(fmt, compress))
+        response['Content-Disposition'] = f'attachment; filename="{export.filename(dataset, fmt, compress)}"'
+        return response
@@ -0,0 +1,62 @@
+"""
+Conditional GET for list endpoints.
+
+A view method decorated with `conditional_get(validators)` first asks
+`validators(request)` for an (etag, last_modified) pair, which should come
+from a cheap indexed aggregate, and answers 304 Not Modified when the client's
+If-None-Match / If-Modified-Since still matches. Only on a miss does the view
+run its real query and serialization.
+"""
+import functools
+import hashlib
+from calendar import timegm
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def latest_and_count(queryset, field='updated_at'):
+    """Return (max(field), row count) for `queryset` in a single aggregate query."""
+    result = queryset.order_by().aggregate(latest=Max(field), count=Count('pk'))
+    return result['latest'], result['count']
+
+
+def make_validators(scope, *parts):
+    """
+    Build (etag, last_modified) from (latest, count) pairs; the count may
+    also be a version counter. `scope` keeps validators of different
+    endpoints and users apart.
+    """
+    latest_values = [latest for latest, _ in parts if latest is not None]
+    last_modified = max(latest_values) if latest_values else None
+    fingerprint = ':'.join(
+        [scope] + [f"{count}@{latest.isoformat() if latest else '-'}" for latest, count in parts]
+    )
+    etag = 'W/' + quote_etag(hashlib.md5(fingerprint.encode(), usedforsecurity=False).hexdigest())
+    return etag, last_modified
+
+
+def conditional_get(validators):
+    """Decorator for GET view methods answering 304 before the view body runs."""
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_method(self, request, *args, **kwargs)
+
+            etag, last_modified = validators(request)
+            timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+
+            not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if not_modified is not None:
+                return not_modified
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                response.headers.setdefault('ETag', etag)
+                if timestamp is not None:
+                    response.headers.setdefault('Last-Modified', http_date(timestamp))
+            return response
+        return wrapper
+    return decorator
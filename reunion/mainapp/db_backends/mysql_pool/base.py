@@ -0,0 +1,141 @@
+"""
+MySQL backend that checks connections out of a per-alias pool.
+
+Configured through `OPTIONS['pool']` of a DATABASES entry using ENGINE
+'mainapp.db_backends.mysql_pool':
+
+    'OPTIONS': {
+        ...
+        'pool': {'min_size': 2, 'max_size': 20, 'timeout': 10, 'pre_ping': True},
+    },
+    'CONN_MAX_AGE': 0,
+
+Django "closes" the connection at the end of every request, which here
+returns it to the pool, so CONN_MAX_AGE should be 0: the pool, not each
+thread, keeps connections open, and `max_size` caps them across all threads
+of the process. pool_stats() exposes per-alias counters.
+
+A returned connection is rolled back and reused as is. Statements that
+leave state in the session (temporary tables, SET of session or user
+variables, GET_LOCK, LOCK TABLES) mark the connection, and a marked one is
+closed on return instead, so the next user never inherits that state.
+COM_RESET_CONNECTION would clear it too, but also the charset and
+init_command set up on connect, which are not re-applied to a reused
+connection.
+"""
+import re
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.mysql.base import CursorWrapper, Database
+from django.db.backends.mysql.base import DatabaseWrapper as MySQLDatabaseWrapper
+from django.utils.asyncio import async_unsafe
+
+from .pool import ConnectionPool, PoolTimeout
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+# SET TRANSACTION without SESSION only applies to the next transaction
+SESSION_STATE_RE = re.compile(
+    r'^\s*SET\s+(?!TRANSACTION\b)|\bCREATE\s+TEMPORARY\b|\bGET_LOCK\s*\(|\bLOCK\s+TABLES?\b',
+    re.IGNORECASE,
+)
+
+
+def changes_session(sql):
+    """True if `sql` leaves state behind in the session that a rollback does not clear."""
+    return bool(SESSION_STATE_RE.search(sql))
+
+
+def pool_stats():
+    """Return {alias: stats} for every pool opened in this process."""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in pools.items()}
+
+
+def _ping(raw):
+    raw.ping()
+
+
+def _reset(raw):
+    # Hand the next user a connection with no transaction left open
+    if not raw.get_autocommit():
+        raw.rollback()
+
+
+class SessionTrackingCursorWrapper(CursorWrapper):
+    def __init__(self, cursor, db):
+        super().__init__(cursor)
+        self.db = db
+
+    def execute(self, query, args=None):
+        if changes_session(query):
+            self.db.session_changed = True
+        return super().execute(query, args)
+
+    def executemany(self, query, args):
+        if changes_session(query):
+            self.db.session_changed = True
+        return super().executemany(query, args)
+
+
+class DatabaseWrapper(MySQLDatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._reused_connection = False
+        # Set when the session holds state that must not reach the next user
+        self.session_changed = False
+
+    def check_settings(self):
+        super().check_settings()
+        if self.settings_dict['CONN_MAX_AGE'] != 0:
+            raise ImproperlyConfigured(
+                f"Database '{self.alias}' uses the pooled MySQL backend: set CONN_MAX_AGE to 0."
+            )
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    @property
+    def pool(self):
+        with _pools_lock:
+            pool = _pools.get(self.alias)
+            if pool is None:
+                conn_params = self.get_connection_params()
+                pool = _pools[self.alias] = ConnectionPool(
+                    self.alias,
+                    connect=lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+                    ping=_ping,
+                    reset=_reset,
+                    options=self.settings_dict['OPTIONS'].get('pool'),
+                )
+            return pool
+
+    def get_new_connection(self, conn_params):
+        try:
+            raw, self._reused_connection = self.pool.checkout()
+        except PoolTimeout as e:
+            raise Database.OperationalError(str(e)) from e
+        return raw
+
+    def init_connection_state(self):
+        # Session state set up by Django survives in a pooled connection
+        if not self._reused_connection:
+            super().init_connection_state()
+        # What Django sets up here is meant to stay with the connection
+        self.session_changed = False
+
+    @async_unsafe
+    def create_cursor(self, name=None):
+        return SessionTrackingCursorWrapper(self.connection.cursor(), self)
+
+    def _close(self):
+        if self.connection is not None:
+            broken = self.session_changed or (self.errors_occurred and not self.is_usable())
+            self.session_changed = False
+            with self.wrap_database_errors:
+                self.pool.checkin(self.connection, broken=broken)
@@ -0,0 +1,200 @@
+"""
+Thread-safe pool of DB-API connections, independent of the driver.
+
+Connections are created by `connect()` up to `max_size`; `min_size` of them
+are opened on first use and kept around. Checkout hands out an idle
+connection (pinging it first when `pre_ping` is on, and replacing it if the
+ping fails or it outlived `max_lifetime`), opens a new one while below
+`max_size`, or waits up to `timeout` seconds for one to be returned.
+Checkin runs `reset()` on the connection and keeps it idle, or closes it
+when the caller reports it broken or the reset fails.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'min_size': 0,
+    'max_size': 10,
+    'timeout': 10,  # seconds to wait for a free connection
+    'max_lifetime': 3600,  # seconds before a connection is replaced
+    'pre_ping': True,
+    'log_interval': 300,  # seconds between metric log lines, 0 to disable
+}
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the checkout timeout."""
+
+
+class PooledConnection:
+    """A raw connection plus the bookkeeping the pool needs."""
+
+    __slots__ = ('raw', 'created_at')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+
+
+class ConnectionPool:
+    def __init__(self, name, connect, ping, reset, options=None):
+        self.name = name
+        self.options = {**DEFAULTS, **(options or {})}
+        self._connect = connect
+        self._ping = ping
+        self._reset = reset
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._condition = threading.Condition()
+        self._filled = False
+        self._last_log = time.monotonic()
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'discarded': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0,
+        }
+
+    def _open(self):
+        """Open a connection for a slot that has already been reserved in `_size`."""
+        try:
+            pooled = PooledConnection(self._connect())
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._stats['created'] += 1
+        return pooled
+
+    def _discard(self, pooled):
+        try:
+            pooled.raw.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._size -= 1
+            self._stats['discarded'] += 1
+            self._condition.notify()
+
+    def _is_usable(self, pooled):
+        if time.monotonic() - pooled.created_at > self.options['max_lifetime']:
+            return False
+        if not self.options['pre_ping']:
+            return True
+        try:
+            self._ping(pooled.raw)
+            return True
+        except Exception:
+            return False
+
+    def _fill(self):
+        with self._condition:
+            missing = self.options['min_size'] - self._size
+            self._size += max(missing, 0)
+            self._filled = True
+        for _ in range(max(missing, 0)):
+            pooled = self._open()
+            with self._condition:
+                self._idle.append(pooled)
+                self._condition.notify()
+
+    def checkout(self):
+        """
+        Return (raw connection, reused) where `reused` is False for a freshly
+        opened connection; raises PoolTimeout if none frees up in time.
+        """
+        if not self._filled:
+            self._fill()
+        started = time.monotonic()
+        deadline = started + self.options['timeout']
+        waited = False
+
+        while True:
+            with self._condition:
+                while not self._idle and self._size >= self.options['max_size']:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f"No connection available in pool '{self.name}' "
+                            f"after {self.options['timeout']}s ({self._size} open)"
+                        )
+                    waited = True
+                    self._condition.wait(remaining)
+                if self._idle:
+                    pooled = self._idle.pop()
+                else:
+                    self._size += 1
+                    pooled = None
+
+            reused = pooled is not None
+            if not reused:
+                pooled = self._open()
+            elif not self._is_usable(pooled):
+                self._discard(pooled)
+                continue
+
+            wait_ms = (time.monotonic() - started) * 1000
+            with self._condition:
+                self._in_use[id(pooled.raw)] = pooled
+                self._stats['checkouts'] += 1
+                self._stats['waits'] += 1 if waited else 0
+                self._stats['wait_ms_total'] += wait_ms
+                self._stats['wait_ms_max'] = max(self._stats['wait_ms_max'], wait_ms)
+            self._maybe_log()
+            return pooled.raw, reused
+
+    def checkin(self, raw, broken=False):
+        """Return `raw` to the pool, or close it if it is broken or cannot be reset."""
+        with self._condition:
+            pooled = self._in_use.pop(id(raw), None)
+        if pooled is None:
+            # Not ours (e.g. opened before the pool existed): just close it
+            raw.close()
+            return
+        if not broken:
+            try:
+                self._reset(raw)
+            except Exception:
+                broken = True
+        if broken:
+            self._discard(pooled)
+            return
+        with self._condition:
+            self._idle.append(pooled)
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update(
+                size=self._size,
+                idle=len(self._idle),
+                in_use=len(self._in_use),
+                max_size=self.options['max_size'],
+            )
+        stats['wait_ms_avg'] = stats['wait_ms_total'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        return stats
+
+    def _maybe_log(self):
+        interval = self.options['log_interval']
+        if not interval or time.monotonic() - self._last_log < interval:
+            return
+        self._last_log = time.monotonic()
+        logger.info(f"Connection pool '{self.name}': {self.stats()}")
+
+    def close(self):
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+        for pooled in idle:
+            self._discard(pooled)
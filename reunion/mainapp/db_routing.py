@@ -0,0 +1,169 @@
+"""
+Read-replica routing.
+
+ReplicaRouter sends reads to the aliases listed in DATABASE_REPLICAS and
+everything else to `default`, but only while ReplicaRoutingMiddleware has
+marked the current request as replica-safe: a GET/HEAD/OPTIONS request from a
+client that has not written recently. Code outside a request (management
+commands, workers), reads inside a transaction and reads after a write in the
+same request all stay on the primary.
+
+Read-your-writes: a request that wrote sets a short-lived cookie, and the
+client's requests go to the primary until it expires (REPLICA_ROUTING
+['PIN_SECONDS']). Each replica is probed with `SELECT 1` (and, on MySQL, its
+replication lag) at most every HEALTH_CHECK_INTERVAL seconds; unhealthy
+replicas are skipped and reads fall back to the primary when none is left.
+
+To try it locally, add a second alias pointing at the same SQLite file (or a
+second MySQL instance) and list it in DATABASE_REPLICAS.
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'PIN_SECONDS': 5,
+    'HEALTH_CHECK_INTERVAL': 10,
+    'MAX_LAG_SECONDS': 30,
+}
+
+PIN_COOKIE = 'db_pinned_until'
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+_wrote = contextvars.ContextVar('wrote', default=False)
+
+
+def routing_options():
+    return {**DEFAULTS, **getattr(settings, 'REPLICA_ROUTING', {})}
+
+
+def replica_aliases():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+class ReplicaHealth:
+    """Caches a healthy/unhealthy verdict per replica for HEALTH_CHECK_INTERVAL seconds."""
+
+    def __init__(self):
+        self._status = {}
+        self._lock = threading.Lock()
+
+    def is_healthy(self, alias):
+        options = routing_options()
+        now = time.monotonic()
+        with self._lock:
+            healthy, checked_at = self._status.get(alias, (True, None))
+            if checked_at is not None and now - checked_at < options['HEALTH_CHECK_INTERVAL']:
+                return healthy
+            # Mark as checked first so concurrent requests do not all probe at once
+            self._status[alias] = (healthy, now)
+
+        healthy = self.probe(alias, options['MAX_LAG_SECONDS'])
+        with self._lock:
+            self._status[alias] = (healthy, time.monotonic())
+        return healthy
+
+    @staticmethod
+    def probe(alias, max_lag):
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                if connection.vendor == 'mysql':
+                    status = ReplicaHealth.replication_status(cursor)
+                    if status is not None:
+                        # MariaDB keeps the old column name under the new statement
+                        lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+                        if lag is None or lag > max_lag:
+                            logger.warning(f"Replica {alias} is behind by {lag}s, not routing reads to it")
+                            return False
+            return True
+        except DatabaseError as e:
+            logger.warning(f"Replica {alias} failed its health check: {e}")
+            connection.close()
+            return False
+
+    @staticmethod
+    def replication_status(cursor):
+        """Return the replica status row as a dict, or None when the server is not a replica."""
+        try:
+            cursor.execute('SHOW REPLICA STATUS')
+        except DatabaseError:
+            # MySQL before 8.0.22 and MariaDB before 10.5.1
+            cursor.execute('SHOW SLAVE STATUS')
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([column[0] for column in cursor.description], row))
+
+    def snapshot(self):
+        with self._lock:
+            return {alias: healthy for alias, (healthy, _) in self._status.items()}
+
+
+replica_health = ReplicaHealth()
+
+
+class ReplicaRouter:
+    """Routes replica-safe reads to a healthy replica and everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get() or _wrote.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        healthy = [alias for alias in replica_aliases() if replica_health.is_healthy(alias)]
+        return random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """Marks safe requests as replica-readable and pins clients to the primary after they write."""
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        use_replica = request.method in self.SAFE_METHODS and not self.is_pinned(request)
+        replica_token = _use_replica.set(use_replica)
+        wrote_token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get() or request.method not in self.SAFE_METHODS:
+                pin_seconds = routing_options()['PIN_SECONDS']
+                response.set_cookie(
+                    PIN_COOKIE,
+                    str(time.time() + pin_seconds),
+                    max_age=pin_seconds,
+                    httponly=True,
+                    secure=settings.SESSION_COOKIE_SECURE,
+                    samesite=settings.SESSION_COOKIE_SAMESITE,
+                )
+            return response
+        finally:
+            _use_replica.reset(replica_token)
+            _wrote.reset(wrote_token)
+
+    @staticmethod
+    def is_pinned(request):
+        try:
+            return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
@@ -0,0 +1,266 @@
+"""
+Streaming bulk exports as NDJSON, CSV or Parquet.
+
+An Export names a model and the columns to dump. Export.stream() returns
+an iterable of byte chunks that is fed to a StreamingHttpResponse or
+written to a file, so memory use is bounded by one batch of BATCH_SIZE rows
+however large the table is.
+
+Rows are read as tuples (`values_list().iterator()`) in primary-key order.
+On PostgreSQL and SQLite one query is streamed through a server-side cursor.
+mysqlclient buffers a whole result set on the client even then, so on MySQL
+the export walks the table in keyset pages instead (`pk > last ORDER BY pk
+LIMIT BATCH_SIZE`), each page one indexed range read.
+
+Under ASGI, Django would read a plain iterator into a list before sending
+it, so views hand the server `ExportStream.async_chunks()` instead, which
+produces each chunk in Django's sync thread and yields it as soon as it is
+ready.
+
+`compress` gzips NDJSON and CSV on the fly. Parquet files are already
+compressed per column; `compress` switches their codec from snappy to gzip.
+Parquet needs pyarrow, which is optional.
+"""
+import csv
+import io
+import json
+import time
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, models
+
+from .fastjson import dumps
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+DEFAULTS = {
+    'BATCH_SIZE': 5000,
+}
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+PARQUET = 'parquet'
+FORMATS = (NDJSON, CSV, PARQUET)
+
+CONTENT_TYPES = {
+    NDJSON: 'application/x-ndjson',
+    CSV: 'text/csv; charset=utf-8',
+    PARQUET: 'application/vnd.apache.parquet',
+}
+EXTENSIONS = {NDJSON: '.ndjson', CSV: '.csv', PARQUET: '.parquet'}
+GZIP_CONTENT_TYPE = 'application/gzip'
+
+
+def export_options():
+    return {**DEFAULTS, **getattr(settings, 'DATA_EXPORT', {})}
+
+
+class ExportError(Exception):
+    """The export cannot be produced as asked (unknown format, pyarrow missing)."""
+
+
+class Export:
+    """A model and the columns (attnames, so `user1_id` rather than `user1`) to export."""
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = list(fields)
+        self.pk = model._meta.pk.attname
+        if self.pk not in self.fields:
+            raise ValueError(f"Exported fields of {model.__name__} must include the primary key '{self.pk}'.")
+
+    def get_queryset(self):
+        return self.model._default_manager.all()
+
+    def stream(self, fmt, compress=False, batch_size=None):
+        """Return an ExportStream; checks the format up front so callers can still report errors."""
+        if fmt not in FORMATS:
+            raise ExportError(f"Unknown format {fmt!r}; use one of {', '.join(FORMATS)}.")
+        if fmt == PARQUET and pyarrow is None:
+            raise ExportError("Parquet exports need pyarrow installed.")
+        return ExportStream(self, fmt, compress, batch_size or export_options()['BATCH_SIZE'])
+
+    def filename(self, name, fmt, compress=False):
+        suffix = '.gz' if compress and fmt != PARQUET else ''
+        return f'{name}{EXTENSIONS[fmt]}{suffix}'
+
+    def content_type(self, fmt, compress=False):
+        return GZIP_CONTENT_TYPE if compress and fmt != PARQUET else CONTENT_TYPES[fmt]
+
+    def batches(self, batch_size):
+        """Yield lists of up to `batch_size` row tuples in primary-key order."""
+        queryset = self.get_queryset().order_by(self.pk)
+        if connections[queryset.db].vendor != 'mysql':
+            batch = []
+            for row in queryset.values_list(*self.fields).iterator(chunk_size=batch_size):
+                batch.append(row)
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+            return
+
+        position = self.fields.index(self.pk)
+        last = None
+        while True:
+            page = queryset if last is None else queryset.filter(**{f'{self.pk}__gt': last})
+            batch = list(page.values_list(*self.fields)[:batch_size].iterator(chunk_size=batch_size))
+            if not batch:
+                return
+            yield batch
+            if len(batch) < batch_size:
+                return
+            last = batch[-1][position]
+
+
+class ExportStream:
+    """Iterable of the export's byte chunks; `rows` counts the rows written so far."""
+
+    def __init__(self, export, fmt, compress, batch_size):
+        self.export = export
+        self.fmt = fmt
+        self.compress = compress
+        self.batch_size = batch_size
+        self.rows = 0
+        self.started = None
+
+    @property
+    def rows_per_second(self):
+        seconds = time.monotonic() - self.started if self.started else 0
+        return self.rows / seconds if seconds else 0.0
+
+    def __iter__(self):
+        self.started = time.monotonic()
+        encode = {NDJSON: self.ndjson_chunks, CSV: self.csv_chunks, PARQUET: self.parquet_chunks}[self.fmt]
+        chunks = encode(self.counted(self.export.batches(self.batch_size)))
+        if self.compress and self.fmt != PARQUET:
+            chunks = _gzip(chunks)
+        return chunks
+
+    async def async_chunks(self):
+        """The chunks of __iter__ for ASGI responses, each produced in the sync thread that owns the cursor."""
+        chunks = iter(self)
+        done = object()
+        while True:
+            chunk = await sync_to_async(next, thread_sensitive=True)(chunks, done)
+            if chunk is done:
+                return
+            yield chunk
+
+    def counted(self, batches):
+        for batch in batches:
+            yield batch
+            self.rows += len(batch)
+
+    def ndjson_chunks(self, batches):
+        fields = self.export.fields
+        for batch in batches:
+            yield b''.join(dumps(dict(zip(fields, row))) + b'\n' for row in batch)
+
+    def csv_chunks(self, batches):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.export.fields)
+        for batch in batches:
+            writer.writerows([_csv_value(value) for value in row] for row in batch)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        # An empty table still gets its header
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+    def parquet_chunks(self, batches):
+        meta = self.export.model._meta
+        columns = [(name, meta.get_field(name)) for name in self.export.fields]
+        schema = pyarrow.schema([(name, _arrow_type(field)) for name, field in columns])
+        json_columns = {i for i, (_, field) in enumerate(columns) if isinstance(field, models.JSONField)}
+        sink = _ChunkSink()
+        with pyarrow.parquet.ParquetWriter(sink, schema, compression='gzip' if self.compress else 'snappy') as writer:
+            for batch in batches:
+                arrays = [
+                    pyarrow.array(
+                        [_json_text(value) for value in values] if i in json_columns else values,
+                        type=schema.field(i).type,
+                    )
+                    for i, values in enumerate(zip(*batch))
+                ]
+                # One row group per batch
+                writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+                yield sink.drain()
+        yield sink.drain()
+
+
+class _ChunkSink:
+    """Write-only file object that hands over what was written since the last drain()."""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _json_text(value):
+    return None if value is None else json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return _json_text(value)
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return value
+
+
+def _arrow_type(field):
+    if isinstance(field, models.ForeignKey):
+        field = field.target_field
+    if isinstance(field, models.BooleanField):
+        return pyarrow.bool_()
+    if isinstance(field, models.IntegerField):
+        return pyarrow.int64()
+    if isinstance(field, models.FloatField):
+        return pyarrow.float64()
+    if isinstance(field, models.DateTimeField):
+        return pyarrow.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pyarrow.date32()
+    return pyarrow.string()
@@ -0,0 +1,140 @@
+"""
+orjson-backed JSON for DRF and plain Django views.
+
+ORJSONRenderer and ORJSONParser are drop-in replacements for DRF's
+JSONRenderer and JSONParser, and produce the same bytes for everything the
+API returns; the one known difference is the spelling of float exponents
+(`1e-7` where Python writes `1e-07`), which decodes to the same value. orjson handles str, numbers, dict/list, datetime, date, time and
+UUID natively; Decimal, lazy translation strings, querysets and the other
+types DRF's encoder knows fall back to that encoder. When orjson is not
+installed both classes behave exactly like their DRF parents.
+
+orjson refuses a few values DRF's encoder accepts (integers wider than 64
+bits, for one); such payloads are re-rendered by DRF rather than failing.
+orjson writes NaN and Infinity as null, so payloads holding them go to DRF
+too, which raises ValueError under STRICT_JSON (the default). The tests
+in mainapp/tests.py compare the output with DRF's renderer, and
+`manage.py bench_fastjson` benchmarks both.
+"""
+import decimal
+import json
+import math
+
+from django.http import HttpResponse
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+_fallback_encoder = JSONEncoder()
+
+# DRF writes UTC datetimes with a trailing "Z" and accepts non-string dict keys
+ORJSON_OPTIONS = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+def _default(obj):
+    value = _fallback_encoder.default(obj)
+    if isinstance(value, float) and not math.isfinite(value):
+        # Decimal('NaN') and the like; re-rendered by DRF
+        raise ValueError(f"Out of range float value {value!r}")
+    return value
+
+
+def _has_non_finite(data):
+    if isinstance(data, float):
+        return not math.isfinite(data)
+    if isinstance(data, decimal.Decimal):
+        return not data.is_finite()
+    if isinstance(data, dict):
+        return any(_has_non_finite(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(_has_non_finite(value) for value in data)
+    return False
+
+
+def dumps(data, indent=False):
+    """Serialize `data` to UTF-8 JSON bytes the way DRF's JSONRenderer would."""
+    options = ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0)
+    try:
+        ret = orjson.dumps(data, default=_default, option=options)
+    except orjson.JSONEncodeError:
+        return JSONRenderer().render(data, renderer_context={'indent': 2 if indent else None})
+    # NaN/Infinity came out as null; only then is the payload walked for them
+    if b'null' in ret and _has_non_finite(data):
+        return JSONRenderer().render(data, renderer_context={'indent': 2 if indent else None})
+    # Keep DRF's escaping of U+2028/U+2029 so the output stays a JavaScript subset
+    if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+        ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return ret
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes with orjson; indented output (browsable API) uses two spaces."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or not (api_settings.UNICODE_JSON and api_settings.COMPACT_JSON):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        return dumps(data, indent=bool(indent))
+
+
+class ORJSONParser(JSONParser):
+    """JSONParser that decodes with orjson."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        try:
+            body = stream.read() if stream is not None else b''
+            if encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+                body = body.decode(encoding)
+            return orjson.loads(body)
+        except (ValueError, UnicodeDecodeError) as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class NDJSONParser(BaseParser):
+    """Parses newline-delimited JSON (one value per line, blank lines ignored) into a list."""
+
+    media_type = 'application/x-ndjson'
+    # Values read before the body is rejected with a ParseError; None reads them all
+    max_items = None
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        loads = orjson.loads if orjson is not None else json.loads
+        max_items = self.max_items
+        items = []
+        if stream is None:
+            return items
+        for number, line in enumerate(iter(stream.readline, b''), 1):
+            if not line.strip():
+                continue
+            if max_items is not None and len(items) == max_items:
+                raise ParseError(f'NDJSON body has more than {max_items} values')
+            try:
+                items.append(loads(line))
+            except ValueError as exc:
+                raise ParseError(f'NDJSON parse error on line {number} - {exc}')
+        return items
+
+
+class ORJSONResponse(HttpResponse):
+    """JsonResponse counterpart encoding with orjson (DRF's encoder when orjson is missing)."""
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError("In order to allow non-dict objects to be serialized set the safe parameter to False.")
+        kwargs.setdefault('content_type', 'application/json')
+        content = dumps(data) if orjson is not None else JSONRenderer().render(data)
+        super().__init__(content=content, **kwargs)
@@ -0,0 +1,153 @@
+"""
+Sparse fieldsets for DRF views.
+
+`?fields=id,sender.username` keeps only the listed fields and `?exclude=
+edu_details,sender.last_name` drops fields; dotted names reach into nested
+serializers, and a field named without sub-fields is kept or dropped whole.
+Both parameters are validated against the serializer, so a typo is a 400
+rather than a silently empty object.
+
+SparseFieldsetMixin trims the serializer and narrows the queryset to match:
+`.only()` loads just the columns the remaining fields read, and
+`select_related` is rebuilt so relations whose nested fields were all
+trimmed are no longer joined. Without either parameter the view behaves
+exactly as before. Only safe (GET/HEAD/OPTIONS) requests are affected.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = 'fields'
+EXCLUDE_PARAM = 'exclude'
+
+
+def parse_fieldset(query_params):
+    """
+    Return (include, exclude) trees from the query string: dicts mapping a
+    field name to None (the whole field) or to the tree of its sub-fields.
+    `include` is None when no `fields` parameter was given.
+    """
+    include = exclude = None
+    if query_params.get(FIELDS_PARAM):
+        include = _parse_tree(query_params[FIELDS_PARAM])
+    if query_params.get(EXCLUDE_PARAM):
+        exclude = _parse_tree(query_params[EXCLUDE_PARAM])
+    return include, exclude
+
+
+def _parse_tree(value):
+    tree = {}
+    for path in filter(None, (part.strip() for part in value.split(','))):
+        node = tree
+        *parents, leaf = path.split('.')
+        for name in parents:
+            child = node.get(name, {})
+            if child is None:
+                # "sender" already asks for the whole field
+                break
+            node = node.setdefault(name, child)
+        else:
+            node[leaf] = None
+    return tree
+
+
+def prune_fields(serializer, include=None, exclude=None, path=''):
+    """Remove readable fields of `serializer` not selected by the include/exclude trees, in place."""
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    fields = serializer.fields
+    readable = {name for name, field in fields.items() if not field.write_only}
+    errors = {}
+    for param, tree in ((FIELDS_PARAM, include), (EXCLUDE_PARAM, exclude)):
+        unknown = set(tree or ()) - readable
+        if unknown:
+            errors[param] = [f"Unknown field '{path}{name}'." for name in sorted(unknown)]
+    if errors:
+        raise ValidationError(errors)
+
+    for name in list(fields):
+        field = fields[name]
+        if field.write_only:
+            continue
+        if include is not None and name not in include:
+            fields.pop(name)
+            continue
+        if exclude and name in exclude and exclude[name] is None:
+            fields.pop(name)
+            continue
+        sub_include = include.get(name) if include else None
+        sub_exclude = exclude.get(name) if exclude else None
+        if sub_include is not None or sub_exclude:
+            if not isinstance(field, serializers.BaseSerializer):
+                raise ValidationError({
+                    FIELDS_PARAM if sub_include is not None else EXCLUDE_PARAM: [
+                        f"Field '{path}{name}' has no sub-fields."
+                    ]
+                })
+            prune_fields(field, sub_include, sub_exclude, path=f'{path}{name}.')
+
+
+def narrow_queryset(queryset, serializer):
+    """
+    Restrict `queryset` to the columns and joins `serializer` reads. Returns
+    the queryset unchanged when a field's needs cannot be derived from the
+    model (method fields, `source='*'`, properties, reverse relations).
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    columns, relations = [], []
+    if not _collect_columns(serializer, queryset.model, '', columns, relations):
+        return queryset
+    return queryset.select_related(None).select_related(*relations).only(*columns)
+
+
+def _collect_columns(serializer, model, prefix, columns, relations):
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        source = field.source
+        if source == '*' or '.' in source or isinstance(field, serializers.SerializerMethodField):
+            return False
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            return False
+        if not model_field.concrete or model_field.many_to_many:
+            return False
+        columns.append(prefix + source)
+        if isinstance(field, serializers.BaseSerializer):
+            if not model_field.is_relation or isinstance(field, serializers.ListSerializer):
+                return False
+            relations.append(prefix + source)
+            if not _collect_columns(
+                field, model_field.related_model, f'{prefix}{source}__', columns, relations
+            ):
+                return False
+    return True
+
+
+class SparseFieldsetMixin:
+    """GenericAPIView mixin applying `?fields=` / `?exclude=` to the serializer and the query."""
+
+    def get_fieldset(self):
+        """(include, exclude) for this request; (None, None) for unsafe methods or no parameters."""
+        if not hasattr(self, '_fieldset'):
+            if self.request.method in ('GET', 'HEAD', 'OPTIONS'):
+                self._fieldset = parse_fieldset(self.request.query_params)
+            else:
+                self._fieldset = (None, None)
+        return self._fieldset
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        include, exclude = self.get_fieldset()
+        if include is not None or exclude:
+            prune_fields(serializer, include, exclude)
+        return serializer
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        include, exclude = self.get_fieldset()
+        if include is None and not exclude:
+            return queryset
+        return narrow_queryset(queryset, self.get_serializer())
@@ -110,13 +110,29 @@ SOCIALACCOUNT_PROVIDERS = {
     }
 }
 
+# Shared HTTP client for OAuth provider calls (see authentication.providers).
+# Set OAUTH_PROVIDER_STUB=1 to answer provider calls locally for load tests.
+OAUTH_HTTP_CLIENT = {
+    'TIMEOUT': (3.05, 10),
+    'RETRIES': 2,
+    'BACKOFF_FACTOR': 0.3,
+    'POOL_MAXSIZE': 20,
+    'STUB': os.getenv('OAUTH_PROVIDER_STUB') == '1',
+}
+
+# Seconds a signed OAuth `state` stays valid (see authentication.oauth_state).
+OAUTH_STATE_MAX_AGE = 600
+
 ACCOUNT_EMAIL_VERIFICATION = 'none'
 # SOCIALACCOUNT_ONLY = True
 #SOCIALACCOUNT_ADAPTER = 'authentication.adapters.SocialAccountAdapterV2'
+# Resolves SocialApps from the in-process provider registry (authentication.provider_config)
+SOCIALACCOUNT_ADAPTER = 'authentication.adapters.CachedSocialAccountAdapter'
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'mainapp.db_routing.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -194,11 +210,48 @@ DATABASES = {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
             'charset': 'utf8mb4',
             'use_unicode': True,
+            # Client side of LOAD DATA LOCAL INFILE for roster imports, off unless asked for
+            'local_infile': int(os.getenv('ROSTER_IMPORT_LOAD_DATA') == '1'),
         },
         'CONN_MAX_AGE': 60,    
     }
 }
 
+# Opt-in per-process connection pool (see mainapp.db_backends.mysql_pool)
+if os.getenv('DB_POOL') == '1':
+    DATABASES['default'].update({
+        'ENGINE': 'mainapp.db_backends.mysql_pool',
+        # Connections go back to the pool at the end of each request
+        'CONN_MAX_AGE': 0,
+    })
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 20)),
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        'max_lifetime': 3600,
+        'pre_ping': True,
+    }
+
+# Read replicas: one alias per host in DB_REPLICA_HOSTS, sharing the primary's
+# credentials. Safe reads are routed to them by mainapp.db_routing.
+DATABASE_REPLICAS = []
+for index, replica_host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), 1):
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{index}')
+
+DATABASE_ROUTERS = ['mainapp.db_routing.ReplicaRouter']
+
+# Read-your-writes window after a client writes, and replica health checking.
+REPLICA_ROUTING = {
+    'PIN_SECONDS': 5,
+    'HEALTH_CHECK_INTERVAL': 10,
+    'MAX_LAG_SECONDS': 30,
+}
+
 
 DATABASE_OPTIONS = {
     'connect_timeout': 10,
@@ -273,6 +326,8 @@ SIMPLE_JWT = {
     'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
 
     'JTI_CLAIM': 'jti',
+    # Adds the username claim StatelessJWTAuthentication serves without a lookup
+    'TOKEN_OBTAIN_SERIALIZER': 'authentication.jwt_auth.ClaimsTokenObtainPairSerializer',
 
     'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5),
@@ -284,13 +339,109 @@ REST_AUTH = {
     "JWT_AUTH_COOKIE": "_auth",  # Name of access token cookie
     "JWT_AUTH_REFRESH_COOKIE": "_refresh", # Name of refresh token cookie
     "JWT_AUTH_HTTPONLY": False,  # Makes sure refresh token is sent
+    "JWT_TOKEN_CLAIMS_SERIALIZER": "authentication.jwt_auth.ClaimsTokenObtainPairSerializer",
+}
+
+# Resolved friend requests older than this are moved to the archive table
+# by `manage.py archive_friend_requests`.
+FRIEND_REQUEST_ARCHIVE_DAYS = int(os.getenv('FRIEND_REQUEST_ARCHIVE_DAYS', 90))
+
+# Modules that register friendship outbox handlers (see core.outbox).
+OUTBOX_HANDLER_MODULES = []
+# Age an outbox event must reach before consumers read it.
+OUTBOX_SETTLE_SECONDS = 2
+# Seconds a skipped outbox id is re-checked before it is taken for a rolled-back insert.
+OUTBOX_GAP_TIMEOUT_SECONDS = 300
+
+# Channel layer fanning friend-request events out to WebSocket clients
+# (see core.realtime). The in-memory backend only reaches clients connected
+# to the same process.
+REALTIME_CHANNEL_LAYER = {
+    'BACKEND': 'core.realtime.InMemoryChannelLayer',
+    'OPTIONS': {'capacity': 100},
+}
+
+# Each delta-sync token reaches this far back so rows committed just after a
+# sync are not skipped by the next one.
+SYNC_OVERLAP_SECONDS = 5
+# Deletion tombstones are kept this long (`manage.py prune_tombstones`); a sync
+# token older than that gets a full resync instead of a delta.
+TOMBSTONE_RETENTION_DAYS = int(os.getenv('TOMBSTONE_RETENTION_DAYS', 30))
+
+# Seconds a User row stays in the per-process cache behind
+# authentication.jwt_auth.StatelessJWTAuthentication.
+JWT_USER_CACHE_TTL = 30
+
+# Background refresh of provider tokens (authentication.token_refresh): tokens
+# expiring within WINDOW seconds are renewed BATCH_SIZE provider calls at a time.
+OAUTH_TOKEN_REFRESH = {
+    'WINDOW': 600,
+    'BATCH_SIZE': 50,
+}
+
+# DRF auth tokens older than this many days are removed by sweep_expired_tokens
+# (unset keeps them forever, as DRF tokens do not expire by themselves).
+AUTH_TOKEN_MAX_AGE_DAYS = int(os.getenv('AUTH_TOKEN_MAX_AGE_DAYS', 0)) or None
+
+# Seconds between batched last_login writes from custom_login (0 writes through).
+LAST_LOGIN_FLUSH_INTERVAL = 5
+
+# Worker pool checking passwords for the async login view (authentication.hashing).
+# Logins beyond WORKERS + QUEUE_SIZE in flight get 503 with Retry-After.
+PASSWORD_HASHING_POOL = {
+    'WORKERS': os.cpu_count() or 1,
+    'QUEUE_SIZE': 64,
+    'RETRY_AFTER': 1,
+}
+
+# `client_type` values of custom_login that still get a DRF auth token.
+AUTH_TOKEN_CLIENT_TYPES = ('default',)
+
+# Per-process Bloom filter of blacklisted refresh-token JTIs, see authentication.blacklist
+JWT_BLACKLIST_FILTER = {
+    'CAPACITY': 100_000,
+    'ERROR_RATE': 0.001,
+    'SYNC_INTERVAL': 2,
+    'SYNC_OVERLAP': 100,
+    'REBUILD_INTERVAL': 3600,
+}
+
+# userdetail/: cursor page sizes and the row limit for bulk (JSON array / NDJSON) creates
+USERDETAIL_API = {
+    'PAGE_SIZE': 50,
+    'MAX_PAGE_SIZE': 500,
+    'BULK_MAX_ROWS': 5000,
+}
+
+# Roster imports (postauth.roster): rows per upsert transaction. LOAD_DATA writes
+# batches with MySQL LOAD DATA LOCAL INFILE; ROSTER_IMPORT_LOAD_DATA=1 also enables
+# local_infile on the connection, and the server must allow it too.
+ROSTER_IMPORT = {
+    'BATCH_SIZE': 2000,
+    'LOAD_DATA': os.getenv('ROSTER_IMPORT_LOAD_DATA') == '1',
+}
+
+# Bulk exports (mainapp.export, `manage.py export_data`, /api/export/<dataset>/):
+# rows per database round trip, which also bounds the memory an export uses.
+DATA_EXPORT = {
+    'BATCH_SIZE': 5000,
 }
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
         'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'rest_framework.authentication.TokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
+    # orjson-backed JSON (mainapp/fastjson.py); benchmark with `manage.py bench_fastjson`
+    'DEFAULT_RENDERER_CLASSES': (
+        'mainapp.fastjson.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'mainapp.fastjson.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
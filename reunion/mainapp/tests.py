@@ -0,0 +1,383 @@
+import datetime
+import decimal
+import importlib.util
+import io
+import threading
+import unittest
+import uuid
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.translation import gettext_lazy
+from rest_framework import serializers
+from rest_framework.exceptions import ErrorDetail, ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from core.models import FriendRequest
+from core.serializers import FriendRequestSerializer, UserDetailSearchSerializer
+from postauth.tests import profile
+
+from . import db_routing
+from .db_backends.mysql_pool.pool import ConnectionPool, PoolTimeout
+from .fastjson import ORJSONParser, ORJSONRenderer, dumps
+from .fieldsets import _parse_tree, narrow_queryset, parse_fieldset, prune_fields
+
+User = get_user_model()
+
+REPLICA = 'replica'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Routes through the real router and middleware to a second alias on the test database."""
+
+    # Resolved in setUpClass, once the replica alias has been registered
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        # Registered after the test database exists, so the alias opens the same one
+        connections.settings[REPLICA] = {**connections['default'].settings_dict}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        db_routing.replica_health._status.clear()
+
+    def replica_queries(self, method, url, **extra):
+        with CaptureQueriesContext(connections[REPLICA]) as queries:
+            response = getattr(self.client, method)(url, **extra)
+        return response, len(queries)
+
+    def test_safe_request_reads_from_the_replica(self):
+        response, queries = self.replica_queries('get', '/api/reunited/my_friends/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(queries, 0)
+        self.assertNotIn(db_routing.PIN_COOKIE, response.cookies)
+
+    def test_write_pins_the_client_to_the_primary(self):
+        bob = User.objects.create_user('bob', password='x')
+        response, queries = self.replica_queries('post', '/api/reunite/', data={'receiver_id': bob.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(queries, 0)
+        self.assertIn(db_routing.PIN_COOKIE, response.cookies)
+
+        self.client.cookies[db_routing.PIN_COOKIE] = response.cookies[db_routing.PIN_COOKIE].value
+        _, queries = self.replica_queries('get', '/api/reunited/my_friends/')
+        self.assertEqual(queries, 0)
+
+    def test_unhealthy_replica_is_skipped(self):
+        with mock.patch.object(db_routing.ReplicaHealth, 'probe', return_value=False):
+            response, queries = self.replica_queries('get', '/api/reunited/my_friends/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, 0)
+
+
+class ReplicaProbeTests(SimpleTestCase):
+    def probe(self, status_statements, lag):
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value = cursor
+        cursor.description = [('Slave_IO_Running',), ('Seconds_Behind_Master',)]
+        cursor.fetchone.return_value = ('Yes', lag)
+
+        def execute(sql):
+            if sql.startswith('SHOW') and sql not in status_statements:
+                raise DatabaseError(f"You have an error in your SQL syntax near '{sql}'")
+
+        cursor.execute.side_effect = execute
+        connection = mock.Mock(vendor='mysql', **{'cursor.return_value': cursor})
+        with mock.patch.object(db_routing, 'connections', {REPLICA: connection}):
+            return db_routing.ReplicaHealth.probe(REPLICA, max_lag=30)
+
+    def test_old_servers_fall_back_to_show_slave_status(self):
+        self.assertTrue(self.probe({'SHOW SLAVE STATUS'}, lag=1))
+        with self.assertLogs('mainapp.db_routing', 'WARNING'):
+            self.assertFalse(self.probe({'SHOW SLAVE STATUS'}, lag=120))
+
+    def test_mariadb_column_name_under_show_replica_status(self):
+        self.assertTrue(self.probe({'SHOW REPLICA STATUS'}, lag=1))
+        with self.assertLogs('mainapp.db_routing', 'WARNING'):
+            self.assertFalse(self.probe({'SHOW REPLICA STATUS'}, lag=None))
+
+
+SAMPLE_VALUES = {
+    'aware_datetime': datetime.datetime(2024, 5, 17, 9, 30, 12, 345678, tzinfo=datetime.timezone.utc),
+    'offset_datetime': datetime.datetime(2024, 5, 17, 9, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=5, minutes=30))),
+    'naive_datetime': datetime.datetime(2024, 5, 17, 9, 30, 12),
+    'date': datetime.date(2024, 5, 17),
+    'time': datetime.time(23, 59, 1, 500),
+    'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    'decimal': decimal.Decimal('12.50'),
+    'lazy_string': gettext_lazy('This field is required.'),
+    'error_detail': ErrorDetail('Invalid credentials', code='authentication_failed'),
+    'unicode': 'Zoë 日本 🎓',
+    'line_separators': 'a\u2028b\u2029c',
+    'escapes': 'quote " backslash \\ tab \t newline \n',
+    'numbers': [0, -1, 2 ** 53, 1.5, 0.1, True, False, None],
+    'nested': {'empty_list': [], 'empty_dict': {}, 'tuple': (1, 'two'), 'set_like': frozenset()},
+    'int_keys': {1: 'one', 2: 'two'},
+}
+
+
+class FastJSONTests(TestCase):
+    def assertMatchesDRF(self, data):
+        for indent in (None, 4):
+            context = {'indent': indent}
+            expected = JSONRenderer().render(data, renderer_context=context)
+            actual = ORJSONRenderer().render(data, renderer_context=context)
+            self.assertEqual(ORJSONParser().parse(io.BytesIO(actual)), JSONParser().parse(io.BytesIO(expected)))
+            if indent is None:
+                self.assertEqual(actual, expected)
+
+    def test_sample_values(self):
+        for name, value in SAMPLE_VALUES.items():
+            with self.subTest(name):
+                self.assertMatchesDRF({name: value})
+
+    def test_float_exponents_decode_to_the_same_value(self):
+        # orjson writes 1e-7 where DRF writes 1e-07
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(dumps([1e-7]))), [1e-7])
+
+    def test_wide_integers_fall_back_to_drf(self):
+        self.assertMatchesDRF({'big_int': 2 ** 70, 'negative': -(2 ** 64)})
+
+    def test_serialized_rows(self):
+        alice = get_user_model().objects.create_user('alice', password='x')
+        bob = get_user_model().objects.create_user('bob', password='x')
+        FriendRequest.objects.create(sender=alice, receiver=bob)
+        profile('ann', edu_details={'school': 'Zoë High', 'years': [2010, 2014]})
+        self.assertMatchesDRF(FriendRequestSerializer(FriendRequest.objects.all(), many=True).data)
+        self.assertMatchesDRF(UserDetailSearchSerializer(profile('ben'), context={}).data)
+
+    def test_non_finite_floats_follow_strict_json(self):
+        self.assertTrue(api_settings.STRICT_JSON)
+        for value in (float('nan'), float('inf'), decimal.Decimal('NaN')):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    dumps({'nested': [1, value]})
+                with mock.patch.object(JSONRenderer, 'strict', False):
+                    self.assertEqual(dumps({'nested': [1, value]}), JSONRenderer().render({'nested': [1, value]}))
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.alive = True
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, connect=None, reset=None, **options):
+        self.opened = []
+
+        def open_connection():
+            raw = FakeConnection(len(self.opened))
+            self.opened.append(raw)
+            return raw
+
+        def ping(raw):
+            if not raw.alive:
+                raise DatabaseError('MySQL server has gone away')
+
+        return ConnectionPool(
+            'test', connect=connect or open_connection, ping=ping, reset=reset or mock.Mock(),
+            options={'log_interval': 0, **options},
+        )
+
+    def test_checked_in_connection_is_reused(self):
+        pool = self.make_pool()
+        raw, reused = pool.checkout()
+        self.assertFalse(reused)
+        pool.checkin(raw)
+        self.assertEqual(pool.checkout(), (raw, True))
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(pool.stats()['checkouts'], 2)
+
+    def test_min_size_is_opened_on_first_use(self):
+        pool = self.make_pool(min_size=3)
+        pool.checkout()
+        self.assertEqual(len(self.opened), 3)
+        self.assertEqual(pool.stats()['idle'], 2)
+
+    def test_checkout_times_out_at_max_size(self):
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        pool.checkout()
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_checkout_waits_for_a_checkin(self):
+        pool = self.make_pool(max_size=1, timeout=5)
+        raw, _ = pool.checkout()
+        timer = threading.Timer(0.05, pool.checkin, [raw])
+        timer.start()
+        self.assertEqual(pool.checkout(), (raw, True))
+        timer.join()
+        self.assertEqual(pool.stats()['waits'], 1)
+
+    def test_failed_ping_replaces_the_connection(self):
+        pool = self.make_pool()
+        raw, _ = pool.checkout()
+        pool.checkin(raw)
+        raw.alive = False
+        replacement, reused = pool.checkout()
+        self.assertIsNot(replacement, raw)
+        self.assertFalse(reused)
+        self.assertTrue(raw.closed)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_connection_is_replaced_after_max_lifetime(self):
+        pool = self.make_pool(max_lifetime=60, pre_ping=False)
+        raw, _ = pool.checkout()
+        pool.checkin(raw)
+        pool._idle[0].created_at -= 120
+        self.assertIsNot(pool.checkout()[0], raw)
+        self.assertTrue(raw.closed)
+
+    def test_failed_open_releases_its_slot(self):
+        connect = mock.Mock(side_effect=[DatabaseError('Access denied'), FakeConnection(1)])
+        pool = self.make_pool(connect=connect, max_size=1, timeout=0.05)
+        with self.assertRaises(DatabaseError):
+            pool.checkout()
+        self.assertEqual(pool.stats()['size'], 0)
+        self.assertEqual(pool.checkout()[0].number, 1)
+
+    def test_broken_or_unresettable_connections_are_closed(self):
+        reset = mock.Mock(side_effect=[None, DatabaseError('Lost connection')])
+        pool = self.make_pool(reset=reset)
+        first, _ = pool.checkout()
+        second, _ = pool.checkout()
+        pool.checkin(first, broken=True)
+        pool.checkin(second)
+        self.assertTrue(first.closed)
+        self.assertFalse(second.closed)
+        third, _ = pool.checkout()
+        pool.checkin(third)
+        self.assertTrue(third.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+
+@unittest.skipUnless(importlib.util.find_spec('MySQLdb'), "mysqlclient is not installed")
+class PooledSessionStateTests(SimpleTestCase):
+    def test_statements_that_leave_session_state(self):
+        from .db_backends.mysql_pool.base import changes_session
+
+        for sql in (
+            'CREATE TEMPORARY TABLE `postauth_userdetail_import` LIKE `postauth_userdetail`',
+            'SET SESSION sql_mode = ""',
+            'SET @rank = 0',
+            "SELECT GET_LOCK('roster', 10)",
+            'LOCK TABLES core_friendrequest WRITE',
+        ):
+            with self.subTest(sql):
+                self.assertTrue(changes_session(sql))
+        for sql in ('SELECT 1', 'SET TRANSACTION ISOLATION LEVEL READ COMMITTED', 'UPDATE t SET a = 1'):
+            with self.subTest(sql):
+                self.assertFalse(changes_session(sql))
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x', first_name='Alice')
+        self.bob = User.objects.create_user('bob', password='x')
+        FriendRequest.objects.create(sender=self.alice, receiver=self.bob)
+
+    def pruned(self, fields=None, exclude=None):
+        serializer = FriendRequestSerializer()
+        include, exclude = parse_fieldset({'fields': fields, 'exclude': exclude})
+        prune_fields(serializer, include, exclude)
+        return serializer
+
+    def test_parse_tree(self):
+        self.assertEqual(
+            _parse_tree('id, sender.username,sender.id,,receiver'),
+            {'id': None, 'sender': {'username': None, 'id': None}, 'receiver': None},
+        )
+        # Naming the whole field wins over its sub-fields, in either order
+        self.assertEqual(_parse_tree('sender,sender.username'), {'sender': None})
+        self.assertEqual(_parse_tree('sender.username,sender'), {'sender': None})
+
+    def test_dotted_include_and_exclude(self):
+        request = FriendRequest.objects.get()
+        serializer = self.pruned(fields='id,sender.username,receiver')
+        self.assertEqual(list(serializer.to_representation(request)), ['id', 'sender', 'receiver'])
+        self.assertEqual(serializer.to_representation(request)['sender'], {'username': 'alice'})
+        self.assertEqual(len(serializer.to_representation(request)['receiver']), 4)
+
+        serializer = self.pruned(exclude='sender.first_name,sender.last_name,updated_at')
+        data = serializer.to_representation(request)
+        self.assertNotIn('updated_at', data)
+        self.assertEqual(data['sender'], {'id': self.alice.id, 'username': 'alice'})
+
+    def test_unknown_and_sub_field_less_names_are_rejected(self):
+        for fields, exclude, message in (
+            ('id,nope', None, "Unknown field 'nope'."),
+            ('sender.nope', None, "Unknown field 'sender.nope'."),
+            (None, 'receiver.email', "Unknown field 'receiver.email'."),
+            ('status.value', None, "Field 'status' has no sub-fields."),
+            (None, 'id.value', "Field 'id' has no sub-fields."),
+        ):
+            with self.subTest(fields=fields, exclude=exclude):
+                with self.assertRaises(ValidationError) as caught:
+                    self.pruned(fields, exclude)
+                param = 'fields' if fields else 'exclude'
+                self.assertEqual(caught.exception.detail[param], [message])
+
+    def test_queryset_is_narrowed_to_the_selected_columns(self):
+        queryset = FriendRequest.objects.select_related('sender', 'receiver')
+        narrowed = narrow_queryset(queryset, self.pruned(fields='id,sender.username'))
+        with CaptureQueriesContext(connections['default']) as queries:
+            self.assertEqual(list(narrowed)[0].sender.username, 'alice')
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]['sql']
+        quote = connections['default'].ops.quote_name
+        columns = [('core_friendrequest', 'id'), ('core_friendrequest', 'sender_id'), ('auth_user', 'id'), ('auth_user', 'username')]
+        self.assertEqual(
+            sql.split(' FROM ')[0],
+            'SELECT ' + ', '.join(f'{quote(table)}.{quote(column)}' for table, column in columns),
+        )
+        self.assertEqual(sql.count('JOIN'), 1)
+
+    def test_fields_read_outside_the_model_keep_the_queryset(self):
+        class WithMethodField(FriendRequestSerializer):
+            summary = serializers.SerializerMethodField()
+
+            class Meta(FriendRequestSerializer.Meta):
+                fields = ['id', 'summary']
+
+        queryset = FriendRequest.objects.all()
+        self.assertIs(narrow_queryset(queryset, WithMethodField()), queryset)
+
+    def test_view_applies_fieldsets_to_safe_methods_only(self):
+        profile('ann')
+        client = APIClient()
+        response = client.get('/api/userdetail/?fields=username,firstname')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [{'username': 'ann', 'firstname': 'F'}])
+        self.assertEqual(client.get('/api/userdetail/?fields=nope').status_code, 400)
+
+        row = {
+            'username': 'ben', 'firstname': 'F', 'lastname': 'L', 'penname': 'P',
+            'instagram': 'i', 'snapchat': 's', 'phone': '1', 'edu_details': {},
+        }
+        response = client.post('/api/userdetail/?fields=nope&exclude=firstname', row, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['firstname'], 'F')
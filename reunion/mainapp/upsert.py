@@ -0,0 +1,17 @@
+"""
+bulk_create() upserts that run on every backend.
+
+PostgreSQL and SQLite need the conflict target (`unique_fields`). MySQL's
+INSERT ... ON DUPLICATE KEY UPDATE has none, so Django raises
+NotSupportedError when one is passed there.
+"""
+from django.db import connections, router
+
+
+def upsert_kwargs(model, unique_fields, update_fields, using=None):
+    """bulk_create() keyword arguments updating `update_fields` when a row conflicts on `unique_fields`."""
+    connection = connections[using or router.db_for_write(model)]
+    kwargs = {'update_conflicts': True, 'update_fields': list(update_fields)}
+    if connection.features.supports_update_conflicts_with_target:
+        kwargs['unique_fields'] = list(unique_fields)
+    return kwargs
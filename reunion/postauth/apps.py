@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PostauthConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'postauth'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (links profiles to accounts created after them)
@@ -0,0 +1,80 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from postauth.roster import (
+    CSV,
+    NDJSON,
+    RosterImporter,
+    RosterImportError,
+    detect_format,
+    import_options,
+    parse_mapping,
+)
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV or NDJSON roster into UserDetail, upserting by username in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Roster file, or - for stdin")
+        parser.add_argument('--format', choices=[CSV, NDJSON], help="Defaults to the file extension")
+        parser.add_argument(
+            '--map', action='append', default=[], metavar='SOURCE=TARGET',
+            help="Map a column to a field or edu_details path, e.g. 'Batch=edu_details.school'; repeatable",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=import_options()['BATCH_SIZE'],
+            help="Rows per upsert transaction",
+        )
+        parser.add_argument(
+            '--load-data', action='store_true', default=None,
+            help="Write batches with MySQL LOAD DATA LOCAL INFILE (overrides ROSTER_IMPORT['LOAD_DATA'])",
+        )
+        parser.add_argument('--errors-file', help="Write every rejected row as NDJSON to this file")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        errors_file = open(options['errors_file'], 'w', encoding='utf-8') if options['errors_file'] else None
+
+        def on_error(line, detail):
+            if errors_file:
+                errors_file.write(json.dumps({'line': line, 'errors': detail}) + '\n')
+
+        def on_batch(result):
+            self.stdout.write(
+                f"{result.rows} rows read, {result.written} written, {result.failed} rejected "
+                f"({result.rows_per_second:.0f} rows/s)"
+            )
+
+        try:
+            fmt = detect_format(name=path, requested=options['format'])
+            importer = RosterImporter(
+                mapping=parse_mapping(options['map']),
+                batch_size=options['batch_size'],
+                use_load_data=options['load_data'],
+                on_error=on_error,
+                on_batch=on_batch,
+            )
+            if path == '-':
+                result = importer.run(sys.stdin.buffer, fmt)
+            else:
+                with open(path, 'rb') as stream:
+                    result = importer.run(stream, fmt)
+        except (RosterImportError, OSError) as e:
+            raise CommandError(str(e))
+        finally:
+            if errors_file:
+                errors_file.close()
+
+        for error in result.errors[:20]:
+            self.stderr.write(f"line {error['line']}: {json.dumps(error['errors'])}")
+        if result.failed > 20:
+            self.stderr.write(f"... and {result.failed - 20} more rejected rows")
+
+        summary = (
+            f"Imported {result.written} of {result.rows} rows in {result.seconds:.1f}s "
+            f"({result.rows_per_second:.0f} rows/s), {result.failed} rejected"
+        )
+        self.stdout.write(self.style.SUCCESS(summary) if not result.failed else self.style.WARNING(summary))
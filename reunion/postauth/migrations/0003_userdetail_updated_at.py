@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('postauth', '0002_remove_userdetail_id_userdetail_visibility_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userdetail',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.db.models import OuterRef, Subquery
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def link_users(apps, schema_editor):
+    """Point every profile at the account with the same username, one committed batch at a time."""
+    UserDetail = apps.get_model('postauth', 'UserDetail')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    db = schema_editor.connection.alias
+    profiles = UserDetail.objects.using(db).order_by('pk')
+    account = User.objects.filter(username=OuterRef('username')).values('id')[:1]
+
+    last = None
+    while True:
+        page = profiles if last is None else profiles.filter(pk__gt=last)
+        usernames = list(page.values_list('pk', flat=True)[:BACKFILL_BATCH_SIZE])
+        if not usernames:
+            break
+        with transaction.atomic(using=db):
+            UserDetail.objects.using(db).filter(pk__in=usernames).update(user_id=Subquery(account))
+        last = usernames[-1]
+
+
+class Migration(migrations.Migration):
+    # The backfill commits per batch instead of locking the whole table in one transaction
+    atomic = False
+
+    dependencies = [
+        ('postauth', '0003_userdetail_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userdetail',
+            name='user',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='detail', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(link_users, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,36 @@
-from django.db import models
+from django.contrib.auth import get_user_model
+from django.db import connections, models, router
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+User = get_user_model()
+
+# ChangeCounter of deleted profiles, see postauth.signals
+USERDETAIL_DELETIONS = 'userdetail.deleted'
+
+
+class UserDetailManager(models.Manager):
+    def user_ids(self, usernames):
+        """
+        {username: user id} for those of `usernames` whose account has no
+        profile yet; an account keeps the profile it is linked to when renamed.
+        """
+        return dict(
+            User.objects.filter(username__in=list(usernames), detail__isnull=True).values_list('username', 'id')
+        )
+
+    def link_users(self, user_ids):
+        """Attach unlinked profiles to the accounts in {username: user id}."""
+        if not user_ids:
+            return 0
+        return self.filter(username__in=list(user_ids), user__isnull=True).update(
+            user_id=Case(*(When(username=username, then=Value(user_id)) for username, user_id in user_ids.items()))
+        )
+
+    def link_user(self, user):
+        """Attach an unlinked profile with the same username to `user`."""
+        return self.filter(username=user.username, user__isnull=True).update(user=user)
+
 
 class UserDetail(models.Model):
     VISIBILITY_CHOICES = [
@@ -6,6 +38,15 @@ class UserDetail(models.Model):
         ('private', 'Private'),
     ]
     username = models.CharField(primary_key=True,max_length=100,unique=True)
+    # Set from the account with the same username; profiles imported before
+    # the person signs up stay unlinked until then.
+    user = models.OneToOneField(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='detail'
+    )
     firstname = models.CharField(max_length=100)
     lastname = models.CharField(max_length=100)
     penname = models.CharField(max_length=100)
@@ -13,4 +54,57 @@ class UserDetail(models.Model):
     snapchat = models.CharField(max_length=100)
     visibility = models.CharField(max_length=10, choices=VISIBILITY_CHOICES, default='public')
     phone = models.CharField(max_length=100)
-    edu_details = models.JSONField()
\ No newline at end of file
+    edu_details = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = UserDetailManager()
+
+
+class UserStampManager(models.Manager):
+    def touch(self, user_ids):
+        """Mark the given users' embedded fields as changed now."""
+        user_ids = set(user_ids) - {None}
+        if not user_ids:
+            return
+        now = timezone.now()
+        kwargs = {}
+        if connections[router.db_for_write(UserStamp)].features.supports_update_conflicts_with_target:
+            kwargs['unique_fields'] = ['user']
+        self.bulk_create(
+            [UserStamp(user_id=user_id, updated_at=now) for user_id in user_ids],
+            update_conflicts=True,
+            update_fields=['updated_at'],
+            **kwargs,
+        )
+
+
+class UserStamp(models.Model):
+    """
+    When a user's fields that other responses embed (username and names,
+    and their linked profile) last changed. Conditional GETs of friend and
+    request lists fold these in so that renaming a user or editing their
+    profile invalidates the lists showing them.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stamp')
+    updated_at = models.DateTimeField()
+
+    objects = UserStampManager()
+
+
+class ChangeCounterManager(models.Manager):
+    def bump(self, name):
+        if not self.filter(name=name).update(value=F('value') + 1):
+            _, created = self.get_or_create(name=name, defaults={'value': 1})
+            if not created:
+                self.filter(name=name).update(value=F('value') + 1)
+
+    def value(self, name):
+        return self.filter(name=name).values_list('value', flat=True).first() or 0
+
+
+class ChangeCounter(models.Model):
+    """A named counter of changes a timestamp cannot show, such as deletions."""
+    name = models.CharField(primary_key=True, max_length=50)
+    value = models.BigIntegerField(default=0)
+
+    objects = ChangeCounterManager()
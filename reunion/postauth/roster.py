@@ -0,0 +1,404 @@
+"""
+Streaming roster import for UserDetail.
+
+Schools send CSV spreadsheets (or NDJSON exports) with thousands of alumni.
+RosterImporter reads them a line at a time from any binary stream (a file,
+stdin, an upload or the request body), so memory use does not grow with the
+file. Each record is validated with UserDetailImportSerializer; invalid
+records are reported with their line number and skipped. Valid records are
+upserted by username in batches of BATCH_SIZE, each batch in its own
+transaction, so a failing batch does not undo the ones before it. Each
+profile is linked to the account with the same username, if there is one.
+
+CSV headers are matched case-insensitively against UserDetail fields, with
+a few aliases (`first_name` for `firstname`, ...). `edu_details` may be a
+JSON column, or be assembled from dotted columns such as
+`edu_details.undergraduate.university`. Extra mappings can be passed as
+`source=target`, where the target may itself be a dotted edu_details path.
+Empty cells are treated as missing values.
+
+An existing profile is only updated in the fields its record supplies (plus
+updated_at): a roster without a visibility column, or with an empty cell,
+leaves each profile's visibility as it was, and the model default only
+applies to new profiles. The account link is only filled in where it is
+empty, so re-importing never unlinks a profile whose account was renamed.
+
+On MySQL, batches can instead be loaded with `LOAD DATA LOCAL INFILE` into a
+temporary copy of the table and merged from there with INSERT ... SELECT ...
+ON DUPLICATE KEY UPDATE of the same fields, when ROSTER_IMPORT['LOAD_DATA']
+is set; that needs `local_infile` enabled on the server and
+`OPTIONS['local_infile'] = 1` on the connection. If the server refuses, the
+import logs a warning and carries on with bulk upserts.
+"""
+import csv
+import json
+import logging
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections, router, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from mainapp.upsert import upsert_kwargs
+
+from .models import UserDetail, UserStamp
+from .serializers import UserDetailImportSerializer
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_SIZE': 2000,
+    'LOAD_DATA': False,
+    'MAX_REPORTED_ERRORS': 1000,
+}
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+
+FORMAT_EXTENSIONS = {'.csv': CSV, '.ndjson': NDJSON, '.jsonl': NDJSON}
+FORMAT_CONTENT_TYPES = {
+    'text/csv': CSV,
+    'application/csv': CSV,
+    'application/x-ndjson': NDJSON,
+    'application/jsonl': NDJSON,
+    'application/x-jsonlines': NDJSON,
+}
+
+HEADER_ALIASES = {
+    'first_name': 'firstname',
+    'last_name': 'lastname',
+    'pen_name': 'penname',
+    'edu': 'edu_details',
+}
+
+
+def import_options():
+    return {**DEFAULTS, **getattr(settings, 'ROSTER_IMPORT', {})}
+
+
+class RosterImportError(Exception):
+    """The file cannot be imported at all (unknown format, missing header)."""
+
+
+def detect_format(name=None, content_type=None, requested=None):
+    """Return CSV or NDJSON: `requested` if given, else from the content type or file name."""
+    if requested:
+        if requested not in (CSV, NDJSON):
+            raise RosterImportError(f"Unknown format {requested!r}; use {CSV} or {NDJSON}.")
+        return requested
+    if content_type:
+        fmt = FORMAT_CONTENT_TYPES.get(content_type.split(';')[0].strip().lower())
+        if fmt:
+            return fmt
+    if name:
+        fmt = FORMAT_EXTENSIONS.get(os.path.splitext(name)[1].lower())
+        if fmt:
+            return fmt
+    raise RosterImportError("Cannot tell the file format; use CSV (.csv) or NDJSON (.ndjson, .jsonl).")
+
+
+def parse_mapping(pairs):
+    """Turn ["School Email=username", ...] into {"school_email": "username", ...}."""
+    mapping = {}
+    for pair in pairs:
+        source, sep, target = pair.partition('=')
+        if not sep or not source.strip() or not target.strip():
+            raise RosterImportError(f"Column mappings look like source=target, got {pair!r}.")
+        mapping[_normalize_header(source)] = target.strip()
+    return mapping
+
+
+def _normalize_header(header):
+    return '_'.join(header.strip().lower().split())
+
+
+def _lines(stream):
+    """Decoded lines of a binary stream, read one at a time."""
+    for number, line in enumerate(iter(stream.readline, b''), 1):
+        if number == 1 and line.startswith(b'\xef\xbb\xbf'):
+            line = line[3:]
+        try:
+            text = line.decode('utf-8')
+        except UnicodeDecodeError:
+            raise RosterImportError(f"Line {number} is not valid UTF-8; export the file as UTF-8.")
+        yield text
+
+
+class RosterImportResult:
+    def __init__(self, max_errors):
+        self.rows = 0
+        self.written = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+        self.started = time.monotonic()
+        self.finished = None
+
+    def add_error(self, line, detail):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'errors': detail})
+
+    @property
+    def seconds(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'written': self.written,
+            'failed': self.failed,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+class RosterImporter:
+    """Validates and upserts roster records streamed from CSV or NDJSON."""
+
+    def __init__(self, mapping=None, batch_size=None, use_load_data=None, on_error=None, on_batch=None):
+        options = import_options()
+        self.mapping = mapping or {}
+        self.batch_size = batch_size or options['BATCH_SIZE']
+        self.use_load_data = options['LOAD_DATA'] if use_load_data is None else use_load_data
+        self.max_errors = options['MAX_REPORTED_ERRORS']
+        self.on_error = on_error
+        self.on_batch = on_batch
+        self.db = router.db_for_write(UserDetail)
+
+    def run(self, stream, fmt):
+        """Import every record of `stream` in format `fmt`; returns a RosterImportResult."""
+        result = RosterImportResult(self.max_errors)
+        records = self.read_csv(stream) if fmt == CSV else self.read_ndjson(stream)
+        serializer = UserDetailImportSerializer()
+        batch = {}
+
+        for line, record, error in records:
+            result.rows += 1
+            if error is None:
+                try:
+                    attrs = serializer.run_validation(record)
+                except ValidationError as exc:
+                    error = exc.detail
+            if error is not None:
+                self.report_error(result, line, error)
+                continue
+            # A username repeated in the file: the later row wins
+            batch.pop(attrs['username'], None)
+            batch[attrs['username']] = (line, attrs)
+            if len(batch) >= self.batch_size:
+                self.write(batch, result)
+                batch = {}
+
+        if batch:
+            self.write(batch, result)
+        result.finished = time.monotonic()
+        return result
+
+    def report_error(self, result, line, detail):
+        result.add_error(line, detail)
+        if self.on_error:
+            self.on_error(line, detail)
+
+    # Reading
+
+    def read_csv(self, stream):
+        """Yield (line number, record, error) for each CSV row."""
+        reader = csv.reader(_lines(stream))
+        try:
+            header = next(reader)
+        except StopIteration:
+            return
+        paths = self.column_paths(header)
+        for values in reader:
+            if not any(value.strip() for value in values):
+                continue
+            if len(values) > len(paths):
+                yield reader.line_num, None, {
+                    'non_field_errors': [f"Row has {len(values)} columns, the header has {len(paths)}."]
+                }
+                continue
+            try:
+                record, error = self.build_record(paths, values), None
+            except ValueError as exc:
+                record, error = None, {'edu_details': [str(exc)]}
+            yield reader.line_num, record, error
+
+    def read_ndjson(self, stream):
+        """Yield (line number, record, error) for each NDJSON line."""
+        for number, line in enumerate(_lines(stream), 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                yield number, None, {'non_field_errors': [f"Invalid JSON: {exc}"]}
+                continue
+            if not isinstance(record, dict):
+                yield number, None, {'non_field_errors': ["Each line must be a JSON object."]}
+                continue
+            yield number, {self.record_key(key): value for key, value in record.items()}, None
+
+    def record_key(self, key):
+        name = _normalize_header(key)
+        return self.mapping.get(name) or HEADER_ALIASES.get(name, key)
+
+    def column_paths(self, header):
+        """Map each CSV column to a tuple path into the record, or None to ignore it."""
+        fields = {field.name for field in UserDetail._meta.concrete_fields}
+        paths = []
+        for column in header:
+            name = _normalize_header(column)
+            target = self.mapping.get(name) or HEADER_ALIASES.get(name, name)
+            path = tuple(target.split('.'))
+            if path[0] in HEADER_ALIASES:
+                path = (HEADER_ALIASES[path[0]],) + path[1:]
+            if path[0] not in fields or (len(path) > 1 and path[0] != 'edu_details'):
+                logger.debug(f"Ignoring roster column {column!r}")
+                path = None
+            paths.append(path)
+        if ('username',) not in paths:
+            raise RosterImportError("The CSV header has no username column.")
+        return paths
+
+    @staticmethod
+    def build_record(paths, values):
+        record = {}
+        for path, value in zip(paths, values):
+            value = value.strip()
+            if path is None or value == '':
+                continue
+            if path == ('edu_details',):
+                value = json.loads(value)
+                if isinstance(value, dict) and isinstance(record.get('edu_details'), dict):
+                    record['edu_details'].update(value)
+                    continue
+            elif len(path) > 1:
+                node = record.setdefault('edu_details', {})
+                if not isinstance(node, dict):
+                    raise ValueError("edu_details is both a JSON value and split into columns.")
+                for key in path[1:-1]:
+                    node = node.setdefault(key, {})
+                node[path[-1]] = value
+                continue
+            record[path[0]] = value
+        return record
+
+    # Writing
+
+    def write(self, batch, result):
+        user_ids = UserDetail.objects.user_ids(batch)
+        rows = [{**attrs, 'user_id': user_ids.get(username)} for username, (_, attrs) in batch.items()]
+        try:
+            if self.use_load_data and connections[self.db].vendor == 'mysql':
+                try:
+                    with transaction.atomic(using=self.db):
+                        self.load_data(rows)
+                except DatabaseError as exc:
+                    logger.warning(f"LOAD DATA is not available ({exc}), falling back to bulk upserts")
+                    self.use_load_data = False
+                    with transaction.atomic(using=self.db):
+                        self.bulk_upsert(rows)
+            else:
+                with transaction.atomic(using=self.db):
+                    self.bulk_upsert(rows)
+        except DatabaseError as exc:
+            logger.exception("Writing a roster batch failed")
+            for line, _ in batch.values():
+                self.report_error(result, line, {'non_field_errors': [f"Batch could not be saved: {exc}"]})
+        else:
+            result.written += len(rows)
+            # Upserts skip the post_save receiver that invalidates friend lists
+            UserStamp.objects.touch(
+                UserDetail.objects.using(self.db).filter(username__in=list(batch)).values_list('user_id', flat=True)
+            )
+        if self.on_batch:
+            self.on_batch(result)
+
+    def bulk_upsert(self, rows):
+        for update_fields, group in _by_update_fields(rows):
+            UserDetail.objects.using(self.db).bulk_create(
+                [UserDetail(**attrs) for attrs in group],
+                batch_size=self.batch_size,
+                **upsert_kwargs(UserDetail, ['username'], update_fields, using=self.db),
+            )
+        # Existing profiles keep their link; unlinked ones are linked here
+        UserDetail.objects.db_manager(self.db).link_users(
+            {attrs['username']: attrs['user_id'] for attrs in rows if attrs['user_id'] is not None}
+        )
+
+    def load_data(self, rows):
+        """Write `rows` through MySQL LOAD DATA LOCAL INFILE into a temporary table, then merge them."""
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        table = quote(UserDetail._meta.db_table)
+        staging = quote(f'{UserDetail._meta.db_table}_import')
+        fields = UserDetail._meta.concrete_fields
+        user = quote(UserDetail._meta.get_field('user').column)
+        columns = ', '.join(quote(field.column) for field in fields)
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TEMPORARY TABLE {staging} LIKE {table}")
+            try:
+                for update_fields, group in _by_update_fields(rows):
+                    with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.tsv') as handle:
+                        for attrs in group:
+                            obj = UserDetail(**attrs)
+                            obj.updated_at = now
+                            handle.write('\t'.join(
+                                _tsv_value(field.get_db_prep_save(getattr(obj, field.attname), connection))
+                                for field in fields
+                            ))
+                            handle.write('\n')
+                        handle.flush()
+                        cursor.execute(f"DELETE FROM {staging}")
+                        cursor.execute(
+                            f"LOAD DATA LOCAL INFILE %s INTO TABLE {staging} "
+                            "CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' "
+                            f"LINES TERMINATED BY '\\n' ({columns})",
+                            [handle.name],
+                        )
+                    updates = ', '.join(
+                        [f"{quote(column)} = src.{quote(column)}"
+                         for column in (UserDetail._meta.get_field(name).column for name in update_fields)]
+                        + [f"{user} = COALESCE({table}.{user}, src.{user})"]
+                    )
+                    cursor.execute(
+                        f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} AS src "
+                        f"ON DUPLICATE KEY UPDATE {updates}"
+                    )
+            finally:
+                cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging}")
+
+
+def _by_update_fields(rows):
+    """
+    Group rows by the fields an upsert may overwrite: those the record
+    supplied, plus updated_at, never the primary key or the account link.
+    """
+    groups = {}
+    for attrs in rows:
+        names = {UserDetail._meta.get_field(key).name for key in attrs} | {'updated_at'}
+        groups.setdefault(tuple(sorted(names - {'username', 'user'})), []).append(attrs)
+    return groups.items()
+
+
+def _tsv_value(value):
+    """Escape a database value for LOAD DATA's default FIELDS ESCAPED BY '\\'."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        value = int(value)
+    return (
+        str(value).replace('\\', '\\\\').replace('\t', '\\t')
+        .replace('\n', '\\n').replace('\r', '\\r').replace('\0', '\\0')
+    )
@@ -1,7 +1,98 @@
 from rest_framework import serializers
-from .models import UserDetail
+from rest_framework.validators import UniqueValidator
+from .models import UserDetail, UserStamp
+
+
+class UserDetailListSerializer(serializers.ListSerializer):
+    """
+    Bulk create: rows are validated in one pass, usernames are checked for
+    uniqueness with one query per batch instead of one per row, and valid
+    rows are inserted with bulk_create.
+    """
+
+    batch_size = 500
+
+    def to_internal_value(self, data):
+        try:
+            validated = super().to_internal_value(data)
+            errors = [{} for _ in validated]
+        except serializers.ValidationError as exc:
+            if not isinstance(exc.detail, list):
+                raise
+            validated, errors = None, exc.detail
+
+        taken = self.taken_usernames(data)
+        seen = set()
+        for item, item_errors in zip(data, errors):
+            username = item.get('username') if isinstance(item, dict) else None
+            if not isinstance(username, str):
+                continue
+            if username in taken:
+                item_errors.setdefault('username', []).append(
+                    f"{UserDetail._meta.verbose_name} with this username already exists."
+                )
+            elif username in seen:
+                item_errors.setdefault('username', []).append("Duplicate username in this batch.")
+            seen.add(username)
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return validated
+
+    def taken_usernames(self, data):
+        usernames = [
+            item['username'] for item in data
+            if isinstance(item, dict) and isinstance(item.get('username'), str)
+        ]
+        taken = set()
+        for start in range(0, len(usernames), self.batch_size):
+            taken.update(
+                UserDetail.objects.filter(pk__in=usernames[start:start + self.batch_size])
+                .values_list('pk', flat=True)
+            )
+        return taken
+
+    def create(self, validated_data):
+        user_ids = UserDetail.objects.user_ids(attrs['username'] for attrs in validated_data)
+        created = UserDetail.objects.bulk_create(
+            [UserDetail(**attrs, user_id=user_ids.get(attrs['username'])) for attrs in validated_data],
+            batch_size=self.batch_size
+        )
+        # bulk_create skips the post_save receiver that does this per profile
+        UserStamp.objects.touch(user_ids.values())
+        return created
+
 
 class UserDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserDetail
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        # Linked by username (see UserDetailManager.user_ids), never set by clients
+        read_only_fields = ['user']
+        list_serializer_class = UserDetailListSerializer
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if isinstance(self.parent, UserDetailListSerializer):
+            # The list serializer checks the whole batch at once
+            drop_unique_validator(fields['username'])
+        return fields
+
+    def create(self, validated_data):
+        user_ids = UserDetail.objects.user_ids([validated_data['username']])
+        return super().create({**validated_data, 'user_id': user_ids.get(validated_data['username'])})
+
+
+class UserDetailImportSerializer(UserDetailSerializer):
+    """Row validation for roster imports, which upsert, so existing usernames are fine."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        drop_unique_validator(fields['username'])
+        return fields
+
+
+def drop_unique_validator(field):
+    field.validators = [
+        validator for validator in field.validators if not isinstance(validator, UniqueValidator)
+    ]
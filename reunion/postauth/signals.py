@@ -0,0 +1,42 @@
+"""
+Keeps profiles linked to accounts and feeds the conditional-GET validators:
+user renames and edits or deletions of a linked profile touch the user's
+UserStamp, profile deletions bump a counter. Queryset update() and
+bulk_create() calls bypass these receivers; bulk profile writers touch the
+stamps themselves.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import USERDETAIL_DELETIONS, ChangeCounter, User, UserDetail, UserStamp
+
+# User fields embedded in friend and friend request responses
+EMBEDDED_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=User, dispatch_uid='postauth.link_user_detail')
+def link_user_detail(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserDetail.objects.link_user(instance)
+
+
+@receiver(post_save, sender=User, dispatch_uid='postauth.stamp_user')
+def stamp_user(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if created or raw:
+        return
+    if update_fields is not None and not EMBEDDED_USER_FIELDS & set(update_fields):
+        return
+    UserStamp.objects.touch([instance.pk])
+
+
+@receiver(post_save, sender=UserDetail, dispatch_uid='postauth.stamp_profile_owner')
+@receiver(post_delete, sender=UserDetail, dispatch_uid='postauth.stamp_deleted_profile_owner')
+def stamp_profile_owner(sender, instance, raw=False, **kwargs):
+    # Friend lists embed the profile of each friend
+    if not raw:
+        UserStamp.objects.touch([instance.user_id])
+
+
+@receiver(post_delete, sender=UserDetail, dispatch_uid='postauth.count_userdetail_deletion')
+def count_userdetail_deletion(sender, instance, **kwargs):
+    ChangeCounter.objects.bump(USERDETAIL_DELETIONS)
@@ -1,3 +1,193 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.apps import apps
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .models import UserDetail, UserStamp
+from .roster import CSV, RosterImporter
+from .serializers import UserDetailListSerializer
+
+
+def profile(username, **fields):
+    return UserDetail.objects.create(**{
+        'username': username, 'firstname': 'F', 'lastname': 'L', 'penname': 'P',
+        'instagram': '', 'snapchat': '', 'phone': '', 'edu_details': {}, **fields,
+    })
+
+
+class UserDetailConditionalGetTests(TestCase):
+    url = '/api/userdetail/'
+
+    def setUp(self):
+        self.client = APIClient()
+        profile('ann')
+        profile('ben')
+
+    def etag_still_matches(self, etag):
+        return self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    def test_unchanged_list_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertTrue(self.etag_still_matches(etag))
+
+    def test_delete_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        UserDetail.objects.filter(username='ann').delete()
+        self.assertFalse(self.etag_still_matches(etag))
+
+    def test_update_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        ben = UserDetail.objects.get(username='ben')
+        ben.penname = 'B'
+        ben.save()
+        self.assertFalse(self.etag_still_matches(etag))
+
+
+@override_settings(USERDETAIL_API={'BULK_MAX_ROWS': 2})
+class BulkCreateTests(TestCase):
+    url = '/api/userdetail/'
+
+    def row(self, username):
+        return {
+            'username': username, 'firstname': 'F', 'lastname': 'L', 'penname': 'P',
+            'instagram': 'i', 'snapchat': 's', 'phone': '1', 'edu_details': {},
+        }
+
+    def post_ndjson(self, usernames):
+        body = ''.join(json.dumps(self.row(username)) + '\n' for username in usernames)
+        return APIClient().post(self.url, body, content_type='application/x-ndjson')
+
+    def test_ndjson_within_the_limit_is_created(self):
+        response = self.post_ndjson(['ann', 'ben'])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+
+    def test_ndjson_stops_after_the_limit(self):
+        with mock.patch('json.loads', side_effect=json.loads) as loads, \
+                mock.patch('mainapp.fastjson.orjson', None):
+            response = self.post_ndjson(['ann', 'ben', 'cat', 'dan'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(loads.call_count, 2)
+        self.assertFalse(UserDetail.objects.exists())
+
+    def test_username_race_is_reported_as_taken(self):
+        profile('ann')
+        # Validation ran before another request inserted 'ann'
+        with mock.patch.object(UserDetailListSerializer, 'taken_usernames', side_effect=[set(), {'ann'}]):
+            response = APIClient().post(self.url, [self.row('ann'), self.row('ben')], format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['taken'], ['ann'])
+
+    def test_other_conflicts_do_not_blame_usernames(self):
+        with mock.patch.object(UserDetail.objects, 'bulk_create', side_effect=IntegrityError('constraint failed')):
+            response = APIClient().post(self.url, [self.row('ann')], format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertNotIn('taken', response.data)
+
+    def test_renamed_account_keeps_its_profile(self):
+        # bob's account stays linked to the profile under his old username
+        profile('bob')
+        bob = get_user_model().objects.create_user('bob', password='x')
+        bob.username = 'robert'
+        bob.save()
+        response = APIClient().post(self.url, [self.row('robert')], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(dict(UserDetail.objects.values_list('username', 'user_id')), {'bob': bob.id, 'robert': None})
+
+
+class RosterImportTests(TestCase):
+    header = 'username,first_name,last_name,penname,instagram,snapchat,phone,edu_details'
+
+    def run_import(self, *lines, use_load_data=False):
+        body = '\n'.join(lines).encode()
+        return RosterImporter(use_load_data=use_load_data).run(io.BytesIO(body), CSV)
+
+    def test_missing_visibility_keeps_the_stored_one(self):
+        profile('ann', visibility='private')
+        result = self.run_import(self.header, 'ann,Ann,Lee,al,i,s,1,{}', 'ben,Ben,Ng,bn,i,s,2,{}')
+        self.assertEqual(result.written, 2)
+        ann, ben = UserDetail.objects.order_by('username')
+        self.assertEqual((ann.firstname, ann.visibility), ('Ann', 'private'))
+        self.assertEqual(ben.visibility, 'public')
+
+    def test_supplied_visibility_is_written(self):
+        profile('ann', visibility='private')
+        self.run_import(self.header + ',visibility', 'ann,Ann,Lee,al,i,s,1,{},public', 'ben,Ben,Ng,bn,i,s,2,{},')
+        self.assertEqual(dict(UserDetail.objects.values_list('username', 'visibility')), {'ann': 'public', 'ben': 'public'})
+
+    def test_import_touches_linked_users(self):
+        ann = get_user_model().objects.create_user('ann', password='x')
+        self.run_import(self.header, 'ann,Ann,Lee,al,i,s,1,{}')
+        self.assertTrue(UserStamp.objects.filter(user=ann).exists())
+
+    def test_reimport_keeps_the_link_of_a_renamed_account(self):
+        profile('ann')
+        ann = get_user_model().objects.create_user('ann', password='x')
+        ann.username = 'annie'
+        ann.save()
+        new_ann = get_user_model().objects.create_user('ann', password='x')
+        ben = get_user_model().objects.create_user('ben', password='x')
+        profile('ben')
+
+        result = self.run_import(self.header, 'ann,Ann,Lee,al,i,s,1,{}', 'ben,Ben,Ng,bn,i,s,2,{}', 'new,N,N,n,i,s,3,{}')
+        self.assertEqual(result.written, 3)
+        self.assertEqual(
+            dict(UserDetail.objects.values_list('username', 'user_id')),
+            {'ann': ann.id, 'ben': ben.id, 'new': None},
+        )
+        self.assertFalse(UserDetail.objects.filter(user=new_ann).exists())
+
+    def test_load_data_merges_only_supplied_columns(self):
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value = cursor
+        connection = mock.MagicMock(vendor='mysql', **{'cursor.return_value': cursor})
+        connection.ops.quote_name = lambda name: f'`{name}`'
+        with mock.patch('postauth.roster.connections', {'default': connection}):
+            RosterImporter(use_load_data=True).load_data([{
+                'username': 'ann', 'firstname': 'Ann', 'lastname': 'Lee', 'penname': 'al', 'instagram': 'i',
+                'snapchat': 's', 'phone': '1', 'edu_details': {}, 'user_id': None,
+            }])
+        statements = [call.args[0] for call in cursor.execute.call_args_list]
+        self.assertFalse(any('REPLACE' in sql for sql in statements))
+        merge = next(sql for sql in statements if sql.startswith('INSERT'))
+        updates = merge.split('ON DUPLICATE KEY UPDATE')[1]
+        self.assertIn('`firstname` = src.`firstname`', updates)
+        self.assertNotIn('visibility', updates)
+        self.assertIn('`user_id` = COALESCE(`postauth_userdetail`.`user_id`, src.`user_id`)', updates)
+        self.assertEqual(updates.count('user_id'), 3)
+        self.assertTrue(statements[-1].startswith('DROP TEMPORARY TABLE'))
+
+
+class UserLinkTests(TestCase):
+    def test_signup_links_the_profile_with_the_same_username(self):
+        profile('ann')
+        ann = get_user_model().objects.create_user('ann', password='x')
+        self.assertEqual(UserDetail.objects.get(username='ann').user, ann)
+
+    def test_linked_profile_is_not_moved(self):
+        profile('ann')
+        ann = get_user_model().objects.create_user('ann', password='x')
+        ann.username = 'annie'
+        ann.save()
+        get_user_model().objects.create_user('ann', password='x')
+        self.assertEqual(UserDetail.objects.get(username='ann').user, ann)
+
+    def test_backfill_migration_links_existing_profiles(self):
+        migration = importlib.import_module('postauth.migrations.0004_userdetail_user')
+        users = [get_user_model().objects.create_user(name, password='x') for name in ('ann', 'ben')]
+        # Profiles created after signup are not linked by the signal
+        for name in ('ann', 'ben', 'cat'):
+            profile(name)
+        schema_editor = mock.Mock(**{'connection.alias': 'default'})
+        with mock.patch.object(migration, 'BACKFILL_BATCH_SIZE', 2):
+            migration.link_users(apps, schema_editor)
+        self.assertEqual(
+            dict(UserDetail.objects.values_list('username', 'user_id')),
+            {'ann': users[0].id, 'ben': users[1].id, 'cat': None},
+        )
@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import CreateUserDetailView
+from .views import CreateUserDetailView, RosterImportView
 
 urlpatterns = [
-    path('userdetail/',CreateUserDetailView.as_view(),name='postUserDetail')
+    path('userdetail/',CreateUserDetailView.as_view(),name='postUserDetail'),
+    path('userdetail/import/', RosterImportView.as_view(), name='importUserDetail'),
 ]
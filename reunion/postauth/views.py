@@ -1,7 +1,137 @@
-from rest_framework import generics
-from .models import UserDetail
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from rest_framework import generics, status
+from rest_framework.pagination import CursorPagination
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+from mainapp.conditional import conditional_get, make_validators
+from mainapp.fastjson import NDJSONParser
+from mainapp.fieldsets import SparseFieldsetMixin
+from .models import USERDETAIL_DELETIONS, ChangeCounter, UserDetail
+from .roster import RosterImporter, RosterImportError, detect_format, parse_mapping
 from .serializers import UserDetailSerializer
 
-class CreateUserDetailView(generics.ListCreateAPIView):
+DEFAULTS = {
+    'PAGE_SIZE': 50,
+    'MAX_PAGE_SIZE': 500,
+    'BULK_MAX_ROWS': 5000,
+}
+
+
+def userdetail_options():
+    return {**DEFAULTS, **getattr(settings, 'USERDETAIL_API', {})}
+
+
+def userdetail_validators(request):
+    """
+    Validators for the profile list from the newest updated_at (read off its
+    index) and the deletion counter; deletes do not move the timestamp, so
+    only the ETag is reliable.
+    """
+    latest = UserDetail.objects.aggregate(latest=Max('updated_at'))['latest']
+    etag, _ = make_validators('userdetail', (latest, ChangeCounter.objects.value(USERDETAIL_DELETIONS)))
+    return etag, None
+
+
+class BulkNDJSONParser(NDJSONParser):
+    """Stops reading at the first profile past BULK_MAX_ROWS instead of buffering the whole body."""
+
+    @property
+    def max_items(self):
+        return userdetail_options()['BULK_MAX_ROWS']
+
+
+class UserDetailPagination(CursorPagination):
+    """Keyset pages over the primary key; pass `next`/`previous` links back as-is."""
+
+    ordering = 'username'
+    page_size = userdetail_options()['PAGE_SIZE']
+    page_size_query_param = 'page_size'
+    max_page_size = userdetail_options()['MAX_PAGE_SIZE']
+
+
+class CreateUserDetailView(SparseFieldsetMixin, generics.ListCreateAPIView):
+    """
+    GET pages through profiles by username. POST takes one profile, or a JSON
+    array / NDJSON body (application/x-ndjson) of up to BULK_MAX_ROWS profiles
+    that are validated together and inserted in batches; a bulk request is
+    all-or-nothing and answers with the number of profiles created.
+    """
     queryset = UserDetail.objects.all()
-    serializer_class = UserDetailSerializer
\ No newline at end of file
+    serializer_class = UserDetailSerializer
+    pagination_class = UserDetailPagination
+    parser_classes = [*api_settings.DEFAULT_PARSER_CLASSES, BulkNDJSONParser]
+
+    @conditional_get(userdetail_validators)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def create(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(
+            data=request.data, many=True, allow_empty=False,
+            max_length=userdetail_options()['BULK_MAX_ROWS'],
+        )
+        serializer.is_valid(raise_exception=True)
+        try:
+            with transaction.atomic():
+                created = serializer.save()
+        except IntegrityError:
+            # Another request may have inserted some of these usernames after validation
+            taken = serializer.taken_usernames(request.data)
+            if taken:
+                return Response(
+                    {
+                        "detail": "Some usernames were taken while this batch was being created; nothing was saved.",
+                        "taken": sorted(taken),
+                    },
+                    status=status.HTTP_409_CONFLICT
+                )
+            return Response(
+                {"detail": "Some profiles conflict with existing data; nothing was saved."},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response({"created": len(created)}, status=status.HTTP_201_CREATED)
+
+
+class RosterImportView(APIView):
+    """
+    Admin-only roster upload. Send the file as the raw body (text/csv or
+    application/x-ndjson) or as the `file` field of a multipart form; it is
+    streamed into UserDetail and the response reports rows read, written and
+    rejected (with line numbers) and rows/sec. `?map=Source=target,...`
+    renames columns, `?file_format=csv|ndjson` overrides format detection
+    (`format` is taken by DRF's renderer selection).
+    """
+    permission_classes = [IsAdminUser]
+    # Raw bodies are read straight from the request stream, never through a parser
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        requested = request.query_params.get('file_format')
+        try:
+            if request.content_type.startswith('multipart/'):
+                stream = request.FILES.get('file')
+                if stream is None:
+                    return Response(
+                        {"detail": "Attach the roster as the 'file' field."},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                fmt = detect_format(stream.name, stream.content_type, requested)
+            else:
+                stream = request.stream
+                if stream is None:
+                    return Response({"detail": "The request body is empty."}, status=status.HTTP_400_BAD_REQUEST)
+                fmt = detect_format(content_type=request.content_type, requested=requested)
+
+            mapping = parse_mapping(filter(None, request.query_params.get('map', '').split(',')))
+            result = RosterImporter(mapping=mapping).run(stream, fmt)
+        except RosterImportError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result.as_dict())